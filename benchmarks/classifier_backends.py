@@ -0,0 +1,147 @@
+"""
+Accuracy vs latency of the zero-shot classifier backends (CLASSIFIER_BACKEND)
+against the current transformers pipeline, on CPU. The pipeline's answers are
+the reference: for every backend it reports how often the top category
+agrees, the mean absolute difference of the category scores, load time and
+latency per text at each batch size.
+
+    uv run python benchmarks/classifier_backends.py --backends pipeline int8 onnx --threads 4
+    uv run python benchmarks/classifier_backends.py --input libros.jsonl --limit 200 --out benchmarks/results/classifier.json
+
+`--input` takes the /upload_book JSONL of ingest.py (the first 4000
+characters of each "content" are classified, as in /classify_book). The
+"onnx" backend needs `onnxruntime` and an exported model
+(`python nli_backend.py export`).
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from classifier import CATEGORIES, CLASSIFIER_MODEL, ZeroShotClassifier  # noqa: E402
+from offline import peak_rss_mb, percentile  # noqa: E402
+
+SAMPLES = [
+    "A young wizard discovers a hidden kingdom of dragons and must master ancient magic to save it.",
+    "The detective follows a trail of cryptic letters through foggy London to unmask a killer.",
+    "A sweeping account of the fall of the Roman Empire, from the crisis of the third century to 476.",
+    "Two strangers meet on a night train to Lisbon and fall in love over a single conversation.",
+    "Astronauts aboard a generation ship wake up centuries early and find the crew has vanished.",
+    "Practical habits to manage your time, build discipline and stop procrastinating for good.",
+    "The life of Marie Curie, from her childhood in Warsaw to two Nobel prizes.",
+    "A collection of poems about the sea, memory and the passing of seasons.",
+    "How startups find product-market fit, raise capital and scale their first sales team.",
+    "A haunted house on the edge of town slowly drives a family to madness.",
+    "Walking the Camino de Santiago: routes, villages and advice for pilgrims.",
+    "An introduction to quantum mechanics for curious readers without a physics background.",
+    "Stoic philosophy from Seneca to Marcus Aurelius and what it teaches about modern life.",
+    "A picture book about a little bear who is afraid of the dark.",
+    "Teenagers in a dystopian city fight back against the council that controls their memories.",
+    "The history of Renaissance painting in Florence and the patrons who paid for it.",
+    "A spy races against time to stop a nuclear launch hidden inside a shipping container.",
+    "Meditations on faith, prayer and doubt by a monk living in the desert.",
+    "A family saga across three generations of a coffee-growing family in Colombia.",
+    "The secret life of trees: how forests communicate and share resources underground.",
+]
+
+
+def load_texts(path, limit):
+    texts = []
+    with open(path, encoding="utf-8") as handle:
+        for line in handle:
+            if line.strip():
+                texts.append(json.loads(line)["content"][:4000])
+            if len(texts) >= limit:
+                break
+    return texts
+
+
+def run_backend(backend, texts, batch_sizes, repeats):
+    started = time.perf_counter()
+    classifier = ZeroShotClassifier(CLASSIFIER_MODEL, backend=backend)
+    classifier.load()
+    load_seconds = time.perf_counter() - started
+    # Primera llamada fuera de la medición (asignación de memoria, compilación de kernels)
+    classifier.classify_batch(texts[:1], CATEGORIES)
+
+    latencies = {}
+    outputs = None
+    for batch_size in batch_sizes:
+        per_text = []
+        for _ in range(repeats):
+            results = []
+            for start in range(0, len(texts), batch_size):
+                batch = texts[start:start + batch_size]
+                started = time.perf_counter()
+                results.extend(classifier.classify_batch(batch, CATEGORIES))
+                per_text.append((time.perf_counter() - started) / len(batch))
+            outputs = outputs or results
+        per_text.sort()
+        latencies[batch_size] = {"p50_ms": round(statistics.median(per_text) * 1000, 1),
+                                 "p95_ms": round(percentile(per_text, 0.95) * 1000, 1)}
+    return {
+        "backend": backend,
+        "active_backend": classifier.active_backend,
+        "error": classifier.backend_error,
+        "load_s": round(load_seconds, 2),
+        "latency_per_text": latencies,
+    }, outputs
+
+
+def agreement(outputs, reference):
+    same_top, score_error = 0, []
+    for output, expected in zip(outputs, reference):
+        same_top += output["labels"][0] == expected["labels"][0]
+        scores = dict(zip(output["labels"], output["scores"]))
+        score_error.extend(abs(scores[label] - score) for label, score in zip(expected["labels"], expected["scores"]))
+    return {"top1_agreement": round(same_top / len(reference), 4),
+            "mean_abs_score_diff": round(statistics.mean(score_error), 5)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["pipeline", "int8", "onnx"])
+    parser.add_argument("--input", help="JSONL with a 'content' field per line")
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--repeats", type=int, default=1)
+    parser.add_argument("--threads", type=int, default=0, help="CLASSIFIER_THREADS for every backend")
+    parser.add_argument("--out")
+    args = parser.parse_args()
+
+    import nli_backend
+    if args.threads:
+        nli_backend.CLASSIFIER_THREADS = args.threads
+        import torch
+        torch.set_num_threads(args.threads)
+
+    texts = load_texts(args.input, args.limit) if args.input else SAMPLES[:args.limit]
+    # El pipeline actual es la referencia de precisión
+    backends = ["pipeline"] + [name for name in args.backends if name != "pipeline"]
+    results, reference = [], None
+    for backend in backends:
+        result, outputs = run_backend(backend, texts, args.batch_sizes, args.repeats)
+        if backend == "pipeline":
+            reference = outputs
+        if result["active_backend"] != backend:
+            print(f"{backend:>8}: not available ({result['error']})", flush=True)
+            continue
+        result.update(agreement(outputs, reference))
+        result["peak_rss_mb"] = peak_rss_mb()
+        results.append(result)
+        latency = "  ".join(f"batch {size}: p50 {item['p50_ms']} ms" for size, item in result["latency_per_text"].items())
+        print(f"{backend:>8}: top-1 agreement {result['top1_agreement']:.3f}  "
+              f"score diff {result['mean_abs_score_diff']:.4f}  load {result['load_s']} s  {latency}", flush=True)
+
+    if args.out:
+        Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.out).write_text(json.dumps({"texts": len(texts), "threads": args.threads, "results": results},
+                                             indent=2))
+
+
+if __name__ == "__main__":
+    main()
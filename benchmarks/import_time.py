@@ -0,0 +1,102 @@
+"""
+Cold-start benchmark: time `import main` in fresh interpreters and list the
+modules that dominate it (python -X importtime). Fails when the median import
+time exceeds the budget or when a heavy dependency is imported eagerly.
+
+    uv run python benchmarks/import_time.py --runs 5 --budget 1.5
+    uv run python benchmarks/import_time.py --out benchmarks/results/import.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Dependencias que solo deben importarse en las rutas que las usan
+HEAVY_MODULES = ("transformers", "torch", "llama_index", "langchain_openai", "langchain_community",
+                 "openai", "huggingface_hub", "nltk", "tiktoken")
+
+PROBE = (
+    "import json, sys, time\n"
+    "started = time.perf_counter()\n"
+    "import main\n"
+    "elapsed = time.perf_counter() - started\n"
+    f"heavy = [name for name in {HEAVY_MODULES!r} if name in sys.modules]\n"
+    "print(json.dumps({'import_s': elapsed, 'heavy': heavy}))\n"
+)
+
+
+def probe_env():
+    env = dict(os.environ)
+    # Credenciales ficticias: importar la app no debe abrir conexiones
+    env.setdefault("SUPABASE_URL", "http://supabase.invalid")
+    env.setdefault("SUPABASE_ANON_KEY", "offline")
+    env.setdefault("OPENAI_API_KEY", "offline")
+    return env
+
+
+def run_once(env):
+    started = time.perf_counter()
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", PROBE], cwd=ROOT, env=env,
+                               capture_output=True, text=True, check=True)
+    wall = time.perf_counter() - started
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    modules = []
+    for line in completed.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        modules.append((name.strip(), int(cumulative) / 1e6, len(name) - len(name.lstrip())))
+    return {"import_s": result["import_s"], "process_s": wall, "heavy": result["heavy"], "modules": modules}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=1.5, help="Maximum median import time in seconds")
+    parser.add_argument("--top", type=int, default=15, help="Top-level imports to list")
+    parser.add_argument("--out", default=None, help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    env = probe_env()
+    runs = [run_once(env) for _ in range(args.runs)]
+    import_times = sorted(run["import_s"] for run in runs)
+    process_times = sorted(run["process_s"] for run in runs)
+
+    # Imports directos de main (y de primer nivel) de la última ejecución, por tiempo acumulado
+    last = runs[-1]["modules"]
+    base_depth = min((depth for name, _, depth in last if name == "main"), default=1)
+    top_level = sorted(((name, seconds) for name, seconds, depth in last if depth <= base_depth + 2),
+                       key=lambda item: item[1], reverse=True)[:args.top]
+
+    report = {
+        "runs": args.runs,
+        "budget_s": args.budget,
+        "import_median_s": round(statistics.median(import_times), 3),
+        "import_max_s": round(import_times[-1], 3),
+        "process_median_s": round(statistics.median(process_times), 3),
+        "heavy_modules": runs[-1]["heavy"],
+        "top_imports": [{"module": name, "cumulative_s": round(seconds, 3)} for name, seconds in top_level],
+    }
+    print(f"import main: median {report['import_median_s']:.3f}s, max {report['import_max_s']:.3f}s "
+          f"(interpreter + import: {report['process_median_s']:.3f}s), budget {args.budget:.3f}s")
+    for item in report["top_imports"]:
+        print(f"  {item['cumulative_s']:8.3f}s  {item['module']}")
+    if report["heavy_modules"]:
+        print(f"Heavy modules imported eagerly: {', '.join(report['heavy_modules'])}")
+
+    if args.out:
+        Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.out).write_text(json.dumps(report, indent=2))
+    if report["import_median_s"] > args.budget or report["heavy_modules"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
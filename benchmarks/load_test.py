@@ -0,0 +1,74 @@
+"""
+Load test for the API: sends the same request sequentially and then with
+increasing concurrency, and reports throughput for each level.
+
+    uv run python benchmarks/load_test.py --url http://localhost:8000 \
+        --path "/search?query=aventuras" --requests 40 --concurrency 1 4 16
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import httpx
+
+
+async def run_level(http: httpx.AsyncClient, method: str, path: str, body, total: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await http.request(method, path, json=body)
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 2),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p99_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 1),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--path", default="/search?query=aventuras")
+    parser.add_argument("--method", default="GET")
+    parser.add_argument("--body", default=None, help="JSON body for POST requests")
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    args = parser.parse_args()
+
+    body = json.loads(args.body) if args.body else None
+    limits = httpx.Limits(max_connections=max(args.concurrency))
+    async with httpx.AsyncClient(base_url=args.url, timeout=120, limits=limits) as http:
+        results = [
+            await run_level(http, args.method, args.path, body, args.requests, level)
+            for level in args.concurrency
+        ]
+
+    baseline = results[0]["throughput_rps"]
+    for result in results:
+        result["speedup"] = round(result["throughput_rps"] / baseline, 2) if baseline else None
+        print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,288 @@
+"""
+Offline benchmark of the API endpoints. OpenAI, Supabase, Wikipedia and the
+Hugging Face models are replaced by the local stand-ins in fakes.py, so the
+numbers measure our own hot paths and can be compared across commits.
+
+    uv run python benchmarks/offline.py --requests 200 --concurrency 1 8 32 \
+        --out benchmarks/results/$(git rev-parse --short HEAD).json
+
+    # Compare with an earlier run; exits with status 1 on p95 regressions
+    uv run python benchmarks/offline.py --compare benchmarks/results/baseline.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+WORDS = ("aventura amor guerra muerte viaje mar ciudad familia secreto misterio historia rey reina "
+         "dragon magia ciencia futuro pasado memoria sueño noche luz sombra camino tierra fuego "
+         "bueno feliz triste miedo alegria carta isla bosque montaña río tiempo").split()
+CATEGORIES = ["Fiction", "Fantasy", "History", "Science Fiction", "Romance", "Mystery"]
+SENTIMENTS = ["joy", "fear", "neutral"]
+AUTHORS = ["Miguel de Cervantes", "Gabriel García Márquez", "Isabel Allende", "Jorge Luis Borges",
+           "Benito Pérez Galdós", "Emilia Pardo Bazán", "Julio Cortázar", "Ana María Matute"]
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def rss_mb():
+    # RSS actual en Linux; en otros sistemas solo se informa del pico
+    try:
+        with open("/proc/self/statm") as handle:
+            return round(int(handle.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20, 1)
+    except OSError:
+        return None
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss está en KB en Linux y en bytes en macOS
+    return round(peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10, 1)
+
+
+def make_catalog(count, embeddings, seed=0):
+    rng = random.Random(seed)
+    documents, keys = [], []
+    from dedup import book_keys
+    for i in range(count):
+        title = f"{rng.choice(WORDS).capitalize()} {rng.choice(WORDS)} {i}"
+        content = " ".join(rng.choice(WORDS) for _ in range(rng.randint(80, 300)))
+        metadata = {
+            "title": title,
+            "authors": rng.choice(AUTHORS),
+            "categories": rng.choice(CATEGORIES),
+            "published_year": rng.randint(1600, 2024),
+            "dominant_sentiment": rng.choice(SENTIMENTS),
+            "isbn": f"978{i:010d}",
+        }
+        document_id = f"00000000-0000-4000-8000-{i:012d}"
+        documents.append({"id": document_id, "content": content, "metadata": metadata,
+                          "embedding": embeddings.vector(content)})
+        keys.extend({"key": key, "document_id": document_id} for key in book_keys(metadata))
+    return documents, keys
+
+
+def install_fakes(main, args):
+    """
+    Point every client the app built at import time to the offline stand-ins
+    """
+    from fakes import (FakeEmbeddings, FakeLLM, FakeSentimentAnalyzer, FakeZeroShotPipeline,
+                       InMemoryPostgrest, StubWikipedia)
+
+    embeddings = FakeEmbeddings(dim=args.dim, latency=args.embedding_ms / 1000)
+    documents, keys = make_catalog(args.documents, embeddings)
+    db = InMemoryPostgrest({"documents": documents, "book_keys": keys})
+    pages = {doc["metadata"]["title"]: doc["content"][:1500] for doc in documents[:200]}
+
+    main.db = db
+    for component in (main.dedup_index, main.bulk_ingester, main.chunked_ingester, main.vector_store):
+        component.db = db
+    # Todos los componentes comparten el cliente perezoso de main: basta con fijar su cliente
+    main.embeddings._client = embeddings
+    # tiktoken descarga su vocabulario la primera vez: se aproxima con ~4 caracteres por token
+    main.bulk_ingester.token_counter = lambda text: len(text) // 4
+    main.chunked_ingester.length_function = lambda text: len(text) // 4
+    main.document_embeddings.token_counter = lambda text: len(text) // 4
+    main.wikipedia_client.backend = StubWikipedia(pages, latency=args.wikipedia_ms / 1000)
+    main.summary_service._llm = FakeLLM(" ".join(WORDS) * 8, latency=args.llm_ms / 1000)
+    # Con INFERENCE_SOCKET los modelos son los del proceso de inferencia (ver benchmarks/workers.py)
+    if main.inference_client is None:
+        main.zero_shot_classifier._loader = FakeZeroShotPipeline
+        main.zero_shot_classifier._pipeline = None
+        main.sentiment_analyzer._loader = FakeSentimentAnalyzer
+        main.sentiment_analyzer._analyzer = None
+    return documents, embeddings
+
+
+def scenarios(documents):
+    rng = random.Random(1)
+    queries = [" ".join(rng.sample(WORDS, 3)) for _ in range(50)]
+    titles = [doc["metadata"]["title"] for doc in documents[:200]]
+    counter = {"upload": 0}
+
+    def upload_body():
+        counter["upload"] += 1
+        n = counter["upload"]
+        return {"content": " ".join(rng.choice(WORDS) for _ in range(200)),
+                "metadata": {"title": f"Nuevo libro {n} {time.time_ns()}", "authors": rng.choice(AUTHORS)}}
+
+    return {
+        "root": lambda i: ("GET", "/", None),
+        "search": lambda i: ("GET", f"/search?query={queries[i % len(queries)]}", None),
+        "search_filtered": lambda i: ("GET", f"/search?query={queries[i % len(queries)]}"
+                                             f"&category={CATEGORIES[i % len(CATEGORIES)]}&year_from=1900", None),
+        "search_lexical": lambda i: ("GET", f"/search?query={titles[i % len(titles)]}&mode=lexical", None),
+        "search_hybrid": lambda i: ("GET", f"/search?query={titles[i % len(titles)]}&mode=hybrid", None),
+        # Listado ligero: solo los campos que pinta la app y un fragmento del texto
+        "search_slim": lambda i: ("GET", f"/search?query={queries[i % len(queries)]}"
+                                         f"&fields=title,authors,isbn&snippet=160", None),
+        # Pantalla de inicio: una búsqueda por estantería en una sola petición
+        "search_batch": lambda i: ("POST", "/search_batch", {"searches": [
+            {"query": queries[(i * 6 + shelf) % len(queries)], "limit": 10,
+             "dominant_sentiment": SENTIMENTS[shelf % len(SENTIMENTS)] if shelf < 3 else None,
+             "category": CATEGORIES[shelf] if shelf >= 3 else None} for shelf in range(6)]}),
+        "get_summary": lambda i: ("POST", "/get_summary", {"title": titles[i % 20], "original_description": "..."}),
+        "classify_book": lambda i: ("POST", "/classify_book", {"content": documents[i % len(documents)]["content"]}),
+        "upload_book": lambda i: ("POST", "/upload_book", upload_body()),
+        # Mismo contenido con otro título: los embeddings salen del almacén por hash del contenido
+        "reupload_book": lambda i: ("POST", "/upload_book", {**upload_body(), "content": documents[i % 20]["content"]}),
+        "upload_books": lambda i: ("POST", "/upload_books", {"books": [upload_body() for _ in range(20)]}),
+        "enrich_book": lambda i: ("POST", "/enrich_book", {**upload_body(), "summarize": i % 4 == 0}),
+    }
+
+
+async def run_level(http, make_request, total, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    sizes, wire_sizes = [], []
+    errors = 0
+
+    async def one(i):
+        nonlocal errors
+        method, path, body = make_request(i)
+        async with semaphore:
+            start = time.perf_counter()
+            response = await http.request(method, path, json=body)
+            latencies.append(time.perf_counter() - start)
+            # Bytes del cuerpo sin comprimir y los que viajan por la red (gzip/br si el servidor comprime)
+            sizes.append(len(response.content))
+            wire_sizes.append(response.num_bytes_downloaded)
+            payload = response.json() if response.headers.get("content-type", "").startswith("application/json") else {}
+            if response.status_code >= 400 or (isinstance(payload, dict) and payload.get("error")):
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(total / elapsed, 2),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "response_bytes": round(statistics.mean(sizes)),
+        "wire_bytes": round(statistics.mean(wire_sizes)),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(current, baseline, threshold):
+    """
+    Print p95 and throughput changes against a previous run; return the regressions
+    """
+    previous = {(r["scenario"], r["concurrency"]): r for r in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        before = previous.get((result["scenario"], result["concurrency"]))
+        if before is None:
+            continue
+        p95_change = (result["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100 if before["p95_ms"] else 0.0
+        rps_change = (result["throughput_rps"] - before["throughput_rps"]) / before["throughput_rps"] * 100
+        flag = "REGRESSION" if p95_change > threshold else ""
+        print(f"{result['scenario']:>16} c={result['concurrency']:<3} p95 {before['p95_ms']:>9.2f} -> "
+              f"{result['p95_ms']:>9.2f} ms ({p95_change:+6.1f}%)  rps {rps_change:+6.1f}%  {flag}")
+        if flag:
+            regressions.append(result)
+    return regressions
+
+
+async def run(args):
+    # Configuración fija antes de importar la app: nada de cachés en disco ni credenciales reales
+    os.environ.setdefault("SUPABASE_URL", "http://supabase.invalid")
+    os.environ.setdefault("SUPABASE_ANON_KEY", "offline")
+    os.environ.setdefault("OPENAI_API_KEY", "offline")
+    for variable in ("SUMMARY_CACHE_PATH", "WIKIPEDIA_CACHE_PATH", "EMBEDDING_CACHE_PATH", "VECTOR_INDEX_PATH",
+                     "JOB_STORE_PATH", "EMBEDDING_STORE_PATH"):
+        os.environ[variable] = ""
+    # Los escenarios search_hybrid y search_lexical necesitan el índice BM25
+    os.environ["LEXICAL_SEARCH"] = "true"
+    os.environ["VECTOR_STORE"] = args.vector_store
+    os.environ["VECTOR_DIM"] = str(args.dim)
+
+    import httpx
+    import main
+
+    documents, embeddings = install_fakes(main, args)
+    selected = scenarios(documents)
+    names = args.scenarios or list(selected)
+    results = []
+    async with main.lifespan(main.app):
+        # Esperar a los índices que se cargan en segundo plano al arrancar
+        while not main.lexical_index.ready:
+            await asyncio.sleep(0.05)
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as http:
+            for name in names:
+                # Peticiones de calentamiento (imports perezosos, carga de modelos) que no se miden
+                if args.warmup:
+                    await run_level(http, selected[name], args.warmup, 1)
+                for level in args.concurrency:
+                    result = {"scenario": name, **await run_level(http, selected[name], args.requests, level),
+                              "rss_mb": rss_mb(), "peak_rss_mb": peak_rss_mb()}
+                    results.append(result)
+                    print(json.dumps(result), flush=True)
+
+    return {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "config": {key: value for key, value in vars(args).items() if key not in ("out", "compare")},
+        "embedding_calls": embeddings.calls,
+        "document_embeddings": {key: value for key, value in main.document_embeddings.stats().items()
+                                if key in ("api_calls", "api_calls_saved", "texts_reused", "tokens_saved")},
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--warmup", type=int, default=5, help="Unmeasured requests before each scenario")
+    parser.add_argument("--scenarios", nargs="+", default=None)
+    parser.add_argument("--documents", type=int, default=2000)
+    parser.add_argument("--dim", type=int, default=3072)
+    parser.add_argument("--vector-store", choices=["supabase", "local"], default="supabase")
+    parser.add_argument("--embedding-ms", type=float, default=20, help="Simulated embeddings API latency")
+    parser.add_argument("--llm-ms", type=float, default=5, help="Simulated latency per streamed LLM chunk")
+    parser.add_argument("--wikipedia-ms", type=float, default=50, help="Simulated Wikipedia latency")
+    parser.add_argument("--out", default=None, help="Write the results to this JSON file")
+    parser.add_argument("--compare", default=None, help="Earlier results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=20.0, help="p95 increase (%%) reported as a regression")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if args.out:
+        Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.out).write_text(json.dumps(report, indent=2))
+    if args.compare:
+        regressions = compare(report, json.loads(Path(args.compare).read_text()), args.threshold)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
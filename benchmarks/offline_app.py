@@ -0,0 +1,104 @@
+"""
+The API with the offline stand-ins of benchmarks/offline.py, importable by
+uvicorn so it can run with several worker processes (benchmarks/workers.py).
+Configured through BENCH_* environment variables.
+
+    uvicorn offline_app:app --app-dir benchmarks --workers 4
+
+With `--inference-socket` it runs the shared inference server instead, with
+the fake models (plus `--model-mb` of ballast standing in for the weights):
+
+    python benchmarks/offline_app.py --inference-socket /tmp/bench.sock --model-mb 1600
+"""
+import argparse
+import asyncio
+import os
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+# Memoria que ocupan los "pesos" de los modelos falsos en cada proceso que los carga
+BENCH_MODEL_MB = int(os.getenv("BENCH_MODEL_MB", "0"))
+
+
+def fake_models(model_mb: int = BENCH_MODEL_MB, classifier_ms: float = 0.0):
+    """
+    (classifier, sentiment analyzer) with the fake pipelines; the classifier
+    holds `model_mb` of touched memory, like loaded weights
+    """
+    from classifier import ZeroShotClassifier
+    from fakes import FakeSentimentAnalyzer, FakeZeroShotPipeline
+    from sentiment import SentimentAnalyzer
+
+    def load():
+        pipeline = FakeZeroShotPipeline(cost=classifier_ms / 1000)
+        # np.ones escribe cada página: cuenta en el RSS como unos pesos de verdad
+        pipeline.weights = np.ones(model_mb * 2 ** 20 // 4, dtype=np.float32)
+        return pipeline
+
+    return ZeroShotClassifier(loader=load), SentimentAnalyzer(loader=FakeSentimentAnalyzer)
+
+
+def settings():
+    return SimpleNamespace(
+        documents=int(os.getenv("BENCH_DOCUMENTS", "2000")),
+        dim=int(os.getenv("BENCH_DIM", "3072")),
+        embedding_ms=float(os.getenv("BENCH_EMBEDDING_MS", "20")),
+        wikipedia_ms=float(os.getenv("BENCH_WIKIPEDIA_MS", "50")),
+        llm_ms=float(os.getenv("BENCH_LLM_MS", "5")),
+        classifier_ms=float(os.getenv("BENCH_CLASSIFIER_MS", "5")),
+    )
+
+
+def create_app():
+    os.environ.setdefault("SUPABASE_URL", "http://supabase.invalid")
+    os.environ.setdefault("SUPABASE_ANON_KEY", "offline")
+    os.environ.setdefault("OPENAI_API_KEY", "offline")
+    args = settings()
+    os.environ.setdefault("VECTOR_DIM", str(args.dim))
+
+    import main
+    from offline import install_fakes
+
+    install_fakes(main, args)
+    if main.inference_client is None and os.getenv("BENCH_MODELS", "fake") == "fake":
+        # Cada worker carga su propia copia de los modelos
+        classifier, sentiment = fake_models(classifier_ms=args.classifier_ms)
+        main.zero_shot_classifier._loader = classifier._loader
+        main.sentiment_analyzer._loader = sentiment._loader
+    return main.app
+
+
+def serve_inference(socket_path: str, model_mb: int, classifier_ms: float):
+    from model_server import InferenceServer
+
+    classifier, sentiment = fake_models(model_mb, classifier_ms)
+    server = InferenceServer(socket_path, classifier, sentiment)
+
+    async def run():
+        try:
+            await server.serve_forever()
+        finally:
+            await server.close()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--inference-socket", required=True)
+    parser.add_argument("--model-mb", type=int, default=BENCH_MODEL_MB)
+    parser.add_argument("--classifier-ms", type=float, default=settings().classifier_ms)
+    options = parser.parse_args()
+    serve_inference(options.inference_socket, options.model_mb, options.classifier_ms)
+else:
+    app = create_app()
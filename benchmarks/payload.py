@@ -0,0 +1,117 @@
+"""
+Size and serialization time of a /search page for each payload shape:
+full documents, projected fields (`fields=title,authors,isbn`) and content
+snippets, serialized the way FastAPI does with pydantic models
+(SearchResponse -> jsonable_encoder -> json) and as plain dicts with orjson
+(what /search returns now). Sizes are reported raw, gzipped and, when the
+`brotli` package is installed, with brotli.
+
+    uv run python benchmarks/payload.py --limit 20 --content-words 2000
+    uv run python benchmarks/payload.py --out benchmarks/results/payload.json
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from offline import WORDS, make_catalog, percentile  # noqa: E402
+
+SHAPES = {
+    "full": {},
+    "fields": {"fields": "title,authors,isbn"},
+    "snippet": {"snippet": 200},
+    "fields+snippet": {"fields": "title,authors,isbn", "snippet": 200},
+}
+
+
+def timed(function, repeats):
+    timings = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        body = function()
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return body, {"p50_us": round(statistics.median(timings) * 1e6, 1),
+                  "p95_us": round(percentile(timings, 0.95) * 1e6, 1)}
+
+
+def run(args):
+    os.environ.setdefault("SUPABASE_URL", "http://supabase.invalid")
+    os.environ.setdefault("SUPABASE_ANON_KEY", "offline")
+    os.environ.setdefault("OPENAI_API_KEY", "offline")
+
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+
+    import main
+    from fakes import FakeEmbeddings
+    from responses import FastJSONResponse, brotli, compress
+    from schemas import SearchParams, SearchResponse
+
+    documents, _ = make_catalog(args.limit, FakeEmbeddings(dim=8))
+    rng = random.Random(2)
+    for doc in documents:
+        # Libros con descripciones largas o fragmentos de capítulo, como en la tabla real
+        doc["content"] = " ".join(rng.choice(WORDS) for _ in range(args.content_words))
+    query = " ".join(rng.sample(WORDS, 2))
+
+    report = []
+    for shape, options in SHAPES.items():
+        params = SearchParams(query=query, limit=args.limit, **options)
+        fields = main.search_fields(params)
+
+        def page():
+            return {"results": [main.search_result(doc, params, fields) for doc in documents],
+                    "limit": params.limit, "offset": 0, "total": len(documents), "next_cursor": None}
+
+        def pydantic_body():
+            # Lo que hacía /search: modelos validados y serializados por FastAPI
+            return JSONResponse(jsonable_encoder(SearchResponse(**page()))).body
+
+        def orjson_body():
+            return FastJSONResponse(page()).body
+
+        _, pydantic_time = timed(pydantic_body, args.repeats)
+        fast_body, orjson_time = timed(orjson_body, args.repeats)
+        result = {
+            "shape": shape,
+            "bytes": len(fast_body),
+            "gzip_bytes": len(gzip.compress(fast_body, compresslevel=5, mtime=0)),
+            "br_bytes": len(compress(fast_body, "br")) if brotli is not None else None,
+            "pydantic": pydantic_time,
+            "orjson": orjson_time,
+        }
+        report.append(result)
+        br = f"  br {result['br_bytes']:>8}" if brotli is not None else ""
+        print(f"{shape:>15}: {result['bytes']:>8} B  gzip {result['gzip_bytes']:>8}{br}  "
+              f"pydantic p50 {pydantic_time['p50_us']:>8.1f} us  orjson p50 {orjson_time['p50_us']:>8.1f} us",
+              flush=True)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--limit", type=int, default=20, help="Results per page")
+    parser.add_argument("--content-words", type=int, default=1500, help="Words of content per result")
+    parser.add_argument("--repeats", type=int, default=200)
+    parser.add_argument("--out")
+    args = parser.parse_args()
+
+    report = run(args)
+    if args.out:
+        Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.out).write_text(json.dumps({"config": {key: value for key, value in vars(args).items()
+                                                         if key != "out"}, "results": report}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
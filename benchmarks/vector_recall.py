@@ -0,0 +1,140 @@
+"""
+Recall / memory / latency trade-off of the compact embedding settings
+(VECTOR_COMPACT_DIM, VECTOR_QUANTIZATION, VECTOR_RESCORE_FACTOR) on the
+local vector index. Recall@k is measured against exact search on the full
+float32 vectors.
+
+    uv run python benchmarks/vector_recall.py --rows 20000 --queries 200
+    uv run python benchmarks/vector_recall.py --index vectors --configs 1024:none,1024:binary,256:int8
+    uv run python benchmarks/vector_recall.py --out benchmarks/results/recall.json
+
+Without `--index` the vectors are synthetic: clustered, with variance that
+decays along the dimensions like Matryoshka embeddings. Real embeddings
+(`vector_store.py sync --out vectors`) give the numbers that matter.
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from quantization import truncate  # noqa: E402
+from vector_store import LocalVectorIndex  # noqa: E402
+
+DEFAULT_CONFIGS = "3072:none,1024:none,256:none,3072:int8,3072:binary,1024:int8,1024:binary,256:binary"
+
+
+def synthetic_vectors(rows: int, dim: int, seed: int = 0, clusters: int = 64) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    # Las primeras dimensiones concentran la información, como en los modelos text-embedding-3
+    spectrum = 1 / np.sqrt(1 + np.arange(dim) / 64)
+    centers = rng.normal(size=(clusters, dim))
+    labels = rng.integers(clusters, size=rows)
+    vectors = np.empty((rows, dim), dtype=np.float32)
+    for start in range(0, rows, 4096):
+        block = slice(start, min(rows, start + 4096))
+        noise = rng.normal(size=(block.stop - block.start, dim))
+        vectors[block] = (centers[labels[block]] + 1.5 * noise) * spectrum
+    return truncate(vectors, dim)
+
+
+def make_queries(vectors: np.ndarray, count: int, noise: float, seed: int = 1) -> np.ndarray:
+    # Documentos perturbados: cada consulta tiene vecinos reales pero no coincide con ninguna fila
+    rng = np.random.default_rng(seed)
+    picked = vectors[rng.choice(len(vectors), count, replace=False)]
+    scale = np.abs(picked).mean(axis=1, keepdims=True)
+    return truncate(picked + noise * scale * rng.normal(size=picked.shape).astype(np.float32), picked.shape[1])
+
+
+def parse_configs(value: str, full_dim: int):
+    configs = []
+    for item in value.split(","):
+        dim, _, quantization = item.strip().partition(":")
+        configs.append((min(int(dim), full_dim), quantization or "none"))
+    return configs
+
+
+def build_index(vectors: np.ndarray, dim: int, quantization: str, rescore_factor: int) -> LocalVectorIndex:
+    index = LocalVectorIndex(dim=dim, capacity=len(vectors), quantization=quantization, rescore_factor=rescore_factor)
+    index.add({"id": str(i), "content": "-", "metadata": {}, "embedding": vector} for i, vector in enumerate(vectors))
+    return index
+
+
+def run_config(vectors, queries, truth, dim, quantization, k, rescore_factor, warmup):
+    started = time.perf_counter()
+    index = build_index(vectors, dim, quantization, rescore_factor)
+    build_seconds = time.perf_counter() - started
+    for query in queries[:warmup]:
+        index.search_sync(query, k=k)
+
+    latencies, recalls = [], []
+    for query, expected in zip(queries, truth):
+        started = time.perf_counter()
+        hits = index.search_sync(query, k=k)
+        latencies.append(time.perf_counter() - started)
+        recalls.append(len(expected & {int(hit["id"]) for hit in hits}) / k)
+
+    full_bytes = vectors.shape[1] * 4
+    scan_bytes = index.codec.bytes_per_vector
+    return {
+        "dim": dim,
+        "quantization": quantization,
+        "rescore_factor": rescore_factor if quantization != "none" else None,
+        f"recall@{k}": round(statistics.mean(recalls), 4),
+        "p50_ms": round(statistics.median(latencies) * 1000, 3),
+        "p95_ms": round(sorted(latencies)[int(0.95 * (len(latencies) - 1))] * 1000, 3),
+        # Memoria que se recorre en cada búsqueda (los códigos, o los float32 sin cuantizar)
+        "scan_bytes_per_vector": scan_bytes,
+        "scan_reduction": round(full_bytes / scan_bytes, 1),
+        # Float32 truncados que se guardan para la repuntuación (en disco con mmap)
+        "rescore_bytes_per_vector": dim * 4 if quantization != "none" else 0,
+        "build_s": round(build_seconds, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index", help="prefix of a saved local index (vector_store.py sync --out)")
+    parser.add_argument("--rows", type=int, default=20000, help="synthetic rows")
+    parser.add_argument("--dim", type=int, default=3072, help="synthetic dimensions")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--noise", type=float, default=0.5, help="query perturbation, relative to the vector scale")
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--rescore-factor", type=int, default=4)
+    parser.add_argument("--configs", default=DEFAULT_CONFIGS, help="comma-separated dim:quantization pairs")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--out")
+    args = parser.parse_args()
+
+    if args.index:
+        vectors = np.asarray(LocalVectorIndex.load(args.index, mmap=False, quantization="none")._vectors)
+    else:
+        vectors = synthetic_vectors(args.rows, args.dim)
+    queries = make_queries(vectors, min(args.queries, len(vectors)), args.noise)
+
+    # Verdad de referencia: búsqueda exacta con los vectores completos
+    scores = queries @ vectors.T
+    truth = [set(np.argpartition(-row, args.k - 1)[:args.k].tolist()) for row in scores]
+
+    results = []
+    for dim, quantization in parse_configs(args.configs, vectors.shape[1]):
+        result = run_config(vectors, queries, truth, dim, quantization, args.k, args.rescore_factor, args.warmup)
+        results.append(result)
+        print(f"{dim:>5} {quantization:<7} recall@{args.k} {result[f'recall@{args.k}']:.3f}  "
+              f"p50 {result['p50_ms']:7.2f} ms  scan {result['scan_bytes_per_vector']:>6} B/vector "
+              f"({result['scan_reduction']}x smaller)")
+
+    if args.out:
+        report = {"rows": len(vectors), "full_dim": int(vectors.shape[1]), "queries": len(queries),
+                  "source": args.index or "synthetic", "results": results}
+        Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.out).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+Memory and throughput of the API as the number of uvicorn workers grows,
+with the models in one shared inference process ("shared", what serve.py
+does with WEB_WORKERS > 1) or loaded by every worker ("private"). Runs the
+offline app (benchmarks/offline_app.py), so no external service is called.
+
+    uv run python benchmarks/workers.py --workers 1 2 4 --model-mb 1600
+    uv run python benchmarks/workers.py --modes shared --models real --out benchmarks/results/workers.json
+
+For each configuration it reports the RSS and PSS of every worker and of the
+inference process (PSS splits shared pages among the processes that map
+them, so its total is the real footprint), throughput and p50/p95 latency.
+`--model-mb` gives the fake models a footprint like BART-large-mnli (~1.6 GB);
+`--models real` loads the real classifier and VADER instead.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "benchmarks"))
+
+from offline import make_catalog, run_level, scenarios  # noqa: E402
+from serve import start_inference_server, stop  # noqa: E402
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def children(pid: int):
+    try:
+        return [int(child) for child in Path(f"/proc/{pid}/task/{pid}/children").read_text().split()]
+    except OSError:
+        return []
+
+
+def memory_mb(pid: int):
+    # smaps_rollup (Linux 4.14+) da RSS y PSS de todo el proceso en una sola lectura
+    fields = {}
+    try:
+        for line in Path(f"/proc/{pid}/smaps_rollup").read_text().splitlines():
+            name, _, value = line.partition(":")
+            if name in ("Rss", "Pss"):
+                fields[name.lower()] = round(int(value.split()[0]) / 1024, 1)
+    except OSError:
+        return {"rss": None, "pss": None}
+    return fields
+
+
+def worker_pids(master: int, expected: int):
+    # uvicorn arranca los workers como hijos del proceso principal (el tracker de multiprocessing también)
+    pids = [pid for pid in children(master) if "multiprocessing.resource_tracker" not in
+            Path(f"/proc/{pid}/cmdline").read_bytes().decode(errors="replace")]
+    return pids[:expected] if len(pids) >= expected else pids
+
+
+async def wait_ready(http, workers: int, timeout: float):
+    deadline = time.monotonic() + timeout
+    ready = 0
+    # Cada petición la atiende un worker cualquiera: se piden varias seguidas en 200
+    while ready < 4 * workers:
+        try:
+            response = await http.get("/ready")
+            ready = ready + 1 if response.status_code == 200 else 0
+        except Exception:
+            ready = 0
+        if time.monotonic() > deadline:
+            raise TimeoutError("The workers did not become ready")
+        await asyncio.sleep(0.05)
+
+
+async def run_config(args, workers: int, mode: str, documents):
+    import httpx
+
+    tmp = Path(tempfile.mkdtemp(prefix="bench-workers-"))
+    port = free_port()
+    env = {
+        **os.environ,
+        "BENCH_DOCUMENTS": str(args.documents),
+        "BENCH_DIM": str(args.dim),
+        "BENCH_EMBEDDING_MS": str(args.embedding_ms),
+        "BENCH_CLASSIFIER_MS": str(args.classifier_ms),
+        "BENCH_MODEL_MB": str(args.model_mb),
+        "BENCH_MODELS": args.models,
+        "VECTOR_STORE": "supabase",
+        "SUMMARY_CACHE_PATH": "",
+        "WIKIPEDIA_CACHE_PATH": "",
+        "EMBEDDING_STORE_PATH": "",
+        "JOB_STORE_PATH": "",
+        "INFERENCE_SOCKET": "",
+        "EMBEDDING_CACHE_PATH": "",
+        # Índices en memoria de cada worker al día con lo que insertan los demás (como con serve.py)
+        "SHARED_STATE_PATH": str(tmp / "shared_state.sqlite") if workers > 1 else "",
+    }
+    server = None
+    if mode == "shared":
+        env["INFERENCE_SOCKET"] = str(tmp / "inference.sock")
+        # Caché de embeddings de consultas en un archivo que leen todos los workers
+        env["EMBEDDING_CACHE_PATH"] = str(tmp / "embedding_cache.sqlite")
+        command = None if args.models == "real" else [
+            sys.executable, str(ROOT / "benchmarks" / "offline_app.py"), "--inference-socket",
+            env["INFERENCE_SOCKET"], "--model-mb", str(args.model_mb), "--classifier-ms", str(args.classifier_ms)]
+        server = start_inference_server(env["INFERENCE_SOCKET"], command, env=env)
+    if args.models == "real":
+        env["WARMUP"] = "classifier,sentiment"
+
+    uvicorn = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "offline_app:app", "--app-dir", str(ROOT / "benchmarks"),
+         "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=ROOT, env=env,
+    )
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=300, limits=limits) as http:
+            await wait_ready(http, workers, args.startup_timeout)
+            selected = scenarios(documents)
+            results = {}
+            for name in args.scenarios:
+                # Primeras peticiones: carga de modelos en cada worker (modo private) y cachés
+                await run_level(http, selected[name], args.warmup * workers, min(args.concurrency, workers))
+                results[name] = await run_level(http, selected[name], args.requests, args.concurrency)
+
+        pids = worker_pids(uvicorn.pid, workers)
+        per_worker = [memory_mb(pid) for pid in pids]
+        inference = memory_mb(server.pid) if server is not None else {"rss": 0.0, "pss": 0.0}
+        processes = per_worker + [memory_mb(uvicorn.pid), inference]
+        return {
+            "workers": workers,
+            "mode": mode,
+            "worker_rss_mb": [item["rss"] for item in per_worker],
+            "worker_pss_mb": [item["pss"] for item in per_worker],
+            "inference_rss_mb": inference["rss"],
+            "total_pss_mb": round(sum(item["pss"] or 0 for item in processes), 1),
+            "scenarios": results,
+        }
+    finally:
+        stop(uvicorn)
+        if server is not None:
+            stop(server)
+
+
+async def run(args):
+    from fakes import FakeEmbeddings
+
+    documents, _ = make_catalog(args.documents, FakeEmbeddings(dim=args.dim))
+    report = []
+    for workers in args.workers:
+        for mode in args.modes:
+            result = await run_config(args, workers, mode, documents)
+            report.append(result)
+            line = "  ".join(f"{name} {item['throughput_rps']:>7.1f} rps p95 {item['p95_ms']:>7.1f} ms"
+                             for name, item in result["scenarios"].items())
+            print(f"{workers:>2} workers {mode:<7} worker RSS {result['worker_rss_mb']} MB  "
+                  f"inference {result['inference_rss_mb']} MB  total PSS {result['total_pss_mb']} MB  {line}",
+                  flush=True)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--modes", nargs="+", choices=["shared", "private"], default=["shared", "private"])
+    parser.add_argument("--models", choices=["fake", "real"], default="fake")
+    parser.add_argument("--model-mb", type=int, default=0, help="Memory held by each copy of the fake models")
+    parser.add_argument("--scenarios", nargs="+", default=["classify_book", "search"])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--warmup", type=int, default=5, help="Unmeasured requests per worker before each scenario")
+    parser.add_argument("--documents", type=int, default=2000)
+    parser.add_argument("--dim", type=int, default=3072)
+    parser.add_argument("--embedding-ms", type=float, default=20, help="Simulated embeddings API latency")
+    parser.add_argument("--classifier-ms", type=float, default=5, help="Simulated classifier cost per text")
+    parser.add_argument("--startup-timeout", type=float, default=600)
+    parser.add_argument("--out")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if args.out:
+        Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.out).write_text(json.dumps({"config": {key: value for key, value in vars(args).items()
+                                                         if key != "out"}, "results": report}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
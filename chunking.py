@@ -0,0 +1,193 @@
+import asyncio
+import codecs
+import os
+import uuid
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+from dedup import DedupIndex, book_keys
+from executors import run_cpu
+from ingest import count_tokens
+from quantization import compact_columns
+
+CHUNK_SIZE_TOKENS = int(os.getenv("CHUNK_SIZE_TOKENS", "800"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "100"))
+# Fragmentos por llamada a embed_documents y llamadas simultáneas por libro
+CHUNK_EMBED_BATCH = int(os.getenv("CHUNK_EMBED_BATCH", "64"))
+CHUNK_EMBED_CONCURRENCY = int(os.getenv("CHUNK_EMBED_CONCURRENCY", "4"))
+# A partir de este tamaño el contenido de /upload_book se guarda por fragmentos
+# (text-embedding-3-large admite 8191 tokens por texto)
+LONG_BOOK_TOKENS = int(os.getenv("LONG_BOOK_TOKENS", "8000"))
+
+
+class StreamingSplitter:
+    """
+    Token-aware text splitter that accepts text incrementally. Only a bounded
+    window of text is kept in memory; complete chunks are returned as soon as
+    they are available. Splitting (and its token counting) runs on the CPU pool.
+    """
+
+    def __init__(self, chunk_size: int = CHUNK_SIZE_TOKENS, chunk_overlap: int = CHUNK_OVERLAP_TOKENS,
+                 length_function: Callable[[str], int] = count_tokens, window_chars: Optional[int] = None):
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+        self._splitter = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size, chunk_overlap=chunk_overlap, length_function=length_function,
+        )
+        # ~4 caracteres por token: la ventana contiene unos 8 fragmentos
+        self.window_chars = window_chars or chunk_size * 4 * 8
+        self._buffer = ""
+
+    async def feed(self, text: str) -> List[str]:
+        self._buffer += text
+        if len(self._buffer) < self.window_chars:
+            return []
+        chunks = await run_cpu(self._splitter.split_text, self._buffer)
+        if len(chunks) <= 1:
+            return []
+        # El último fragmento puede estar incompleto: se queda en el buffer
+        self._buffer = chunks[-1]
+        return chunks[:-1]
+
+    async def finish(self) -> List[str]:
+        chunks = await run_cpu(self._splitter.split_text, self._buffer) if self._buffer.strip() else []
+        self._buffer = ""
+        return chunks
+
+
+async def decode_stream(chunks: AsyncIterator[bytes], encoding: str = "utf-8") -> AsyncIterator[str]:
+    # Decodificador incremental: un carácter multibyte puede quedar partido entre dos trozos
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    async for chunk in chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+async def iter_text(text: str, piece_size: int = 1 << 16) -> AsyncIterator[str]:
+    for start in range(0, len(text), piece_size):
+        yield text[start:start + piece_size]
+
+
+def collapse_chunks(hits: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Keep only the best-ranked hit of each chunked book, so search results stay
+    at the book level. Hits are assumed to be sorted by relevance.
+    """
+    seen = set()
+    collapsed = []
+    for hit in hits:
+        parent_id = (hit.get("metadata") or {}).get("parent_id")
+        if parent_id:
+            if parent_id in seen:
+                continue
+            seen.add(parent_id)
+        collapsed.append(hit)
+    return collapsed
+
+
+class ChunkedIngester:
+    """
+    Stores a long book as token-sized chunks linked by `metadata.parent_id`,
+    embedding the chunks in parallel batches while the text is still arriving
+    """
+
+    def __init__(self, db, embeddings, dedup: DedupIndex,
+                 on_inserted: Optional[Callable[[List[Dict[str, Any]]], None]] = None, length_function: Callable[[str], int] = count_tokens,
+                 on_removed: Optional[Callable[[List[str]], None]] = None):
+        self.db = db
+        self.embeddings = embeddings
+        self.dedup = dedup
+        # Se avisa de cada lote insertado y, si el libro falla después, de los ids que se retiran
+        self.on_inserted = on_inserted
+        self.on_removed = on_removed
+        self.length_function = length_function
+
+    async def _store_batch(self, parent_id: str, metadata: Dict[str, Any], first_index: int,
+                           chunks: List[str]) -> List[Dict[str, Any]]:
+        vectors = await self.embeddings.aembed_documents(chunks)
+        rows = [{
+            # El fragmento 0 lleva el id del libro: las claves de duplicados apuntan a una fila
+            # real y el trigger que las libera al borrar el documento las encuentra
+            "id": parent_id if first_index + offset == 0 else str(uuid.uuid4()),
+            "content": chunk,
+            "metadata": {**metadata, "parent_id": parent_id, "chunk_index": first_index + offset},
+            "embedding": vector,
+            **compact_columns(vector),
+        } for offset, (chunk, vector) in enumerate(zip(chunks, vectors))]
+        await self.db.table("documents").insert(rows).execute()
+        return rows
+
+    async def ingest(self, text: AsyncIterator[str], metadata: Dict[str, Any]) -> Dict[str, Any]:
+        existing_id = await self.dedup.check(metadata)
+        if existing_id:
+            return {"success": False, "error": "El libro ya existe en la base de datos",
+                    "existing_document_id": existing_id}
+
+        parent_id = str(uuid.uuid4())
+        keys = book_keys(metadata)
+        if parent_id not in await self.dedup.claim({parent_id: keys}):
+            existing = await self.dedup.find_existing(keys)
+            return {"success": False, "error": "El libro ya existe en la base de datos",
+                    "existing_document_id": next(iter(existing.values()), None)}
+
+        splitter = StreamingSplitter(length_function=self.length_function)
+        # El semáforo limita los lotes en vuelo, y con ello el texto retenido en memoria
+        slots = asyncio.Semaphore(CHUNK_EMBED_CONCURRENCY)
+        tasks = []
+        batch: List[str] = []
+        total = 0
+        inserted_ids: List[str] = []
+
+        async def run(first_index, chunks):
+            try:
+                rows = await self._store_batch(parent_id, metadata, first_index, chunks)
+                inserted_ids.extend(row["id"] for row in rows)
+                if self.on_inserted is not None:
+                    # Aviso por lote: los fragmentos no se acumulan en memoria hasta el final
+                    self.on_inserted(rows)
+            finally:
+                slots.release()
+
+        async def flush():
+            nonlocal batch, total
+            await slots.acquire()
+            # Si un lote anterior falló, dejar de leer el cuerpo
+            for task in tasks:
+                if task.done() and not task.cancelled() and task.exception():
+                    slots.release()
+                    raise task.exception()
+            tasks.append(asyncio.create_task(run(total, batch)))
+            total += len(batch)
+            batch = []
+
+        async def append(chunks):
+            for chunk in chunks:
+                batch.append(chunk)
+                if len(batch) >= CHUNK_EMBED_BATCH:
+                    await flush()
+
+        try:
+            async for piece in text:
+                await append(await splitter.feed(piece))
+            await append(await splitter.finish())
+            if batch:
+                await flush()
+            await asyncio.gather(*tasks)
+        except BaseException:
+            # No dejar el libro a medias: borrar los fragmentos guardados y liberar sus claves
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self.db.table("documents").delete().eq("metadata->>parent_id", parent_id).execute()
+            await self.dedup.release(keys)
+            if inserted_ids and self.on_removed is not None:
+                self.on_removed(inserted_ids)
+            raise
+
+        if total == 0:
+            await self.dedup.release(keys)
+            return {"success": False, "error": "El contenido está vacío"}
+        return {"success": True, "document_id": parent_id, "chunks": total}
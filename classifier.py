@@ -0,0 +1,168 @@
+import asyncio
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from executors import cpu_pool
+from metrics import model_load_seconds, record_event
+
+# Categorías candidatas para el clasificador zero-shot
+CATEGORIES = [
+    "Fiction", "Non-fiction", "Science Fiction", "Fantasy", "Mystery",
+    "Romance", "Biography", "History", "Poetry", "Self-help",
+    "Business", "Travel", "Religion", "Science", "Philosophy",
+    "Art", "Thriller", "Horror", "Young Adult", "Children"
+]
+
+CLASSIFIER_MODEL = "facebook/bart-large-mnli"
+CLASSIFIER_MAX_BATCH_SIZE = int(os.getenv("CLASSIFIER_MAX_BATCH_SIZE", "8"))
+CLASSIFIER_MAX_WAIT_MS = float(os.getenv("CLASSIFIER_MAX_WAIT_MS", "10"))
+# "pipeline" (transformers en float32), "int8" (torch cuantizado) u "onnx" (onnxruntime); ver nli_backend.py
+CLASSIFIER_BACKEND = os.getenv("CLASSIFIER_BACKEND", "pipeline")
+
+
+def load_pipeline(model: str):
+    from transformers import pipeline
+    from nli_backend import CLASSIFIER_THREADS
+    if CLASSIFIER_THREADS:
+        import torch
+        torch.set_num_threads(CLASSIFIER_THREADS)
+    return pipeline("zero-shot-classification", model=model)
+
+
+class ZeroShotClassifier:
+    """
+    Process-wide zero-shot classification pipeline, loaded once and reused.
+    With an optimized `backend` that cannot be loaded (missing runtime or
+    exported model) it falls back to the transformers pipeline
+    """
+
+    def __init__(self, model: str = CLASSIFIER_MODEL, loader: Optional[Callable[[], Any]] = None,
+                 backend: str = CLASSIFIER_BACKEND):
+        self.model = model
+        self.backend = backend
+        self.active_backend: Optional[str] = None
+        self.backend_error: Optional[str] = None
+        self._loader = loader
+        self._pipeline = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._pipeline is not None
+
+    def load(self):
+        # Cargar el modelo una sola vez aunque varios hilos lo pidan a la vez
+        if self._pipeline is None:
+            with self._lock:
+                if self._pipeline is None:
+                    started = time.perf_counter()
+                    if self._loader is not None:
+                        self._pipeline, self.active_backend = self._loader(), "custom"
+                    else:
+                        self._pipeline, self.active_backend = self._load_backend()
+                    model_load_seconds.set(time.perf_counter() - started, model="zero_shot_classifier")
+        return self._pipeline
+
+    def _load_backend(self):
+        if self.backend != "pipeline":
+            try:
+                from nli_backend import load_backend
+                return load_backend(self.backend, self.model), self.backend
+            except Exception as e:
+                # El pipeline de transformers sigue disponible como alternativa
+                self.backend_error = str(e) or type(e).__name__
+                record_event("classifier_backend_fallback")
+        return load_pipeline(self.model), "pipeline"
+
+    def classify_batch(self, texts: Sequence[str], labels: Sequence[str] = CATEGORIES) -> List[Dict[str, Any]]:
+        """
+        Classify several texts in a single pipeline call
+        """
+        from nli_backend import CLASSIFIER_MAX_PAIRS
+        classifier = self.load()
+        # El pipeline zero-shot es un ChunkPipeline: batch_size cuenta pares (texto, categoría), no textos
+        batch_size = max(1, min(len(texts) * len(labels), CLASSIFIER_MAX_PAIRS))
+        output = classifier(list(texts), list(labels), batch_size=batch_size)
+        # El pipeline devuelve un dict (no una lista) cuando recibe un solo texto
+        return [output] if isinstance(output, dict) else list(output)
+
+
+class MicroBatcher:
+    """
+    Groups concurrent requests into batches and runs them with a single call
+    to `fn`. A batch is flushed when it reaches `max_batch_size` items or when
+    `max_wait_ms` have passed since its first item arrived.
+    """
+
+    def __init__(self, fn: Callable[[List[Any]], List[Any]], max_batch_size: int = CLASSIFIER_MAX_BATCH_SIZE,
+                 max_wait_ms: float = CLASSIFIER_MAX_WAIT_MS, executor=None):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.fn = fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.executor = executor
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _ensure_worker(self):
+        loop = asyncio.get_running_loop()
+        # La cola y el worker pertenecen a un event loop concreto (TestClient crea uno nuevo)
+        if self._loop is not loop or self._worker is None or self._worker.done():
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._run())
+
+    async def submit(self, item: Any) -> Any:
+        self._ensure_worker()
+        future = self._loop.create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            items = [item for item, _ in batch]
+            try:
+                results = await loop.run_in_executor(self.executor, self.fn, items)
+                if len(results) != len(items):
+                    raise RuntimeError(f"Batch function returned {len(results)} results for {len(items)} inputs")
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    async def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except (asyncio.CancelledError, RuntimeError):
+                pass
+            self._worker = None
+
+
+zero_shot_classifier = ZeroShotClassifier()
+classification_batcher = MicroBatcher(
+    lambda texts: zero_shot_classifier.classify_batch(texts, CATEGORIES),
+    executor=cpu_pool,
+)
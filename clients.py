@@ -0,0 +1,190 @@
+"""
+Process-wide HTTP clients for the upstream services (Supabase, OpenAI,
+Hugging Face, Wikipedia). Each service gets one pooled keep-alive client
+(HTTP/2 when `h2` is installed) created on first use, with its own timeouts
+and retries with exponential backoff, and every client is closed from the
+FastAPI lifespan hook.
+"""
+import asyncio
+import importlib.util
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+import httpx
+
+from metrics import registry
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+# httpx cierra las conexiones inactivas a los 5 s por defecto; entre ráfagas de tráfico eso obliga
+# a repetir el handshake TLS
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+HTTP2 = os.getenv("HTTP2", "true").lower() == "true" and importlib.util.find_spec("h2") is not None
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "3"))
+HTTP_RETRY_BACKOFF = float(os.getenv("HTTP_RETRY_BACKOFF", "0.25"))  # segundos; se dobla en cada intento
+HTTP_RETRY_MAX_BACKOFF = float(os.getenv("HTTP_RETRY_MAX_BACKOFF", "8"))
+
+# Timeout total (lectura/escritura) por servicio
+SERVICE_TIMEOUTS = {
+    "supabase": float(os.getenv("SUPABASE_TIMEOUT", "60")),
+    "openai": float(os.getenv("OPENAI_TIMEOUT", "60")),
+    "huggingface": float(os.getenv("HUGGINGFACE_TIMEOUT", "30")),
+    "wikipedia": float(os.getenv("WIKIPEDIA_TIMEOUT", "10")),
+}
+RETRY_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+http_retries = registry.counter("http_retries_total", "Upstream requests retried", ("service", "reason"))
+
+
+def retry_delay(attempt: int, response: Optional[httpx.Response] = None, base: float = HTTP_RETRY_BACKOFF,
+                cap: float = HTTP_RETRY_MAX_BACKOFF) -> float:
+    """
+    Seconds to wait before retry number `attempt` (1-based): the server's
+    Retry-After if it sent one, otherwise exponential backoff with full jitter
+    """
+    if response is not None:
+        retry_after = response.headers.get("retry-after")
+        if retry_after:
+            try:
+                return min(cap, max(0.0, float(retry_after)))
+            except ValueError:
+                try:
+                    return min(cap, max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time()))
+                except (TypeError, ValueError):
+                    pass
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+class RetryTransport(httpx.AsyncBaseTransport):
+    """
+    Retries failed connections for every request, and retryable statuses
+    (429, 5xx) or read timeouts only for requests that are safe to repeat:
+    idempotent methods, or any method when `retry_all_methods` is set (the
+    OpenAI endpoints we call have no side effects)
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, service: str, retries: int = HTTP_RETRIES,
+                 retry_all_methods: bool = False):
+        self.transport = transport
+        self.service = service
+        self.retries = retries
+        self.retry_all_methods = retry_all_methods
+
+    def _can_repeat(self, request: httpx.Request) -> bool:
+        return self.retry_all_methods or request.method in IDEMPOTENT_METHODS
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                response = await self.transport.handle_async_request(request)
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+                # La petición no llegó a enviarse: siempre se puede repetir
+                if attempt > self.retries:
+                    raise
+                reason = type(e).__name__
+                delay = retry_delay(attempt)
+            except (httpx.ReadTimeout, httpx.RemoteProtocolError) as e:
+                if attempt > self.retries or not self._can_repeat(request):
+                    raise
+                reason = type(e).__name__
+                delay = retry_delay(attempt)
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt > self.retries or not self._can_repeat(request):
+                    return response
+                reason = str(response.status_code)
+                delay = retry_delay(attempt, response)
+                await response.aclose()
+            http_retries.inc(service=self.service, reason=reason)
+            await asyncio.sleep(delay)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+def build_http_client(service: str, retries: int = HTTP_RETRIES, retry_all_methods: bool = False,
+                      **kwargs) -> httpx.AsyncClient:
+    """
+    Pooled keep-alive client for one upstream service. Extra keyword
+    arguments (base_url, headers...) go to httpx.AsyncClient
+    """
+    limits = httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                          keepalive_expiry=HTTP_KEEPALIVE_EXPIRY)
+    transport = RetryTransport(httpx.AsyncHTTPTransport(http2=HTTP2, limits=limits), service,
+                               retries=retries, retry_all_methods=retry_all_methods)
+    timeout = httpx.Timeout(SERVICE_TIMEOUTS.get(service, 30.0), connect=HTTP_CONNECT_TIMEOUT)
+    return httpx.AsyncClient(transport=transport, timeout=timeout, **kwargs)
+
+
+class ClientRegistry:
+    """
+    One client per upstream service for the whole process. Clients are
+    created on first use (importing the app opens no connections) and
+    closed together by `aclose()` at shutdown
+    """
+
+    def __init__(self):
+        self._http: Dict[str, httpx.AsyncClient] = {}
+        self._inference = None
+        self._lock = threading.Lock()
+
+    def http(self, service: str, **kwargs) -> httpx.AsyncClient:
+        client = self._http.get(service)
+        if client is None or client.is_closed:
+            with self._lock:
+                client = self._http.get(service)
+                if client is None or client.is_closed:
+                    # Los endpoints de OpenAI que usamos (embeddings, chat) no tienen efectos secundarios
+                    kwargs.setdefault("retry_all_methods", service == "openai")
+                    client = self._http[service] = build_http_client(service, **kwargs)
+        return client
+
+    def supabase(self, url: str, key: str):
+        """
+        PostgREST client for a Supabase project on the pooled "supabase" connection
+        """
+        from postgrest import AsyncPostgrestClient
+        headers = {"apikey": key, "Authorization": f"Bearer {key}"}
+        client = AsyncPostgrestClient(f"{url}/rest/v1", headers=headers)
+        # postgrest==1.0.1 (la versión fijada) no acepta http_client: se sustituye la sesión que crea,
+        # aún sin conexiones, por la del pool. Sus peticiones usan rutas relativas y las cabeceras de
+        # la sesión (apikey, Accept-Profile...), así que el pool las lleva todas
+        client.session = self.http("supabase", base_url=f"{url}/rest/v1", headers=dict(client.headers),
+                                   follow_redirects=True)
+        return client
+
+    def inference(self, model: str, token: Optional[str]):
+        """
+        Shared Hugging Face inference client. huggingface_hub keeps its own
+        HTTP session per client instance, so reusing the instance is what
+        keeps the connection alive
+        """
+        if self._inference is None or self._inference.model != model:
+            from huggingface_hub import AsyncInferenceClient
+            self._inference = AsyncInferenceClient(model=model, token=token,
+                                                   timeout=SERVICE_TIMEOUTS["huggingface"])
+        return self._inference
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "http2": HTTP2,
+            "services": sorted(service for service, client in self._http.items() if not client.is_closed),
+            "inference_client": self._inference is not None,
+        }
+
+    async def aclose(self):
+        clients, self._http = list(self._http.values()), {}
+        inference, self._inference = self._inference, None
+        await asyncio.gather(*(client.aclose() for client in clients), return_exceptions=True)
+        if inference is not None:
+            await inference.close()
+
+
+clients = ClientRegistry()
@@ -0,0 +1,142 @@
+import hashlib
+import re
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+# Tabla auxiliar con una fila por clave de libro (título normalizado, ISBN); ver migrations/
+BOOK_KEYS_TABLE = "book_keys"
+LOOKUP_CHUNK_SIZE = 100
+WARM_PAGE_SIZE = 10000
+
+
+def normalize_title(title: str) -> str:
+    # Sin acentos, minúsculas y espacios colapsados: "Don  Quijote" == "don quijote"
+    text = unicodedata.normalize("NFKD", str(title))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(text.lower().split())
+
+
+def normalize_isbn(isbn: Any) -> str:
+    return re.sub(r"[^0-9X]", "", str(isbn).upper())
+
+
+def book_keys(metadata: Dict[str, Any]) -> List[str]:
+    """
+    Dedup keys of a book: hashed normalized title and normalized ISBN
+    """
+    keys = []
+    title = metadata.get("title")
+    if title and normalize_title(title):
+        keys.append("title:" + hashlib.sha256(normalize_title(title).encode("utf-8")).hexdigest()[:32])
+    isbn = metadata.get("isbn")
+    if isbn and normalize_isbn(isbn):
+        keys.append("isbn:" + normalize_isbn(isbn))
+    return keys
+
+
+def _digest(key: str) -> bytes:
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=12).digest()
+
+
+def _chunked(items: List[Any], size: int) -> Iterable[List[Any]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class DedupIndex:
+    """
+    Duplicate detection backed by the `book_keys` table (unique `key` column)
+    plus an in-process set of known keys warmed at startup. A duplicate check
+    is at most one indexed lookup and never reads the `documents` table.
+    """
+
+    def __init__(self, db, table: str = BOOK_KEYS_TABLE):
+        self.db = db
+        self.table = table
+        self._known: Set[bytes] = set()
+        self.warmed = False
+
+    def __len__(self):
+        return len(self._known)
+
+    def remember(self, keys: Iterable[str]):
+        self._known.update(_digest(key) for key in keys)
+
+    def might_exist(self, keys: Iterable[str]) -> bool:
+        # Antes de calentar el índice no podemos descartar nada localmente
+        return not self.warmed or any(_digest(key) in self._known for key in keys)
+
+    async def warm(self, page_size: int = WARM_PAGE_SIZE):
+        """
+        Load every key into memory, paging by key so each query uses the index
+        """
+        last_key = None
+        while True:
+            query = self.db.table(self.table).select("key").order("key").limit(page_size)
+            if last_key is not None:
+                query = query.gt("key", last_key)
+            response = await query.execute()
+            rows = response.data or []
+            self.remember(row["key"] for row in rows)
+            if len(rows) < page_size:
+                break
+            last_key = rows[-1]["key"]
+        self.warmed = True
+
+    async def find_existing(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """
+        Return {key: document_id} for the given keys that are already taken
+        """
+        keys = sorted(set(keys))
+        found = {}
+        for chunk in _chunked(keys, LOOKUP_CHUNK_SIZE):
+            response = await self.db.table(self.table) \
+                .select("key, document_id") \
+                .in_("key", chunk) \
+                .execute()
+            for row in response.data or []:
+                found[row["key"]] = row["document_id"]
+        self.remember(found)
+        return found
+
+    async def claim(self, keys_by_document: Dict[str, List[str]]) -> Set[str]:
+        """
+        Atomically reserve keys for new documents. Returns the ids of documents
+        that got all their keys; partial claims (lost races) are released.
+        """
+        rows = [{"key": key, "document_id": document_id}
+                for document_id, keys in keys_by_document.items() for key in keys]
+        if not rows:
+            return set(keys_by_document)
+        response = await self.db.table(self.table) \
+            .upsert(rows, on_conflict="key", ignore_duplicates=True) \
+            .execute()
+        # Con ignore_duplicates PostgREST solo devuelve las filas realmente insertadas
+        inserted = {(row["key"], row["document_id"]) for row in response.data or []}
+        claimed, partial = set(), []
+        for document_id, keys in keys_by_document.items():
+            got = [key for key in keys if (key, document_id) in inserted]
+            if len(got) == len(keys):
+                claimed.add(document_id)
+                self.remember(keys)
+            else:
+                partial.extend(got)
+        if partial:
+            await self.release(partial)
+        return claimed
+
+    async def release(self, keys: List[str]):
+        # Se libera una reserva cuyo documento no llegó a insertarse
+        for chunk in _chunked(list(keys), LOOKUP_CHUNK_SIZE):
+            await self.db.table(self.table).delete().in_("key", chunk).execute()
+        self._known.difference_update(_digest(key) for key in keys)
+
+    async def check(self, metadata: Dict[str, Any]) -> Optional[Any]:
+        """
+        Return the id of an existing document with the same title or ISBN, if any
+        """
+        keys = book_keys(metadata)
+        if not keys or not self.might_exist(keys):
+            return None
+        existing = await self.find_existing(keys)
+        return next(iter(existing.values()), None)
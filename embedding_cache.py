@@ -0,0 +1,363 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from executors import run_cpu, run_io
+from metrics import model_load_seconds
+from storage import connect_sqlite, data_path
+
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "2048"))
+EMBEDDING_CACHE_TTL = float(os.getenv("EMBEDDING_CACHE_TTL", "0"))  # segundos; 0 = sin expiración
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", data_path("embedding_cache.sqlite"))  # vacío = solo en memoria
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-large")
+# Embeddings de los documentos ingeridos, por hash del texto (con los espacios normalizados) y el modelo
+# (vacío = solo en memoria). El archivo no se poda: crece con cada texto distinto que se ingiere
+EMBEDDING_STORE_PATH = os.getenv("EMBEDDING_STORE_PATH", data_path("embedding_store.sqlite"))
+EMBEDDING_STORE_MEMORY = int(os.getenv("EMBEDDING_STORE_MEMORY", "1024"))
+# Máximo de parámetros por consulta IN (...) en SQLite
+SQLITE_MAX_PARAMS = 500
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(text.split()).lower()
+
+
+def cache_key(text: str, model: str) -> str:
+    return hashlib.sha256(f"{model}\x00{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+def content_key(text: str, model: str) -> str:
+    # Los documentos conservan mayúsculas: el embedding se calcula sobre el texto tal cual. El prefijo
+    # evita reutilizar lo guardado con la clave de las consultas (texto en minúsculas)
+    return hashlib.sha256(f"content\x00{model}\x00{' '.join(text.split())}".encode("utf-8")).hexdigest()
+
+
+def default_embeddings(model: str = EMBEDDING_MODEL):
+    # langchain_openai importa el SDK de OpenAI completo (más de un segundo): solo al primer uso
+    from langchain_openai import OpenAIEmbeddings
+    from clients import clients
+    # Conexiones y reintentos los gestiona el cliente compartido de OpenAI
+    return OpenAIEmbeddings(model=model, http_async_client=clients.http("openai"), max_retries=0)
+
+
+class LazyEmbeddings:
+    """
+    Embeddings client built on first use, so importing the app does not load
+    the OpenAI SDK. Exposes the LangChain embeddings methods used by the app
+    """
+
+    def __init__(self, factory: Callable[[], Any] = default_embeddings, model: str = EMBEDDING_MODEL):
+        self.model = model
+        self._factory = factory
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._client is not None
+
+    def load(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    started = time.perf_counter()
+                    self._client = self._factory()
+                    model_load_seconds.set(time.perf_counter() - started, model="embeddings_client")
+        return self._client
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self.load().aembed_query(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.load().aembed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.load().embed_query(text)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.load().embed_documents(texts)
+
+
+class EmbeddingCache:
+    """
+    Bounded LRU cache of embeddings stored as float32 arrays, with optional TTL
+    and an optional SQLite file that keeps entries across restarts
+    """
+
+    def __init__(self, max_entries: int = EMBEDDING_CACHE_SIZE, ttl: float = EMBEDDING_CACHE_TTL,
+                 path: Optional[str] = EMBEDDING_CACHE_PATH or None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.path = path
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._conn = None
+
+    @property
+    def _db(self) -> Optional[sqlite3.Connection]:
+        # El archivo se abre en el primer uso, no al importar la app
+        if self._conn is None and self.path:
+            self._conn = connect_sqlite(self.path)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, model TEXT, vector BLOB, created_at REAL)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def _expired(self, created_at: float) -> bool:
+        return bool(self.ttl) and time.time() - created_at > self.ttl
+
+    def _remember(self, key: str, vector: np.ndarray, created_at: float):
+        self._entries[key] = (vector, created_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                vector, created_at = entry
+                if not self._expired(created_at):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return vector
+                del self._entries[key]
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT vector, created_at FROM embeddings WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and not self._expired(row[1]):
+                    vector = np.frombuffer(row[0], dtype=np.float32)
+                    self._remember(key, vector, row[1])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return vector
+
+            self.misses += 1
+            return None
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        """
+        Look up several keys at once (one SQLite query per 500 keys missing
+        from memory). Returns only the keys that were found
+        """
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            pending = []
+            for key in dict.fromkeys(keys):
+                entry = self._entries.get(key)
+                if entry is not None and not self._expired(entry[1]):
+                    self._entries.move_to_end(key)
+                    found[key] = entry[0]
+                    self.hits += 1
+                else:
+                    self._entries.pop(key, None)
+                    pending.append(key)
+
+            if self._db is not None:
+                for start in range(0, len(pending), SQLITE_MAX_PARAMS):
+                    block = pending[start:start + SQLITE_MAX_PARAMS]
+                    rows = self._db.execute(
+                        f"SELECT key, vector, created_at FROM embeddings WHERE key IN ({','.join('?' * len(block))})",
+                        block,
+                    ).fetchall()
+                    for key, blob, created_at in rows:
+                        if not self._expired(created_at):
+                            vector = np.frombuffer(blob, dtype=np.float32)
+                            self._remember(key, vector, created_at)
+                            found[key] = vector
+                            self.hits += 1
+                            self.disk_hits += 1
+            self.misses += sum(1 for key in pending if key not in found)
+        return found
+
+    def put(self, key: str, vector, model: str = ""):
+        self.put_many({key: vector}, model)
+
+    def put_many(self, vectors: Dict[str, Any], model: str = ""):
+        created_at = time.time()
+        arrays = {}
+        for key, vector in vectors.items():
+            array = np.asarray(vector, dtype=np.float32)
+            array.flags.writeable = False
+            arrays[key] = array
+        with self._lock:
+            for key, array in arrays.items():
+                self._remember(key, array, created_at)
+            if self._db is not None:
+                # Una sola transacción por lote
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, model, vector, created_at) VALUES (?, ?, ?, ?)",
+                    [(key, model, array.tobytes(), created_at) for key, array in arrays.items()],
+                )
+                self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM embeddings")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "memory_bytes": sum(vector.nbytes for vector, _ in self._entries.values()),
+        }
+
+
+class CachedEmbeddings:
+    """
+    Wraps a LangChain embeddings model so repeated queries skip the API call
+    """
+
+    def __init__(self, embeddings, cache: EmbeddingCache, model: Optional[str] = None):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model = model or getattr(embeddings, "model", "")
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key = cache_key(text, self.model)
+        # La búsqueda en disco es bloqueante; solo la sacamos del event loop si hay SQLite
+        vector = await run_io(self.cache.get, key) if self.cache.path else self.cache.get(key)
+        if vector is None:
+            vector = await self.embeddings.aembed_query(text)
+            if self.cache.path:
+                await run_io(self.cache.put, key, vector, self.model)
+            else:
+                self.cache.put(key, vector, self.model)
+            return list(vector)
+        return vector.tolist()
+
+    async def aembed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed several queries; the ones missing from the cache go in a single
+        `aembed_documents` call
+        """
+        keys = [cache_key(text, self.model) for text in texts]
+        found = await run_io(self.cache.get_many, keys) if self.cache.path else self.cache.get_many(keys)
+        missing = {key: text for key, text in zip(keys, texts) if key not in found}
+        if missing:
+            computed = dict(zip(missing, await self.embeddings.aembed_documents(list(missing.values()))))
+            if self.cache.path:
+                await run_io(self.cache.put_many, computed, self.model)
+            else:
+                self.cache.put_many(computed, self.model)
+            found = {**found, **{key: np.asarray(vector, dtype=np.float32) for key, vector in computed.items()}}
+        return [found[key].tolist() for key in keys]
+
+
+def reused_texts(keys: List[str], texts: List[str], missing: Dict[str, str]) -> List[str]:
+    """
+    Texts that do not need an API call: stored ones and repeats of a text
+    already requested in the same batch
+    """
+    first = set()
+    reused = []
+    for key, text in zip(keys, texts):
+        if key in missing and key not in first:
+            first.add(key)
+        else:
+            reused.append(text)
+    return reused
+
+
+class ContentAddressedEmbeddings:
+    """
+    Embeddings for ingestion, stored by a hash of the text (whitespace
+    normalized, case kept) and the model name: content that was already embedded (a re-upload, the same
+    description on another book, a repeated chunk) reuses the stored vector
+    instead of calling the API, and identical texts within one batch are
+    embedded once. Counts the API calls and tokens saved
+    """
+
+    def __init__(self, embeddings, store: EmbeddingCache, model: Optional[str] = None,
+                 token_counter: Optional[Callable[[str], int]] = None):
+        self.embeddings = embeddings
+        self.store = store
+        self.model = model or getattr(embeddings, "model", "")
+        self.token_counter = token_counter
+        self.api_calls = 0
+        self.api_calls_saved = 0
+        self.texts_embedded = 0
+        self.texts_reused = 0
+        self.tokens_saved = 0
+
+    async def _embed(self, texts: List[str], single: bool) -> List[List[float]]:
+        keys = [content_key(text, self.model) for text in texts]
+        found = await run_io(self.store.get_many, keys) if self.store.path else self.store.get_many(keys)
+        # Primera aparición de cada texto que no está guardado
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+
+        reused = len(texts) - len(missing)
+        if reused:
+            self.texts_reused += reused
+            if self.token_counter is not None:
+                # Tokenizar libros enteros lleva tiempo: se cuenta en el pool de CPU
+                self.tokens_saved += await run_cpu(self._count_tokens, reused_texts(keys, texts, missing))
+
+        if not missing:
+            self.api_calls_saved += 1
+            return [found[key].tolist() for key in keys]
+
+        if single:
+            fresh = [await self.embeddings.aembed_query(texts[0])]
+        else:
+            fresh = await self.embeddings.aembed_documents(list(missing.values()))
+        self.api_calls += 1
+        self.texts_embedded += len(missing)
+        computed = dict(zip(missing, fresh))
+        if self.store.path:
+            await run_io(self.store.put_many, computed, self.model)
+        else:
+            self.store.put_many(computed, self.model)
+        return [list(computed[key]) if key in computed else found[key].tolist() for key in keys]
+
+    def _count_tokens(self, texts: List[str]) -> int:
+        try:
+            return sum(self.token_counter(text) for text in texts)
+        except Exception:
+            # El contador es solo informativo: un fallo del tokenizador no debe romper la ingesta
+            return 0
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self._embed([text], single=True))[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return await self._embed(list(texts), single=False)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.store.stats(),
+            "api_calls": self.api_calls,
+            "api_calls_saved": self.api_calls_saved,
+            "texts_embedded": self.texts_embedded,
+            "texts_reused": self.texts_reused,
+            "tokens_saved": self.tokens_saved,
+        }
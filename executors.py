@@ -0,0 +1,62 @@
+import asyncio
+import functools
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable
+
+# Tamaño de los pools; configurables para ajustar a la máquina donde se despliega
+IO_POOL_SIZE = int(os.getenv("IO_POOL_SIZE", "32"))
+CPU_POOL_SIZE = int(os.getenv("CPU_POOL_SIZE", str(os.cpu_count() or 4)))
+
+# Llamadas bloqueantes de red sin cliente async (p. ej. SDKs síncronos)
+io_pool = ThreadPoolExecutor(max_workers=IO_POOL_SIZE, thread_name_prefix="io")
+# Inferencia de modelos locales (BART, VADER); torch libera el GIL en sus kernels
+cpu_pool = ThreadPoolExecutor(max_workers=CPU_POOL_SIZE, thread_name_prefix="cpu")
+# Escrituras en los índices en memoria: un solo hilo, así se aplican en el orden en que se
+# piden (retirar unos documentos nunca se adelanta a la inserción que deshace)
+index_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="index")
+
+
+async def run_in_pool(pool, fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Run a blocking callable on `pool` without blocking the event loop
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(pool, functools.partial(fn, *args, **kwargs))
+
+
+async def run_io(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    return await run_in_pool(io_pool, fn, *args, **kwargs)
+
+
+async def run_cpu(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    return await run_in_pool(cpu_pool, fn, *args, **kwargs)
+
+
+
+# Procesos para trabajo de CPU en Python puro (p. ej. VADER sobre libros completos), que
+# en hilos quedaría serializado por el GIL. Se crea en el primer uso.
+PROCESS_POOL_SIZE = int(os.getenv("PROCESS_POOL_SIZE", str(min(4, os.cpu_count() or 1))))
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    global _process_pool
+    if _process_pool is None:
+        with _process_pool_lock:
+            if _process_pool is None:
+                # "spawn": hacer fork de un proceso con hilos (uvicorn, pools) no es seguro
+                _process_pool = ProcessPoolExecutor(max_workers=PROCESS_POOL_SIZE,
+                                                    mp_context=multiprocessing.get_context("spawn"))
+    return _process_pool
+
+
+def shutdown_process_pool():
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is not None:
+            _process_pool.shutdown(wait=False, cancel_futures=True)
+            _process_pool = None
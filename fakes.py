@@ -0,0 +1,421 @@
+"""
+Local stand-ins for external services, used by the tests and benchmarks so
+they run without Supabase or network access.
+"""
+import asyncio
+import hashlib
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+
+def _column_value(row: Dict[str, Any], column: str) -> Any:
+    # Soporta columnas simples y rutas JSON del estilo metadata->>title
+    if "->>" in column:
+        base, field = column.split("->>", 1)
+        value = (row.get(base) or {}).get(field)
+        return None if value is None else str(value)
+    if "->" in column:
+        base, field = column.split("->", 1)
+        return (row.get(base) or {}).get(field)
+    return row.get(column)
+
+
+def _contains(metadata: Dict[str, Any], expected: Dict[str, Any]) -> bool:
+    return all(metadata.get(key) == value for key, value in expected.items())
+
+
+class _Params:
+    """Subset of httpx.QueryParams used by callers that tweak RPC params"""
+
+    def __init__(self, values: Optional[Dict[str, Any]] = None):
+        self.values = dict(values or {})
+
+    def set(self, key: str, value: Any) -> "_Params":
+        return _Params({**self.values, key: value})
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.values.get(key, default)
+
+
+class _Query:
+    def __init__(self, store: "InMemoryPostgrest", table: str):
+        self.store = store
+        self.table = table
+        self.columns = "*"
+        self.filters = []
+        self.order_by = None
+        self.params = _Params()
+        self.action = "select"
+        self.payload = None
+        self.on_conflict = None
+        self.ignore_duplicates = False
+
+    # Selección y filtros
+    def select(self, columns: str = "*", **kwargs):
+        self.columns = columns
+        return self
+
+    def filter(self, column: str, operator: str, value: Any):
+        ops = {"eq": lambda v: v == value, "neq": lambda v: v != value, "gt": lambda v: v is not None and v > value,
+               "gte": lambda v: v is not None and v >= value, "lt": lambda v: v is not None and v < value,
+               "lte": lambda v: v is not None and v <= value}
+        self.filters.append((column, ops[operator]))
+        return self
+
+    def eq(self, column: str, value: Any):
+        return self.filter(column, "eq", value)
+
+    def gt(self, column: str, value: Any):
+        return self.filter(column, "gt", value)
+
+    def gte(self, column: str, value: Any):
+        return self.filter(column, "gte", value)
+
+    def lte(self, column: str, value: Any):
+        return self.filter(column, "lte", value)
+
+    def in_(self, column: str, values: List[Any]):
+        allowed = set(values)
+        self.filters.append((column, lambda v: v in allowed))
+        return self
+
+    def order(self, column: str, desc: bool = False):
+        self.order_by = (column, desc)
+        return self
+
+    def limit(self, size: int):
+        self.params = self.params.set("limit", size)
+        return self
+
+    def range(self, start: int, end: int):
+        self.params = self.params.set("offset", start).set("limit", end - start + 1)
+        return self
+
+    # Escritura
+    def insert(self, rows, **kwargs):
+        self.action, self.payload = "insert", rows if isinstance(rows, list) else [rows]
+        return self
+
+    def upsert(self, rows, on_conflict: str = "", ignore_duplicates: bool = False, **kwargs):
+        self.action, self.payload = "upsert", rows if isinstance(rows, list) else [rows]
+        self.on_conflict = on_conflict or "id"
+        self.ignore_duplicates = ignore_duplicates
+        return self
+
+    def update(self, values: Dict[str, Any], **kwargs):
+        self.action, self.payload = "update", values
+        return self
+
+    def delete(self, **kwargs):
+        self.action = "delete"
+        return self
+
+    def _matches(self, row: Dict[str, Any]) -> bool:
+        return all(check(_column_value(row, column)) for column, check in self.filters)
+
+    def _project(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        if self.columns.strip() == "*":
+            return dict(row)
+        projected = {}
+        for column in (c.strip() for c in self.columns.split(",")):
+            alias, _, path = column.rpartition(":")
+            name = alias or (path.split("->")[-1].lstrip(">") if "->" in path else path)
+            projected[name] = _column_value(row, path)
+        return projected
+
+    async def execute(self):
+        self.store.calls.append((self.action, self.table))
+        rows = self.store.tables.setdefault(self.table, [])
+        if self.action in ("insert", "upsert"):
+            key = self.on_conflict or "id"
+            written = []
+            for new_row in self.payload:
+                current = next((row for row in rows if key in new_row and row.get(key) == new_row[key]), None)
+                if current is None:
+                    rows.append(dict(new_row))
+                    written.append(dict(new_row))
+                elif self.action == "insert":
+                    raise ValueError(f"duplicate key value violates unique constraint ({key})")
+                elif not self.ignore_duplicates:
+                    current.update(new_row)
+                    written.append(dict(current))
+            return SimpleNamespace(data=written)
+        if self.action == "update":
+            updated = [row for row in rows if self._matches(row)]
+            for row in updated:
+                row.update(self.payload)
+            return SimpleNamespace(data=[dict(row) for row in updated])
+        if self.action == "delete":
+            removed = [row for row in rows if self._matches(row)]
+            self.store.tables[self.table] = [row for row in rows if not self._matches(row)]
+            return SimpleNamespace(data=removed)
+
+        selected = [row for row in rows if self._matches(row)]
+        if self.order_by:
+            column, desc = self.order_by
+            selected.sort(key=lambda row: (_column_value(row, column) is None, _column_value(row, column)), reverse=desc)
+        offset = self.params.get("offset", 0)
+        limit = self.params.get("limit")
+        selected = selected[offset:offset + limit if limit is not None else None]
+        return SimpleNamespace(data=[self._project(row) for row in selected])
+
+
+class _RPC:
+    def __init__(self, store: "InMemoryPostgrest", name: str, arguments: Dict[str, Any]):
+        self.store = store
+        self.name = name
+        self.arguments = arguments
+        self.params = _Params()
+
+    async def execute(self):
+        self.store.calls.append(("rpc", self.name))
+        handler = self.store.functions[self.name]
+        return SimpleNamespace(data=handler(self.store, self.arguments, self.params.get("limit")))
+
+
+def match_documents(store: "InMemoryPostgrest", arguments: Dict[str, Any], limit: Optional[int]):
+    """
+    In-memory version of the `match_documents` SQL function (cosine similarity)
+    """
+    metadata_filter = arguments.get("filter") or {}
+    metadata_filter = metadata_filter.get("metadata", metadata_filter)
+    rows = [row for row in store.tables.get("documents", [])
+            if row.get("embedding") is not None and _contains(row.get("metadata") or {}, metadata_filter)]
+    if not rows:
+        return []
+    query = np.asarray(arguments["query_embedding"], dtype=np.float32)
+    matrix = np.asarray([row["embedding"] for row in rows], dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(query) or 1.0)
+    scores = matrix @ query / np.where(norms == 0, 1.0, norms)
+    order = np.argsort(-scores)[:limit]
+    return [{"id": rows[i]["id"], "content": rows[i]["content"], "metadata": rows[i]["metadata"],
+             "similarity": float(scores[i])} for i in order]
+
+
+def match_documents_by_ids(store: "InMemoryPostgrest", arguments: Dict[str, Any], limit: Optional[int]):
+    """
+    In-memory version of `match_documents_by_ids` (migrations/002_match_documents_by_ids.sql)
+    """
+    allowed = set(arguments["document_ids"])
+    rows = [row for row in store.tables.get("documents", []) if row.get("id") in allowed]
+    restricted = InMemoryPostgrest({"documents": rows})
+    return match_documents(restricted, {"query_embedding": arguments["query_embedding"]}, limit)
+
+
+def match_documents_compact(store: "InMemoryPostgrest", arguments: Dict[str, Any], limit: Optional[int]):
+    """
+    In-memory version of `match_documents_compact` (migrations/003_compact_embeddings.sql)
+    """
+    rows = [{**row, "embedding": row["embedding_compact"]} for row in store.tables.get("documents", [])
+            if row.get("embedding_compact") is not None]
+    return match_documents(InMemoryPostgrest({"documents": rows}), arguments, limit)
+
+
+def match_documents_compact_by_ids(store: "InMemoryPostgrest", arguments: Dict[str, Any], limit: Optional[int]):
+    allowed = set(arguments["document_ids"])
+    rows = [row for row in store.tables.get("documents", []) if row.get("id") in allowed]
+    return match_documents_compact(InMemoryPostgrest({"documents": rows}),
+                                   {"query_embedding": arguments["query_embedding"]}, limit)
+
+
+def match_documents_binary(store: "InMemoryPostgrest", arguments: Dict[str, Any], limit: Optional[int]):
+    """
+    In-memory version of `match_documents_binary`: Hamming shortlist of
+    `candidates` rows, ranked by cosine similarity
+    """
+    from quantization import BinaryCodec, shortlist
+
+    metadata_filter = arguments.get("filter") or {}
+    metadata_filter = metadata_filter.get("metadata", metadata_filter)
+    rows = [row for row in store.tables.get("documents", [])
+            if row.get("embedding") is not None and _contains(row.get("metadata") or {}, metadata_filter)]
+    if not rows:
+        return []
+    query = np.asarray(arguments["query_embedding"], dtype=np.float32)
+    codec = BinaryCodec(len(query))
+    codes, scales = codec.encode(np.asarray([row["embedding"] for row in rows], dtype=np.float32))
+    selected = [rows[i] for i in shortlist(codec.scores(codes, scales, query), arguments.get("candidates", 200))]
+    return match_documents(InMemoryPostgrest({"documents": selected}), {"query_embedding": query}, limit)
+
+
+def set_compact_embeddings(store: "InMemoryPostgrest", arguments: Dict[str, Any], limit: Optional[int]):
+    values = {row["id"]: row["embedding_compact"] for row in arguments["rows"]}
+    updated = 0
+    for row in store.tables.get("documents", []):
+        if row.get("id") in values:
+            row["embedding_compact"] = values[row["id"]]
+            updated += 1
+    return updated
+
+
+class InMemoryPostgrest:
+    """
+    In-memory replacement for the subset of AsyncPostgrestClient the API uses
+    """
+
+    def __init__(self, tables: Optional[Dict[str, List[Dict[str, Any]]]] = None):
+        self.tables = {name: [dict(row) for row in rows] for name, rows in (tables or {}).items()}
+        self.functions = {
+            "match_documents": match_documents,
+            "match_documents_by_ids": match_documents_by_ids,
+            "match_documents_compact": match_documents_compact,
+            "match_documents_compact_by_ids": match_documents_compact_by_ids,
+            "match_documents_binary": match_documents_binary,
+            "set_compact_embeddings": set_compact_embeddings,
+        }
+        self.calls = []
+
+    def table(self, name: str) -> _Query:
+        return _Query(self, name)
+
+    from_ = table
+
+    def rpc(self, name: str, arguments: Dict[str, Any]) -> _RPC:
+        return _RPC(self, name, arguments)
+
+    async def aclose(self):
+        pass
+
+
+class StubWikipedia:
+    """
+    Offline Wikipedia backend with the same interface as wiki.WikipediaClient
+    """
+
+    def __init__(self, pages: Optional[Dict[str, str]] = None, latency: float = 0.0, fail: bool = False):
+        self.pages = dict(pages or {})
+        self.latency = latency
+        self.fail = fail
+        self.calls = 0
+
+    async def fetch_context(self, title: str, sentences: int = 10, max_chars: int = 3000) -> str:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.fail:
+            raise ConnectionError("Wikipedia no disponible")
+        return self.pages.get(title, "")[:max_chars]
+
+    async def get_context(self, title: str, sentences: int = 10, max_chars: int = 3000) -> str:
+        try:
+            return await self.fetch_context(title, sentences=sentences, max_chars=max_chars)
+        except Exception:
+            return ""
+
+
+class FakeLLM:
+    """
+    Offline chat model with the `achat`/`astream_chat` interface of llama_index LLMs
+    """
+
+    def __init__(self, text: str = "Resumen de prueba.", latency: float = 0.0, chunk_size: int = 8, fail: bool = False):
+        self.text = text
+        self.latency = latency
+        self.chunk_size = chunk_size
+        self.fail = fail
+        self.calls = 0
+
+    async def achat(self, messages):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.fail:
+            raise ConnectionError("LLM no disponible")
+        return SimpleNamespace(message=SimpleNamespace(content=self.text))
+
+    async def astream_chat(self, messages):
+        self.calls += 1
+        if self.fail:
+            raise ConnectionError("LLM no disponible")
+
+        async def deltas():
+            for start in range(0, len(self.text), self.chunk_size):
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                yield SimpleNamespace(delta=self.text[start:start + self.chunk_size])
+
+        return deltas()
+
+
+class FakeEmbeddings:
+    """
+    Deterministic embeddings model: the same text always maps to the same
+    unit vector, so similarity rankings are stable across runs
+    """
+
+    def __init__(self, dim: int = 3072, latency: float = 0.0, model: str = "fake-embedding"):
+        self.dim = dim
+        self.latency = latency
+        self.model = model
+        self.calls = 0
+        self.texts = 0
+
+    def vector(self, text: str) -> List[float]:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        self.texts += len(texts)
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return [self.vector(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        self.texts += len(texts)
+        return [self.vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+class FakeZeroShotPipeline:
+    """
+    Stand-in for the transformers zero-shot pipeline: scores labels by how
+    often they appear in the text, with a small fixed cost per text
+    """
+
+    def __init__(self, cost: float = 0.0):
+        self.cost = cost
+        self.calls = 0
+        self.forward_passes = 0
+
+    def __call__(self, texts, labels, batch_size: int = 1, **kwargs):
+        self.calls += 1
+        single = isinstance(texts, str)
+        # Como el ChunkPipeline de transformers: cada pasada procesa batch_size pares (texto, categoría)
+        pairs = (1 if single else len(texts)) * len(labels)
+        self.forward_passes += -(-pairs // batch_size)
+        outputs = []
+        for text in [texts] if single else texts:
+            if self.cost:
+                time.sleep(self.cost)
+            lowered = text.lower()
+            raw = [1.0 + lowered.count(label.lower()) for label in labels]
+            total = sum(raw)
+            ranked = sorted(zip(labels, (score / total for score in raw)), key=lambda item: -item[1])
+            outputs.append({"sequence": text, "labels": [label for label, _ in ranked],
+                            "scores": [score for _, score in ranked]})
+        return outputs[0] if single else outputs
+
+
+class FakeSentimentAnalyzer:
+    """
+    VADER-compatible analyzer with a tiny word list (no lexicon download)
+    """
+
+    POSITIVE = {"good", "great", "love", "happy", "joy", "bueno", "feliz", "amor", "alegria"}
+    NEGATIVE = {"bad", "sad", "fear", "war", "death", "malo", "triste", "miedo", "guerra", "muerte"}
+
+    def polarity_scores(self, text: str) -> Dict[str, float]:
+        words = [word.strip(".,;:!?¡¿\"'()").lower() for word in text.split()]
+        score = sum(word in self.POSITIVE for word in words) - sum(word in self.NEGATIVE for word in words)
+        return {"compound": max(-1.0, min(1.0, score / 4))}
@@ -0,0 +1,322 @@
+"""
+Bulk ingestion of books into the `documents` table.
+
+Can be used from the API (`/upload_books`) or from the command line:
+
+    uv run python ingest.py books.jsonl --window 1000
+"""
+import argparse
+import asyncio
+import functools
+import json
+import os
+import sys
+import time
+import uuid
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Union
+
+from pydantic import ValidationError
+
+from dedup import DedupIndex, book_keys
+from executors import run_cpu
+from quantization import compact_columns
+from schemas import UploadBookParams
+
+# Límites de la API de embeddings de OpenAI: 300k tokens y 2048 textos por petición
+EMBED_BATCH_TOKENS = int(os.getenv("EMBED_BATCH_TOKENS", "250000"))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "512"))
+INSERT_CHUNK_SIZE = int(os.getenv("INSERT_CHUNK_SIZE", "500"))
+# Libros que se procesan juntos al leer un stream
+INGEST_WINDOW = int(os.getenv("INGEST_WINDOW", "1000"))
+
+DUPLICATE_ERROR = "El libro ya existe en la base de datos"
+
+
+@functools.lru_cache(maxsize=1)
+def _encoding():
+    import tiktoken
+    return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text: str) -> int:
+    return len(_encoding().encode(text, disallowed_special=()))
+
+
+def count_tokens_many(texts: List[str], counter: Callable[[str], int] = count_tokens) -> List[int]:
+    return [counter(text) for text in texts]
+
+
+def token_batches(token_counts: List[int], max_tokens: int = EMBED_BATCH_TOKENS,
+                  max_items: int = EMBED_BATCH_SIZE) -> List[List[int]]:
+    """
+    Split texts with the given token counts into batches of indices that stay
+    under the token and item limits of one embeddings request
+    """
+    batches, current, current_tokens = [], [], 0
+    for index, tokens in enumerate(token_counts):
+        if current and (current_tokens + tokens > max_tokens or len(current) >= max_items):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(index)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def chunked(items: List[Any], size: int) -> Iterable[List[Any]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class BulkIngester:
+    """
+    Inserts many books with set-based duplicate checks, batched embedding
+    calls and chunked bulk upserts. Books over `long_book_tokens` are stored
+    in chunks by `chunked_ingester` instead of joining the shared batches
+    """
+
+    def __init__(self, db, embeddings, dedup: DedupIndex,
+                 on_inserted: Optional[Callable[[List[Dict[str, Any]]], None]] = None, token_counter: Callable[[str], int] = count_tokens,
+                 chunked_ingester=None, long_book_tokens: Optional[int] = None):
+        # chunking importa este módulo: se importa al crear el ingester
+        from chunking import ChunkedIngester, LONG_BOOK_TOKENS
+
+        self.db = db
+        self.embeddings = embeddings
+        self.dedup = dedup
+        self.on_inserted = on_inserted
+        self.token_counter = token_counter
+        self.chunked_ingester = chunked_ingester or ChunkedIngester(db, embeddings, dedup, on_inserted=on_inserted,
+                                                                    length_function=token_counter)
+        self.long_book_tokens = LONG_BOOK_TOKENS if long_book_tokens is None else long_book_tokens
+
+    async def ingest(self, books: List[Union[UploadBookParams, Dict[str, Any], bytes]], start_index: int = 0) -> Dict[str, Any]:
+        started = time.perf_counter()
+        results: List[Optional[Dict[str, Any]]] = [None] * len(books)
+        pending = []
+
+        for position, book in enumerate(books):
+            index = start_index + position
+            try:
+                if isinstance(book, (bytes, str)):
+                    book = UploadBookParams.model_validate_json(book)
+                elif not isinstance(book, UploadBookParams):
+                    book = UploadBookParams.model_validate(book)
+            except ValidationError as e:
+                results[position] = {"index": index, "success": False, "error": str(e)}
+                continue
+            pending.append((position, book))
+
+        # 1. Duplicados: una consulta al índice de claves por grupo en lugar de una por libro
+        keys_by_position = {position: book_keys(book.metadata) for position, book in pending}
+        candidate_keys = [key for keys in keys_by_position.values() if self.dedup.might_exist(keys) for key in keys]
+        existing = await self.dedup.find_existing(candidate_keys) if candidate_keys else {}
+        seen_keys = {}
+        rows = []
+        for position, book in pending:
+            index = start_index + position
+            keys = keys_by_position[position]
+            taken = next((key for key in keys if key in existing), None)
+            if taken:
+                results[position] = {"index": index, "success": False, "error": DUPLICATE_ERROR,
+                                     "existing_document_id": existing[taken]}
+                continue
+            repeated = next((key for key in keys if key in seen_keys), None)
+            if repeated:
+                results[position] = {"index": index, "success": False, "error": "Libro repetido en el mismo lote",
+                                     "duplicate_of_index": seen_keys[repeated]}
+                continue
+            seen_keys.update((key, index) for key in keys)
+            rows.append((position, {
+                "id": str(uuid.uuid4()),
+                "content": book.content,
+                "metadata": book.metadata,
+                "embedding": None,
+            }))
+
+        # Tokenizar libros enteros lleva tiempo: todos los recuentos de una vez, en el pool de CPU
+        token_counts = dict(zip((position for position, _ in rows),
+                                await run_cpu(count_tokens_many, [row["content"] for _, row in rows], self.token_counter)))
+        # Un libro que supera el límite del modelo de embeddings haría fallar todo su lote: va por fragmentos
+        long_rows = [(position, row) for position, row in rows if token_counts[position] > self.long_book_tokens]
+        if long_rows:
+            long_positions = {position for position, _ in long_rows}
+            rows = [(position, row) for position, row in rows if position not in long_positions]
+
+        # Reservar las claves de una vez; si otra petición ganó la carrera el libro es duplicado
+        claimed = await self.dedup.claim({row["id"]: keys_by_position[position] for position, row in rows})
+        for position, row in rows:
+            if row["id"] not in claimed:
+                results[position] = {"index": start_index + position, "success": False, "error": DUPLICATE_ERROR}
+        rows = [(position, row) for position, row in rows if row["id"] in claimed]
+
+        # 2. Embeddings en lotes ajustados al límite de tokens
+        with_content = [(position, row) for position, row in rows if row["content"]]
+        failed = set()
+        for batch in token_batches([token_counts[position] for position, _ in with_content]):
+            batch_rows = [with_content[i] for i in batch]
+            try:
+                vectors = await self.embeddings.aembed_documents([row["content"] for _, row in batch_rows])
+                for (_, row), vector in zip(batch_rows, vectors):
+                    row["embedding"] = vector
+                    row.update(compact_columns(vector))
+            except Exception as e:
+                for position, _ in batch_rows:
+                    failed.add(position)
+                    results[position] = {"index": start_index + position, "success": False, "error": str(e)}
+
+        # 3. Inserción masiva por bloques
+        ready = [(position, row) for position, row in rows if position not in failed]
+        inserted_rows = []
+        for chunk in chunked(ready, INSERT_CHUNK_SIZE):
+            try:
+                await self.db.table("documents").upsert([row for _, row in chunk]).execute()
+                for position, row in chunk:
+                    results[position] = {"index": start_index + position, "success": True, "document_id": row["id"]}
+                inserted_rows.extend(row for _, row in chunk)
+            except Exception as e:
+                for position, _ in chunk:
+                    results[position] = {"index": start_index + position, "success": False, "error": str(e)}
+                    failed.add(position)
+
+        # Liberar las claves de los libros que no llegaron a insertarse
+        released = [key for position, _ in rows if position in failed for key in keys_by_position[position]]
+        if released:
+            await self.dedup.release(released)
+
+        if inserted_rows and self.on_inserted is not None:
+            self.on_inserted(inserted_rows)
+        inserted = len(inserted_rows)
+
+        # 4. Libros largos, uno a uno (cada uno embebe sus fragmentos en paralelo)
+        from chunking import iter_text
+        for position, row in long_rows:
+            index = start_index + position
+            try:
+                result = await self.chunked_ingester.ingest(iter_text(row["content"]), row["metadata"])
+            except Exception as e:
+                result = {"success": False, "error": str(e)}
+            results[position] = {"index": index, **result}
+            inserted += bool(result["success"])
+
+        elapsed = time.perf_counter() - started
+        return {
+            "success": inserted == len(books),
+            "total": len(books),
+            "inserted": inserted,
+            "failed": len(books) - inserted,
+            "elapsed_seconds": round(elapsed, 3),
+            "books_per_second": round(len(books) / elapsed, 2) if elapsed > 0 else None,
+            "results": results,
+        }
+
+    async def ingest_stream(self, books: AsyncIterator[Union[Dict[str, Any], bytes]], window: int = INGEST_WINDOW) -> Dict[str, Any]:
+        """
+        Ingest an async stream of books in windows of `window` items, so memory
+        stays bounded regardless of the stream length
+        """
+        started = time.perf_counter()
+        totals = {"total": 0, "inserted": 0, "failed": 0, "results": []}
+
+        async def flush(buffer):
+            summary = await self.ingest(buffer, start_index=totals["total"])
+            totals["total"] += summary["total"]
+            totals["inserted"] += summary["inserted"]
+            totals["failed"] += summary["failed"]
+            totals["results"].extend(summary["results"])
+
+        buffer = []
+        async for book in books:
+            buffer.append(book)
+            if len(buffer) >= window:
+                await flush(buffer)
+                buffer = []
+        if buffer:
+            await flush(buffer)
+
+        elapsed = time.perf_counter() - started
+        return {
+            "success": totals["inserted"] == totals["total"],
+            "total": totals["total"],
+            "inserted": totals["inserted"],
+            "failed": totals["failed"],
+            "elapsed_seconds": round(elapsed, 3),
+            "books_per_second": round(totals["total"] / elapsed, 2) if elapsed > 0 else None,
+            "results": totals["results"],
+        }
+
+
+async def split_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """
+    Split a byte stream into non-empty JSON lines. Lines are validated later by
+    BulkIngester, so a malformed line becomes a per-item error
+    """
+    pending = b""
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+    if pending.strip():
+        yield pending
+
+
+async def _iter_file(path: str, chunk_size: int = 1 << 16) -> AsyncIterator[bytes]:
+    handle = sys.stdin.buffer if path == "-" else open(path, "rb")
+    try:
+        while True:
+            chunk = handle.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        if handle is not sys.stdin.buffer:
+            handle.close()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Bulk-load books from a JSONL file ('-' for stdin)")
+    parser.add_argument("path")
+    parser.add_argument("--window", type=int, default=INGEST_WINDOW)
+    parser.add_argument("--show-errors", action="store_true")
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    from embedding_cache import (ContentAddressedEmbeddings, EmbeddingCache, EMBEDDING_STORE_MEMORY,
+                                 EMBEDDING_STORE_PATH, default_embeddings)
+    from clients import clients
+
+    load_dotenv()
+    supabase_url = os.getenv("SUPABASE_URL")
+    supabase_key = os.getenv("SUPABASE_SERVICE_KEY") or os.getenv("SUPABASE_ANON_KEY")
+    if not supabase_url or not supabase_key:
+        raise ValueError("Supabase URL and Key must be set in environment variables")
+
+    db = clients.supabase(supabase_url, supabase_key)
+    dedup = DedupIndex(db)
+    await dedup.warm()
+    embeddings = ContentAddressedEmbeddings(
+        default_embeddings(),
+        EmbeddingCache(max_entries=EMBEDDING_STORE_MEMORY, ttl=0, path=EMBEDDING_STORE_PATH or None),
+        token_counter=count_tokens,
+    )
+    ingester = BulkIngester(db, embeddings, dedup)
+    try:
+        summary = await ingester.ingest_stream(split_lines(_iter_file(args.path)), window=args.window)
+    finally:
+        await clients.aclose()
+
+    if args.show_errors:
+        for result in summary["results"]:
+            if not result["success"]:
+                print(json.dumps(result, ensure_ascii=False), file=sys.stderr)
+    summary.pop("results")
+    summary["embedding_api_calls_saved"] = embeddings.api_calls_saved
+    summary["embedding_tokens_saved"] = embeddings.tokens_saved
+    print(json.dumps(summary))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
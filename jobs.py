@@ -0,0 +1,383 @@
+"""
+Background enrichment pipeline: a book is accepted with a job id and then
+classified, embedded and inserted, and optionally summarized, by stage
+workers that batch the jobs waiting at each stage. Jobs are stored in SQLite,
+so their status survives restarts and unfinished jobs are resumed.
+
+With several API workers every process runs its own pipeline on the shared
+store: each job belongs to the process that accepted it, and the jobs of a
+process that stopped sending heartbeats are adopted by the others.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from executors import run_io
+from metrics import record_event, stage
+from storage import connect_sqlite, data_path
+
+# Vacío (sin DATA_DIR) = trabajos solo en memoria
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", data_path("jobs.sqlite"))
+# Máximo de trabajos por lote en cada etapa y espera máxima para llenarlo
+JOB_BATCH_SIZE = int(os.getenv("JOB_BATCH_SIZE", "16"))
+JOB_BATCH_WAIT_MS = float(os.getenv("JOB_BATCH_WAIT_MS", "50"))
+# Lotes procesados en paralelo por etapa
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# Los trabajos terminados se borran al arrancar pasado este tiempo (segundos; 0 = nunca)
+JOB_RETENTION = float(os.getenv("JOB_RETENTION", str(7 * 24 * 3600)))
+# Segundos sin latido tras los que los trabajos de un proceso pasan a otro
+JOB_LEASE = float(os.getenv("JOB_LEASE", "30"))
+
+STAGES = ("classify", "ingest", "summarize")
+FINISHED = ("done", "failed")
+
+
+class JobStore:
+    """
+    Durable job records in SQLite: status, current stage, input, result and
+    per-stage timings
+    """
+
+    def __init__(self, path: str = JOB_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+
+    @property
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = connect_sqlite(self.path)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, status TEXT, stage TEXT, payload TEXT, "
+                "result TEXT, error TEXT, timings TEXT, created_at REAL, updated_at REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)")
+            # Proceso que tiene el trabajo en sus colas (tablas creadas antes de existir la columna)
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+            if "owner" not in columns:
+                self._conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS job_workers (owner TEXT PRIMARY KEY, heartbeat REAL)")
+            self._conn.commit()
+        return self._conn
+
+    @staticmethod
+    def _row(job: Dict[str, Any]):
+        return (job["status"], job["stage"], json.dumps(job["payload"], ensure_ascii=False),
+                json.dumps(job["result"], ensure_ascii=False), job["error"], json.dumps(job["timings"]),
+                job["updated_at"], job["id"])
+
+    @staticmethod
+    def _job(row) -> Dict[str, Any]:
+        return {"id": row[0], "status": row[1], "stage": row[2], "payload": json.loads(row[3]),
+                "result": json.loads(row[4]), "error": row[5], "timings": json.loads(row[6]),
+                "created_at": row[7], "updated_at": row[8]}
+
+    def create_many(self, payloads: List[Dict[str, Any]], owner: Optional[str] = None) -> List[Dict[str, Any]]:
+        now = time.time()
+        jobs = [{"id": str(uuid.uuid4()), "status": "queued", "stage": STAGES[0], "payload": payload,
+                 "result": {}, "error": None, "timings": {}, "created_at": now, "updated_at": now}
+                for payload in payloads]
+        with self._lock:
+            self._db.executemany(
+                "INSERT INTO jobs (status, stage, payload, result, error, timings, updated_at, id, created_at, owner) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [self._row(job) + (job["created_at"], owner) for job in jobs],
+            )
+            self._db.commit()
+        return jobs
+
+    def save_many(self, jobs: List[Dict[str, Any]]):
+        # Un commit por lote de la etapa, no uno por trabajo
+        with self._lock:
+            self._db.executemany(
+                "UPDATE jobs SET status = ?, stage = ?, payload = ?, result = ?, error = ?, timings = ?, "
+                "updated_at = ? WHERE id = ?",
+                [self._row(job) for job in jobs],
+            )
+            self._db.commit()
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, status, stage, payload, result, error, timings, created_at, updated_at "
+                "FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return self._job(row) if row else None
+
+    def unfinished(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, status, stage, payload, result, error, timings, created_at, updated_at "
+                "FROM jobs WHERE status NOT IN ('done', 'failed') ORDER BY created_at"
+            ).fetchall()
+        return [self._job(row) for row in rows]
+
+    def heartbeat(self, owner: str):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO job_workers (owner, heartbeat) VALUES (?, ?)", (owner, time.time()))
+            self._db.commit()
+
+    def release(self, owner: str):
+        # Un proceso que se cierra deja sus trabajos pendientes libres para el siguiente que arranque
+        with self._lock:
+            self._db.execute("DELETE FROM job_workers WHERE owner = ?", (owner,))
+            self._db.commit()
+
+    def claim_orphans(self, owner: str, stale_before: float) -> List[Dict[str, Any]]:
+        """
+        Take over the unfinished jobs with no owner or whose owner has sent no
+        heartbeat since `stale_before`. Select and update run in one write
+        transaction, so two processes never adopt the same job
+        """
+        with self._lock:
+            db = self._db
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = db.execute(
+                    "SELECT id, status, stage, payload, result, error, timings, created_at, updated_at FROM jobs "
+                    "WHERE status NOT IN ('done', 'failed') AND (owner IS NULL OR (owner != ? AND owner NOT IN "
+                    "(SELECT owner FROM job_workers WHERE heartbeat >= ?))) ORDER BY created_at",
+                    (owner, stale_before),
+                ).fetchall()
+                db.executemany("UPDATE jobs SET owner = ? WHERE id = ?", [(owner, row[0]) for row in rows])
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+        return [self._job(row) for row in rows]
+
+    def purge(self, older_than: float) -> int:
+        with self._lock:
+            deleted = self._db.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?", (older_than,)
+            ).rowcount
+            self._db.commit()
+        return deleted
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return dict(rows)
+
+
+def public_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Job as returned by the status endpoint (without the book content)
+    """
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "stage": job["stage"] if job["status"] not in FINISHED else None,
+        "stages": [name for name in STAGES if name != "summarize" or job["payload"].get("summarize")],
+        "timings": job["timings"],
+        "result": job["result"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+    }
+
+
+class EnrichmentPipeline:
+    """
+    Runs each job through classify -> ingest (embed + insert) -> summarize.
+    Every stage has a queue and `workers` tasks that take up to `batch_size`
+    waiting jobs at once, so concurrent jobs share classifier forward passes,
+    embeddings requests and bulk inserts.
+
+    `classify(payload)` returns the /classify_book result, `ingest(books)`
+    returns one upload result per book and `summarize(title, description)`
+    returns the /get_summary result
+    """
+
+    def __init__(self, store: JobStore,
+                 classify: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]],
+                 ingest: Callable[[List[Dict[str, Any]]], Awaitable[List[Dict[str, Any]]]],
+                 summarize: Optional[Callable[[str, str], Awaitable[Dict[str, Any]]]] = None,
+                 batch_size: int = JOB_BATCH_SIZE, batch_wait_ms: float = JOB_BATCH_WAIT_MS,
+                 workers: int = JOB_WORKERS, retention: float = JOB_RETENTION, lease: float = JOB_LEASE):
+        self.store = store
+        self.classify = classify
+        self.ingest = ingest
+        self.summarize = summarize
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait_ms / 1000
+        self.workers = workers
+        self.retention = retention
+        self.lease = lease
+        # Identifica a este proceso en el almacén compartido
+        self.owner = uuid.uuid4().hex
+        self.adopted = 0
+        self._queues: Dict[str, asyncio.Queue] = {}
+        self._tasks: List[asyncio.Task] = []
+        self.batches = {name: 0 for name in STAGES}
+        self.processed = {name: 0 for name in STAGES}
+
+    async def start(self):
+        self._queues = {name: asyncio.Queue() for name in STAGES}
+        self._tasks = [asyncio.create_task(self._worker(name)) for name in STAGES for _ in range(self.workers)]
+        if self.retention:
+            await run_io(self.store.purge, time.time() - self.retention)
+        await run_io(self.store.heartbeat, self.owner)
+        # Retomar los trabajos que quedaron a medias en la etapa donde estaban
+        await self._adopt()
+        self._tasks.append(asyncio.create_task(self._keep_lease()))
+
+    async def _adopt(self):
+        for job in await run_io(self.store.claim_orphans, self.owner, time.time() - self.lease):
+            self.adopted += 1
+            self._queues[job["stage"]].put_nowait(job)
+
+    async def _keep_lease(self):
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            try:
+                await run_io(self.store.heartbeat, self.owner)
+                # Trabajos de otro worker que dejó de responder
+                await self._adopt()
+            except Exception:
+                record_event("job_store_error")
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        try:
+            await run_io(self.store.release, self.owner)
+        except Exception:
+            record_event("job_store_error")
+
+    async def submit(self, payloads: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        jobs = await run_io(self.store.create_many, payloads, self.owner)
+        for job in jobs:
+            self._queues[STAGES[0]].put_nowait(job)
+        return jobs
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await run_io(self.store.get, job_id)
+
+    async def _next_batch(self, queue: asyncio.Queue) -> List[Dict[str, Any]]:
+        loop = asyncio.get_running_loop()
+        batch = [await queue.get()]
+        deadline = loop.time() + self.batch_wait
+        while len(batch) < self.batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    def _next_stage(self, job: Dict[str, Any], current: str) -> Optional[str]:
+        following = STAGES[STAGES.index(current) + 1:]
+        for name in following:
+            if name == "summarize" and not (job["payload"].get("summarize") and self.summarize is not None):
+                continue
+            return name
+        return None
+
+    async def _worker(self, name: str):
+        queue = self._queues[name]
+        handler = getattr(self, f"_{name}")
+        while True:
+            batch = await self._next_batch(queue)
+            for job in batch:
+                job["status"] = "running"
+            started = time.perf_counter()
+            try:
+                with stage(f"job_{name}"):
+                    await handler(batch)
+            except Exception as e:
+                for job in batch:
+                    job["error"] = job["error"] or str(e)
+            elapsed = round(time.perf_counter() - started, 4)
+            self.batches[name] += 1
+            self.processed[name] += len(batch)
+
+            advanced = []
+            for job in batch:
+                job["timings"][name] = elapsed
+                job["updated_at"] = time.time()
+                following = None if job["error"] else self._next_stage(job, name)
+                if job["error"]:
+                    job["status"] = "failed"
+                    record_event("job_failed")
+                elif following is None:
+                    job["status"] = "done"
+                    record_event("job_done")
+                else:
+                    job["stage"] = following
+                    advanced.append((following, job))
+            try:
+                await run_io(self.store.save_many, batch)
+            except Exception:
+                # El trabajo sigue en memoria; solo se pierde su estado si el proceso se reinicia
+                record_event("job_store_error")
+            for following, job in advanced:
+                self._queues[following].put_nowait(job)
+
+    async def _classify(self, batch: List[Dict[str, Any]]):
+        # Concurrentes: el micro-batcher del clasificador las agrupa en un mismo forward pass
+        outcomes = await asyncio.gather(*(self.classify(job["payload"]) for job in batch), return_exceptions=True)
+        for job, outcome in zip(batch, outcomes):
+            if isinstance(outcome, Exception) or not outcome.get("success"):
+                # Sin etiquetas el libro se sube igual; el problema queda en el resultado
+                error = str(outcome) if isinstance(outcome, Exception) else outcome.get("error")
+                job["result"]["classification"] = {"error": error}
+                continue
+            metadata = job["payload"]["metadata"]
+            if outcome.get("category") and not (metadata.get("category") or metadata.get("categories")):
+                metadata["category"] = outcome["category"]
+            if outcome.get("dominant_sentiment") and not metadata.get("dominant_sentiment"):
+                metadata["dominant_sentiment"] = outcome["dominant_sentiment"]
+            job["result"]["classification"] = {
+                key: outcome[key] for key in ("category", "category_score", "model_source", "dominant_sentiment",
+                                              "sentiment_value", "category_error", "sentiment_error")
+                if key in outcome
+            }
+
+    async def _ingest(self, batch: List[Dict[str, Any]]):
+        # Un solo lote de embeddings e inserción para todos los trabajos de la etapa
+        results = await self.ingest([{"content": job["payload"]["content"], "metadata": job["payload"]["metadata"]}
+                                     for job in batch])
+        for job, result in zip(batch, results):
+            if result.get("success"):
+                job["result"]["document_id"] = result.get("document_id")
+                job["result"]["metadata"] = job["payload"]["metadata"]
+                # El texto ya está en documents: no hace falta conservarlo en el registro del trabajo
+                job["payload"]["content"] = None
+            else:
+                job["error"] = result.get("error") or "Error al subir el libro"
+                if result.get("existing_document_id"):
+                    job["result"]["existing_document_id"] = result["existing_document_id"]
+
+    async def _summarize(self, batch: List[Dict[str, Any]]):
+        async def one(job):
+            metadata = job["payload"]["metadata"]
+            return await self.summarize(str(metadata.get("title") or ""), str(metadata.get("description") or ""))
+
+        outcomes = await asyncio.gather(*(one(job) for job in batch), return_exceptions=True)
+        for job, outcome in zip(batch, outcomes):
+            # El libro ya está subido: un fallo del resumen no hace fallar el trabajo
+            if isinstance(outcome, Exception):
+                job["result"]["summary_error"] = str(outcome)
+            elif outcome.get("error"):
+                job["result"]["summary_error"] = outcome["error"]
+            else:
+                job["result"]["summary"] = outcome.get("summary_text")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": {name: queue.qsize() for name, queue in self._queues.items()},
+            "batches": dict(self.batches),
+            "processed": dict(self.processed),
+            "adopted": self.adopted,
+            "jobs": self.store.counts(),
+        }
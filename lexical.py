@@ -0,0 +1,185 @@
+import heapq
+import math
+import os
+import re
+import threading
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from dedup import normalize_title
+from executors import run_cpu
+from metadata_index import MetadataIndex
+from vector_store import iter_documents
+
+# Caracteres del contenido que se indexan por documento (los libros completos van por fragmentos)
+LEXICAL_CONTENT_CHARS = int(os.getenv("LEXICAL_CONTENT_CHARS", "20000"))
+# Peso de título y autores frente al contenido: una mención en el título cuenta como varias en el texto
+LEXICAL_TITLE_WEIGHT = int(os.getenv("LEXICAL_TITLE_WEIGHT", "5"))
+RRF_K = int(os.getenv("RRF_K", "60"))
+# Cargar el índice léxico al arrancar: lee id, contenido y metadatos de toda la tabla y los guarda
+# en la memoria de cada worker, así que es opcional
+LEXICAL_SEARCH = os.getenv("LEXICAL_SEARCH", "false").lower() == "true"
+SEARCH_MODES = ("vector", "hybrid", "lexical")
+
+_TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    # Sin acentos ni mayúsculas, como los títulos del índice de duplicados
+    return [token for token in _TOKEN.findall(normalize_title(text)) if len(token) > 1 or token.isdigit()]
+
+
+def document_terms(content: str, metadata: Dict[str, Any], content_chars: int = LEXICAL_CONTENT_CHARS) -> Counter:
+    terms = Counter(tokenize((content or "")[:content_chars]))
+    for field in ("title", "authors", "author"):
+        value = metadata.get(field)
+        if value:
+            for token in tokenize(" ".join(value) if isinstance(value, list) else str(value)):
+                terms[token] += LEXICAL_TITLE_WEIGHT
+    return terms
+
+
+def snippet(content: str, query: str, length: int, content_chars: int = LEXICAL_CONTENT_CHARS) -> str:
+    """
+    About `length` characters of `content` around the first query term it
+    contains (its beginning if none), cut at spaces and marked with "…"
+    """
+    content = content or ""
+    if len(content) <= length:
+        return content
+    terms = set(tokenize(query))
+    start = 0
+    if terms:
+        # Se compara palabra a palabra para que las posiciones sean las del texto original (con acentos)
+        for match in _TOKEN.finditer(content, 0, content_chars):
+            word = match.group().lower()
+            if word in terms or (not word.isascii() and normalize_title(word) in terms):
+                # Algo de contexto antes del término, que queda en el primer tercio
+                start = max(0, match.start() - length // 3)
+                break
+    end = min(len(content), start + length)
+    start = max(0, end - length)
+    if start > 0:
+        space = content.find(" ", start, end)
+        start = space + 1 if space != -1 else start
+    if end < len(content):
+        space = content.rfind(" ", start, end)
+        end = space if space > start else end
+    return ("…" if start > 0 else "") + content[start:end].strip() + ("…" if end < len(content) else "")
+
+
+class BM25Index:
+    """
+    In-process inverted index scored with Okapi BM25 over the document content
+    plus boosted title and author terms. Answers exact title and author
+    queries without calling the embeddings API.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, content_chars: int = LEXICAL_CONTENT_CHARS):
+        self.k1 = k1
+        self.b = b
+        self.content_chars = content_chars
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._lengths: Dict[str, int] = {}
+        self._documents: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+        self._total_length = 0
+        self.metadata_index = MetadataIndex()
+        self._lock = threading.Lock()
+        self.ready = False
+
+    def __len__(self):
+        return len(self._documents)
+
+    def add(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """
+        Index (or re-index) rows with `id`, `content` and `metadata`
+        """
+        added = 0
+        for row in rows:
+            if not row.get("content"):
+                continue
+            metadata = row.get("metadata") or {}
+            terms = document_terms(row["content"], metadata, self.content_chars)
+            with self._lock:
+                self._remove(row["id"])
+                for term, frequency in terms.items():
+                    self._postings.setdefault(term, {})[row["id"]] = frequency
+                length = sum(terms.values())
+                self._lengths[row["id"]] = length
+                self._total_length += length
+                self._documents[row["id"]] = (row["content"], metadata)
+            self.metadata_index.add(row["id"], metadata)
+            added += 1
+        return added
+
+    def remove(self, ids: Iterable[str]):
+        for document_id in ids:
+            with self._lock:
+                self._remove(document_id)
+            self.metadata_index.remove(document_id)
+
+    def _remove(self, document_id: str):
+        if document_id not in self._documents:
+            return
+        content, metadata = self._documents.pop(document_id)
+        for term in document_terms(content, metadata, self.content_chars):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(document_id, None)
+                if not postings:
+                    del self._postings[term]
+        self._total_length -= self._lengths.pop(document_id)
+
+    def search(self, query: str, k: int, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        Top-k documents by BM25 score, in the same row format as the vector stores
+        """
+        allowed = self.metadata_index.select(filters)
+        if allowed is not None and not allowed:
+            return []
+        with self._lock:
+            count = len(self._documents)
+            if not count:
+                return []
+            average_length = self._total_length / count
+            scores: Dict[str, float] = {}
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for document_id, frequency in postings.items():
+                    if allowed is not None and document_id not in allowed:
+                        continue
+                    norm = self.k1 * (1 - self.b + self.b * self._lengths[document_id] / average_length)
+                    scores[document_id] = scores.get(document_id, 0.0) + idf * frequency * (self.k1 + 1) / (frequency + norm)
+            best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+            return [{"id": document_id, "content": self._documents[document_id][0],
+                     "metadata": self._documents[document_id][1], "score": score} for document_id, score in best]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"documents": len(self._documents), "terms": len(self._postings), "ready": self.ready}
+
+
+def reciprocal_rank_fusion(rankings: Sequence[List[Dict[str, Any]]], k: int = RRF_K) -> List[Dict[str, Any]]:
+    """
+    Merge ranked hit lists: each hit scores sum(1 / (k + rank)) over the lists
+    where it appears
+    """
+    scores: Dict[str, float] = {}
+    hits: Dict[str, Dict[str, Any]] = {}
+    for ranking in rankings:
+        for rank, hit in enumerate(ranking, start=1):
+            scores[hit["id"]] = scores.get(hit["id"], 0.0) + 1.0 / (k + rank)
+            hits.setdefault(hit["id"], hit)
+    ordered = sorted(scores, key=scores.get, reverse=True)
+    return [{**hits[document_id], "rrf_score": round(scores[document_id], 6)} for document_id in ordered]
+
+
+async def load_from_postgrest(db, index: BM25Index, page_size: int = 500):
+    """
+    Index every row of `documents` (without embeddings), paging by id
+    """
+    async for rows in iter_documents(db, "id, content, metadata", page_size):
+        await run_cpu(index.add, rows)
+    index.ready = True
@@ -1,24 +1,85 @@
+import time
+# Tiempo de importación de la app (presupuesto de arranque: ver benchmarks/import_time.py)
+_import_started = time.perf_counter()
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import os
 from dotenv import load_dotenv
-from supabase import create_client
-from langchain_openai import OpenAIEmbeddings
-from langchain_community.vectorstores import SupabaseVectorStore
-from fastapi import Depends
-from schemas import SearchParams, SearchResult, SearchResponse, ErrorResponse, GetSummaryParams, UploadBookParams, ClassifyBookParams
-import wikipedia
-from llama_index.llms.openai import OpenAI
-from llama_index.core import Settings
-from llama_index.core.llms import ChatMessage, MessageRole
+from fastapi import Depends, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+import json
+from schemas import SearchParams, SearchResponse, ErrorResponse, SearchBatchParams, SearchBatchResponse, GetSummaryParams, UploadBookParams, UploadBooksParams, ClassifyBookParams, ClassifyBooksParams, EnrichBookParams, EnrichBooksParams
 import uuid
-import nltk
-from nltk.sentiment import SentimentIntensityAnalyzer
-from transformers import pipeline
-from huggingface_hub import InferenceClient
-import os
+from contextlib import asynccontextmanager
+import asyncio
+from classifier import CATEGORIES, zero_shot_classifier, classification_batcher
+from executors import index_pool, run_cpu, run_io, shutdown_process_pool
+from sentiment import sentiment_analyzer
+from wiki import wikipedia_client
+from embedding_cache import EmbeddingCache, CachedEmbeddings, ContentAddressedEmbeddings, LazyEmbeddings, EMBEDDING_STORE_MEMORY, EMBEDDING_STORE_PATH
+from search_cache import SearchResultCache, SEARCH_BATCH_MAX, first_depth, encode_cursor, decode_cursor, result_set_key
+from ingest import BulkIngester, split_lines
+from dedup import DedupIndex, book_keys
+from summaries import SummaryService, SummaryStore, SUMMARY_CACHE_PATH
+from vector_store import create_vector_store, fetch_documents
+from quantization import compact_columns
+from lexical import BM25Index, LEXICAL_SEARCH, SEARCH_MODES, load_from_postgrest, reciprocal_rank_fusion, snippet
+from metrics import MetricsMiddleware, record_event, registry, stage, startup_seconds
+from responses import COMPRESSION, CompressionMiddleware, FastJSONResponse
+from startup import StartupTracker, warmup_targets
+from clients import clients
+from jobs import EnrichmentPipeline, JobStore, JOB_STORE_PATH, public_job
+from chunking import ChunkedIngester, LONG_BOOK_TOKENS, collapse_chunks, decode_stream, iter_text
+from ingest import count_tokens
+from model_server import INFERENCE_SOCKET, InferenceClient, remote_models
+from shared_state import SHARED_STATE_PATH, SharedState, SharedStateStore
+
+# Con varios workers los modelos viven en un único proceso de inferencia (ver serve.py)
+inference_client = InferenceClient(INFERENCE_SOCKET) if INFERENCE_SOCKET else None
+if inference_client is not None:
+    zero_shot_classifier, classification_batcher, sentiment_analyzer = remote_models(inference_client)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    # Con varios workers: desde aquí se aplican los documentos que inserten los demás
+    if shared_state is not None:
+        await shared_state.start()
+    # Índices y modelos se cargan en segundo plano: la app responde desde el primer momento
+    # y /ready informa de qué subsistemas están listos
+    # Índice de duplicados; hasta que termine se consulta la tabla
+    startup.run("dedup_index", dedup_index.warm())
+    # Proceso de inferencia compartido: escucha cuando ya ha cargado los modelos
+    if inference_client is not None:
+        startup.run("inference_server", inference_client.wait_ready())
+    # Índice BM25 para búsquedas léxicas e híbridas; hasta que termine se usa solo el vectorial
+    if LEXICAL_SEARCH:
+        startup.run("lexical_index", load_from_postgrest(db, lexical_index))
+    # Modelos pedidos en WARMUP (PRELOAD_CLASSIFIER=true equivale a WARMUP=classifier)
+    for name in warmup_targets():
+        startup.warm(name, WARMUP_LOADERS[name])
+    # El índice local carga su copia en disco y se sincroniza con Supabase en segundo plano
+    await vector_store.start()
+    # Trabajos de /enrich_book; los que quedaron a medias se retoman
+    await enrichment_pipeline.start()
+    startup_seconds.set(time.perf_counter() - started, phase="lifespan")
+    yield
+    await enrichment_pipeline.close()
+    if shared_state is not None:
+        await shared_state.close()
+    await vector_store.close()
+    await startup.cancel()
+    await classification_batcher.close()
+    if inference_client is not None:
+        await inference_client.aclose()
+    await wikipedia_client.aclose()
+    # Cierra los pools de conexiones de Supabase, OpenAI, Hugging Face y Wikipedia
+    await clients.aclose()
+    shutdown_process_pool()
 
-app = FastAPI()
+
+app = FastAPI(lifespan=lifespan)
 
 # Configuración de CORS para permitir solicitudes desde la app React Native y otros orígenes
 origins = [
@@ -32,6 +93,13 @@ origins = [
     "*"                        # Cualquier origen (usar con precaución en producción)
 ]
 
+# gzip/brotli según Accept-Encoding; dentro de MetricsMiddleware para que "compress" salga en Server-Timing
+if COMPRESSION:
+    app.add_middleware(CompressionMiddleware)
+
+# Latencia por ruta y cabecera Server-Timing con las etapas medidas en cada petición
+app.add_middleware(MetricsMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Permitir solicitudes de cualquier origen para desarrollo
@@ -46,113 +114,209 @@ SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_KEY") or os.getenv("SUPABASE_ANON_KEY
 if not SUPABASE_URL or not SUPABASE_KEY:
     raise ValueError("Supabase URL and Key must be set in environment variables")
 
-from postgrest.exceptions import APIError
+# Cliente async de PostgREST (la API REST de Supabase) sobre el pool de conexiones compartido
+db = clients.supabase(SUPABASE_URL, SUPABASE_KEY)
+# OpenAIEmbeddings (AsyncOpenAI en aembed_query/aembed_documents), creado en el primer uso
+embeddings = LazyEmbeddings()
+# Caché de embeddings de consultas: las búsquedas repetidas no vuelven a llamar a OpenAI
+query_embeddings = CachedEmbeddings(embeddings, EmbeddingCache())
+# Embeddings de los documentos por hash del contenido: un texto ya ingerido no se vuelve a pagar
+document_embeddings = ContentAddressedEmbeddings(
+    embeddings,
+    EmbeddingCache(max_entries=EMBEDDING_STORE_MEMORY, ttl=0, path=EMBEDDING_STORE_PATH or None),
+    token_counter=count_tokens,
+)
+# Caché de resultados rankeados: las páginas siguientes de una consulta no repiten la búsqueda
+search_cache = SearchResultCache()
+# Índice de claves de libros (tabla book_keys + conjunto en memoria) para detectar duplicados
+dedup_index = DedupIndex(db)
+lexical_index = BM25Index()
+# Backend de búsqueda vectorial: RPC match_documents o índice local en memoria (VECTOR_STORE)
+vector_store = create_vector_store(db)
+
+
+def index_write_done(future):
+    if future.exception() is not None:
+        record_event("index_write_error")
+
+def update_indexes(*writes):
+    # Tokenizar libros largos o copiar la matriz de vectores al crecer lleva tiempo: cada (escritura,
+    # argumento) se aplica en el hilo de índices, fuera del bucle de eventos y en orden
+    futures = [index_pool.submit(write, argument) for write, argument in writes]
+    # Una búsqueda guardada en caché mientras tanto puede no incluir los cambios
+    futures.append(index_pool.submit(search_cache.invalidate))
+    for future in futures:
+        future.add_done_callback(index_write_done)
+
+def index_documents(rows):
+    # Los nuevos documentos pueden cambiar el ranking de cualquier búsqueda en caché
+    search_cache.invalidate()
+    update_indexes((vector_store.add, rows), (lexical_index.add, rows))
+
+def unindex_documents(ids):
+    search_cache.invalidate()
+    update_indexes((vector_store.remove, ids), (lexical_index.remove, ids))
+
+def documents_inserted(rows):
+    index_documents(rows)
+    # Los demás workers añaden los mismos documentos a sus índices en memoria
+    if shared_state is not None:
+        shared_state.publish([row["id"] for row in rows])
+
+def documents_removed(ids):
+    unindex_documents(ids)
+    if shared_state is not None:
+        shared_state.publish(ids)
 
-client = create_client(SUPABASE_URL, SUPABASE_KEY)
-client.postgrest.timeout = 60
-embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
-vectorstore = SupabaseVectorStore(
-    client=client,
-    table_name="documents",
-    embedding=embeddings,
+async def documents_inserted_elsewhere(ids):
+    """
+    Apply the documents another worker inserted or removed: rows still in the
+    table get the same indexes and cache invalidation as a local insert, plus
+    their duplicate keys; missing ones are dropped from the indexes
+    """
+    columns = "id, content, metadata, embedding" if vector_store.name == "local" else "id, content, metadata"
+    rows = await fetch_documents(db, ids, columns)
+    for row in rows:
+        dedup_index.remember(book_keys(row.get("metadata") or {}))
+    index_documents(rows)
+    found = {row["id"] for row in rows}
+    missing = [document_id for document_id in ids if document_id not in found]
+    if missing:
+        unindex_documents(missing)
+
+# Registro de cambios y métricas compartidos entre workers (serve.py con WEB_WORKERS > 1)
+shared_state = SharedState(SharedStateStore(SHARED_STATE_PATH), documents_inserted_elsewhere) if SHARED_STATE_PATH else None
+
+
+# Libros largos: se guardan en fragmentos enlazados por metadata.parent_id
+chunked_ingester = ChunkedIngester(db, document_embeddings, dedup_index, on_inserted=documents_inserted,
+                                   on_removed=documents_removed)
+bulk_ingester = BulkIngester(db, document_embeddings, dedup_index, on_inserted=documents_inserted,
+                             chunked_ingester=chunked_ingester)
+# Resúmenes: un único cliente LLM y caché persistente por (título, descripción, contexto, versión del prompt)
+summary_service = SummaryService(wikipedia_client, SummaryStore() if SUMMARY_CACHE_PATH else None)
+# Pipeline en segundo plano de /enrich_book (clasificar -> embeddings e inserción -> resumen)
+enrichment_pipeline = EnrichmentPipeline(
+    JobStore(JOB_STORE_PATH or ":memory:"),
+    classify=lambda payload: classify_payload(payload),
+    ingest=lambda books: upload_batch(books),
+    summarize=lambda title, description: summary_service.generate(title, description),
 )
+# Tareas de arranque en segundo plano y cargas que se pueden adelantar con WARMUP
+startup = StartupTracker()
+WARMUP_LOADERS = {
+    "classifier": zero_shot_classifier.load,
+    "sentiment": sentiment_analyzer.load,
+    "embeddings": embeddings.load,
+    "llm": lambda: summary_service.llm,
+}
+unknown_warmup = set(warmup_targets()) - set(WARMUP_LOADERS)
+if unknown_warmup:
+    raise ValueError(f"Unknown WARMUP targets: {sorted(unknown_warmup)}; expected {', '.join(WARMUP_LOADERS)}")
+
 
 @app.get("/")
 def read_root():
     return {"Hello": "World"}
 
-@app.post("/get_summary")
-async def get_summary(params: GetSummaryParams):
-    def get_wikipedia_content(title: str, sentences_per_section: int = 10, max_chars: int = 3000):
-        try:
-            page_results = wikipedia.search(title, results=1) 
-            if not page_results:
-                return ""
-            page_title_to_try = page_results[0]
-            page = None
+@app.get("/ready")
+def ready():
+    """
+    Readiness probe: 200 once the background startup work (indexes, WARMUP
+    models) has finished, 503 before. `/` stays the liveness check
+    """
+    is_ready = startup.done and vector_store.ready
+    body = {
+        "ready": is_ready,
+        "import_seconds": round(IMPORT_SECONDS, 3),
+        "startup": startup.status(),
+        "subsystems": {
+            "vector_store": vector_store.ready,
+            "dedup_index": dedup_index.warmed,
+            "lexical_index": lexical_index.ready if LEXICAL_SEARCH else "disabled",
+            "embeddings_client": embeddings.loaded,
+            "zero_shot_classifier": zero_shot_classifier.loaded,
+            "classifier_backend": getattr(zero_shot_classifier, "active_backend", None),
+            "sentiment": sentiment_analyzer.loaded,
+            "summary_llm": summary_service.loaded,
+            "inference_server": inference_client.status if inference_client is not None else "disabled",
+        },
+    }
+    return JSONResponse(body, status_code=200 if is_ready else 503)
 
-            try:
-                page = wikipedia.page(page_title_to_try, auto_suggest=False, redirect=True)
-            except wikipedia.exceptions.DisambiguationError as e:
-                relevant_option = next((opt for opt in e.options if title.lower() in opt.lower() or "(book)"))
-                if relevant_option:
-                    page = wikipedia.page(relevant_option, auto_suggest=False, redirect=True)
-                else:
-                    return ""
-            except wikipedia.exceptions.PageError:
-                return ""
-            except Exception as e_page:
-                return ""
-
-            if page and hasattr(page, "summary"):
-                summary_text = wikipedia.summary(page.title, sentences=sentences_per_section, auto_suggest=False)
-                if len(summary_text) > max_chars:
-                    summary_text = summary_text[:max_chars]
-                return summary_text.strip()
-            else:
-                return ""
-
-        except Exception as e_summary:
-            return ""
+def cache_metrics():
+    """
+    Hit/miss counters of the in-process caches, read at scrape time
+    """
+    caches = {
+        "embeddings": query_embeddings.cache.stats(),
+        "search_results": search_cache.stats(),
+        "wikipedia": wikipedia_client.stats(),
+        "summaries": summary_service.stats(),
+        "document_embeddings": document_embeddings.store.stats(),
+    }
+    for cache, stats in caches.items():
+        for field in ("hits", "stale_hits", "misses", "errors"):
+            if field in stats:
+                yield f"cache_{field}_total", "counter", f"Cache {field.replace('_', ' ')}", {"cache": cache}, stats[field]
+        if "entries" in stats:
+            yield "cache_entries", "gauge", "Entries held by each cache", {"cache": cache}, stats["entries"]
+    yield "embedding_api_calls_saved_total", "counter", "Embedding API calls avoided by the content store", {}, \
+        document_embeddings.api_calls_saved
+    yield "embedding_tokens_saved_total", "counter", "Tokens not sent to the embeddings API", {}, \
+        document_embeddings.tokens_saved
 
-    try:
-        llm = OpenAI(model="gpt-4.1-nano", temperature=0.7, max_tokens=1600)
-        Settings.llm = llm
-    except Exception as e_llm:
-        llm = None
-
-    system_prompt = (
-    "You are an expert librarian and a skilled summary writer. Your task is to write comprehensive, engaging, and strictly spoiler-free book summaries for catalogs. "
-    "The summary must be structured into exactly FOUR distinct paragraphs. "
-    "Each paragraph should ideally be between 100 and 250 words. "
-    "The summary must capture the main themes, an overview of the plot (without revealing spoilers, major twists, or the ending), key characters (if central to a non-spoiler overview), and the general tone of the work. "
-    "You must use all the information provided: the book title, the original description from the dataset, and any supplemental context from Wikipedia. Synthesize this information effectively. "
-    "CRITICALLY IMPORTANT: DO NOT REVEAL ANY SPOILERS, major plot twists, or the ending of the book. Maintain a neutral and informative tone suitable for a catalog."
-    "\n\nIf, even with all the provided information, you cannot create a meaningful, accurate, and spoiler-free summary adhering to the requested length (4 paragraphs, 100-250 words each) and structure, "
-    "or if the book is entirely unfamiliar and the provided details are grossly insufficient for such a summary, "
-    "please respond with the exact phrase: UNKNOWN_BOOK_INFO"
-    )
 
-    user_prompt_template_str = (
-    "Please generate a detailed, four-paragraph, spoiler-free summary for the following book. "
-    "Aim for each paragraph to be between 100 and 250 words.\n\n"
-    "Book Title: {title}\n\n"
-    "Original Description (from dataset):\n{original_description}\n\n"
-    "Supplemental Information (from Wikipedia):\n{wikipedia_context}\n\n"
-    "Summary (FOUR paragraphs, 100-250 words each, ABSOLUTELY NO SPOILERS):"
-)
+registry.register_collector(cache_metrics)
 
-    wikipedia_context = get_wikipedia_content(params.title)
-    
-    user_content_formatted = user_prompt_template_str.format(
-        title=params.title,
-        original_description = params.original_description,
-        wikipedia_context = wikipedia_context if wikipedia_context else "No Wikipedia context available"
-    )
+def job_metrics():
+    stats = enrichment_pipeline.stats()
+    for name, depth in stats["queued"].items():
+        yield "job_queue_depth", "gauge", "Jobs waiting at each pipeline stage", {"stage": name}, depth
+    for name, batches in stats["batches"].items():
+        yield "job_batches_total", "counter", "Batches run by each pipeline stage", {"stage": name}, batches
 
-    messages_for_llama_index = [
-        ChatMessage(role=MessageRole.SYSTEM, content=system_prompt),
-        ChatMessage(role=MessageRole.USER, content=user_content_formatted)
-    ]
 
-    try:
-        response = Settings.llm.chat(messages_for_llama_index)
-        summary_text = str(response.message.content).strip()
-        if summary_text.upper() == "UNKNOWN_BOOK_INFO" or not summary_text:
-            return {
-                "error": "Unable to generate summary for this book",
-                "summary_text": ""
-            }
-        else:
-            return {
-                "error": "",
-                "summary_text": summary_text
-            }
-    except Exception as e:
-        return {
-            "error": str(e),
-            "summary_text": ""
-        }
+registry.register_collector(job_metrics)
+
+@app.get("/metrics")
+async def metrics():
+    # Con varios workers, las muestras de todos ellos con la etiqueta worker. Los colectores consultan
+    # SQLite (trabajos, caché de Wikipedia): se ejecutan fuera del bucle de eventos
+    text = await shared_state.render_metrics() if shared_state is not None else await run_io(registry.render)
+    return PlainTextResponse(text, media_type="text/plain; version=0.0.4")
+
+@app.get("/cache_stats")
+def cache_stats():
+    return {
+        "embeddings": query_embeddings.cache.stats(),
+        "search_results": search_cache.stats(),
+        "wikipedia": wikipedia_client.stats(),
+        "summaries": summary_service.stats(),
+        "document_embeddings": document_embeddings.stats(),
+        "vector_store": vector_store.stats(),
+        "lexical_index": lexical_index.stats(),
+        "http_clients": clients.stats(),
+        "shared_state": shared_state.stats() if shared_state is not None else None,
+    }
+
+@app.post("/get_summary")
+async def get_summary(params: GetSummaryParams):
+    # Cliente LLM compartido; los resúmenes ya generados se sirven desde la caché
+    return await summary_service.generate(params.title, params.original_description)
+
+@app.post("/get_summary_stream")
+async def get_summary_stream(params: GetSummaryParams):
+    """
+    Same as /get_summary but sends the summary as Server-Sent Events while it
+    is generated: {"delta": ...} events, then {"done": ...} or {"error": ...}
+    """
+    async def events():
+        async for event in summary_service.stream(params.title, params.original_description):
+            yield f"data: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @app.post("/upload_book")
 async def upload_book(params: UploadBookParams):
@@ -161,42 +325,23 @@ async def upload_book(params: UploadBookParams):
         content = params.content
         metadata = params.metadata
         
-        # Verificar si el libro ya existe buscando por título en metadata
-        title = metadata.get('title')
-        if title:
-            # Consultar Supabase para buscar libros con el mismo título
-            try:
-                # Usar PostgreSQL JSON query para buscar en el campo metadata
-                response = client.table("documents") \
-                    .select("id, metadata") \
-                    .filter("metadata->>title", "eq", title) \
-                    .execute()
-                
-                if hasattr(response, 'data') and response.data:
-                    # El libro ya existe en la base de datos
-                    return {
-                        "success": False, 
-                        "error": "El libro ya existe en la base de datos", 
-                        "existing_document_id": response.data[0].get("id")
-                    }
-            except Exception as search_error:
-                # Alternativa si la sintaxis anterior no funciona
-                try:
-                    # Obtener todos los documentos y filtrar manualmente
-                    response = client.table("documents").select("id, metadata").execute()
-                    
-                    if hasattr(response, 'data') and response.data:
-                        for doc in response.data:
-                            doc_metadata = doc.get("metadata", {})
-                            if isinstance(doc_metadata, dict) and doc_metadata.get("title") == title:
-                                return {
-                                    "success": False, 
-                                    "error": "El libro ya existe en la base de datos", 
-                                    "existing_document_id": doc.get("id")
-                                }
-                except Exception as e:
-                    # Si falla la búsqueda, continuamos con la inserción normal
-                    pass
+        # Los textos que superan el límite del modelo de embeddings se guardan por fragmentos
+        if len(content) > LONG_BOOK_TOKENS and await run_cpu(count_tokens, content) > LONG_BOOK_TOKENS:
+            record_event("upload_book_chunked")
+            with stage("chunked_ingest"):
+                return await chunked_ingester.ingest(iter_text(content), metadata)
+        
+        # Verificar si el libro ya existe (título normalizado o ISBN) con el índice de claves
+        with stage("dedup_check"):
+            existing_id = await dedup_index.check(metadata)
+        if existing_id:
+            # El libro ya existe en la base de datos
+            record_event("upload_book_duplicate")
+            return {
+                "success": False, 
+                "error": "El libro ya existe en la base de datos", 
+                "existing_document_id": existing_id
+            }
         
         # Generar un UUID para el documento (siempre usar UUID válido para la columna id)
         document_id = str(uuid.uuid4())
@@ -207,81 +352,330 @@ async def upload_book(params: UploadBookParams):
             "metadata": metadata
         }
         
-        # Generar embeddings solo si hay contenido
-        if content:
-            try:
-                # Generar embedding usando el modelo configurado
-                text_embedding = embeddings.embed_query(content)
-                
-                # Si estamos usando vectorstore, usamos su método
-                # Usamos los IDs que ya hemos generado para asegurar consistencia
-                ids = vectorstore.add_documents(
-                    documents=[content],
-                    metadatas=[metadata],
-                    ids=[document_id]
-                )
-                
-                return {"success": True, "document_id": document_id}
-                
-            except Exception as e:
-                # Inserción directa con embedding generado
-                document_data["embedding"] = text_embedding
-                response = client.table("documents").insert(document_data).execute()
-                
-                if hasattr(response, 'error') and response.error:
-                    return {"success": False, "error": response.error.message}
-                
-                return {"success": True, "document_id": response.data[0].get("id") if response.data else None}
-        else:
-            # Si no hay contenido, insertar sin embeddings
-            response = client.table("documents").insert(document_data).execute()
-            
-            if hasattr(response, 'error') and response.error:
-                return {"success": False, "error": response.error.message}
-            
-            return {"success": True, "document_id": response.data[0].get("id") if response.data else None}
+        # Reservar las claves del libro; la restricción única evita duplicados entre peticiones concurrentes
+        keys = book_keys(metadata)
+        with stage("dedup_claim"):
+            claimed = document_id in await dedup_index.claim({document_id: keys})
+        if not claimed:
+            # Otra petición reservó el mismo título o ISBN entre la comprobación y la reserva
+            record_event("upload_book_claim_lost")
+            existing = await dedup_index.find_existing(keys)
+            return {
+                "success": False, 
+                "error": "El libro ya existe en la base de datos", 
+                "existing_document_id": next(iter(existing.values()), None)
+            }
+        
+        try:
+            # Generar embeddings solo si hay contenido
+            if content:
+                # Generar embedding usando el modelo configurado (una sola llamada a OpenAI)
+                with stage("embedding"):
+                    document_data["embedding"] = await document_embeddings.aembed_query(content)
+                document_data.update(compact_columns(document_data["embedding"]))
+
+            with stage("db_insert"):
+                response = await db.table("documents").insert(document_data).execute()
+        except Exception:
+            # Liberar las claves si el documento no llegó a insertarse
+            record_event("upload_book_keys_released")
+            await dedup_index.release(keys)
+            raise
+        
+        if hasattr(response, 'error') and response.error:
+            record_event("upload_book_keys_released")
+            await dedup_index.release(keys)
+            return {"success": False, "error": response.error.message}
+        
+        documents_inserted([document_data])
+        record_event("upload_book_inserted")
+        return {"success": True, "document_id": response.data[0].get("id") if response.data else document_id}
     
     except Exception as e:
+        record_event("upload_book_error")
         return {"success": False, "error": str(e)}
 
-@app.get("/search")
+async def upload_batch(books):
+    """
+    Upload a batch of books for the enrichment pipeline (long texts are
+    stored in chunks by the bulk ingester). Returns one result per book
+    """
+    return (await bulk_ingester.ingest(books))["results"]
+
+async def classify_payload(payload):
+    # Las etiquetas que ya traiga el libro se respetan (no se llama al modelo)
+    metadata = payload["metadata"]
+    category = metadata.get("category") or metadata.get("categories")
+    return await classify_text(ClassifyBookParams(
+        content=payload["content"],
+        category=";".join(category) if isinstance(category, list) else category,
+        dominant_sentiment=metadata.get("dominant_sentiment"),
+        sentiment_mode=payload.get("sentiment_mode"),
+    ))
+
+@app.post("/enrich_book", status_code=202)
+async def enrich_book(params: EnrichBookParams):
+    """
+    Queue a book to be classified, embedded, inserted and optionally
+    summarized in the background. Progress is available at /jobs/{job_id}
+    """
+    jobs = await enrichment_pipeline.submit([params.model_dump()])
+    return {"success": True, "job_id": jobs[0]["id"], "status": jobs[0]["status"]}
+
+@app.post("/enrich_books", status_code=202)
+async def enrich_books(params: EnrichBooksParams):
+    jobs = await enrichment_pipeline.submit([book.model_dump() for book in params.books])
+    return {"success": True, "job_ids": [job["id"] for job in jobs]}
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    job = await enrichment_pipeline.get(job_id)
+    if job is None:
+        return JSONResponse({"success": False, "error": "Trabajo no encontrado"}, status_code=404)
+    return public_job(job)
+
+@app.post("/upload_books")
+async def upload_books(params: UploadBooksParams):
+    try:
+        return await bulk_ingester.ingest(params.books)
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+@app.post("/upload_books_jsonl")
+async def upload_books_jsonl(request: Request):
+    # Un libro por línea (mismo formato que /upload_book); el cuerpo se procesa por ventanas
+    try:
+        return await bulk_ingester.ingest_stream(split_lines(request.stream()))
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+@app.post("/upload_book_stream")
+async def upload_book_stream(request: Request, metadata: str):
+    # El texto del libro llega en el cuerpo (text/plain) y se fragmenta mientras se recibe;
+    # los metadatos van como JSON en el parámetro `metadata`
+    try:
+        book_metadata = json.loads(metadata)
+        if not isinstance(book_metadata, dict):
+            return {"success": False, "error": "metadata debe ser un objeto JSON"}
+        return await chunked_ingester.ingest(decode_stream(request.stream()), book_metadata)
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+async def ranked_hits(query: str, mode: str, k: int, filters):
+    """
+    Top-k hits for a query: vector similarity, BM25, or both fused with
+    reciprocal rank fusion. The lexical path never calls the embeddings API
+    """
+    # Mientras el índice léxico se carga se responde con la búsqueda vectorial
+    use_lexical = mode != "vector" and lexical_index.ready
+    if mode != "vector" and not use_lexical:
+        record_event("lexical_index_not_ready")
+    if mode == "lexical" and use_lexical:
+        with stage("lexical_search"):
+            return await run_cpu(lexical_index.search, query, k, filters)
+    with stage("embedding"):
+        query_embedding = await query_embeddings.aembed_query(query)
+    # Los filtros se resuelven con el índice de metadatos antes de rankear
+    if not use_lexical:
+        with stage("vector_search"):
+            return await vector_store.search(query_embedding, k=k, filters=filters)
+
+    async def timed(name, awaitable):
+        with stage(name):
+            return await awaitable
+
+    vector_hits, lexical_hits = await asyncio.gather(
+        timed("vector_search", vector_store.search(query_embedding, k=k, filters=filters)),
+        timed("lexical_search", run_cpu(lexical_index.search, query, k, filters)),
+    )
+    return reciprocal_rank_fusion([vector_hits, lexical_hits])[:k]
+
+async def ranked_hits_many(requests):
+    """
+    ranked_hits for several (query, mode, k, filters) at once: the queries
+    are embedded with one embeddings call and ranked together by the vector
+    store (one matrix product in the local index, concurrent RPCs in Supabase)
+    """
+    results = [None] * len(requests)
+    lexical_ready = lexical_index.ready
+    vector_positions, lexical_positions = [], []
+    for position, (query, mode, k, filters) in enumerate(requests):
+        if mode != "vector" and not lexical_ready:
+            record_event("lexical_index_not_ready")
+        if mode != "lexical" or not lexical_ready:
+            vector_positions.append(position)
+        if mode != "vector" and lexical_ready:
+            lexical_positions.append(position)
+
+    async def vector_search():
+        if not vector_positions:
+            return []
+        with stage("embedding"):
+            vectors = await query_embeddings.aembed_queries([requests[position][0] for position in vector_positions])
+        with stage("vector_search"):
+            return await vector_store.search_many(vectors,
+                                                  [requests[position][2] for position in vector_positions],
+                                                  [requests[position][3] for position in vector_positions])
+
+    async def lexical_search():
+        with stage("lexical_search"):
+            return await asyncio.gather(*(run_cpu(lexical_index.search, requests[position][0], requests[position][2],
+                                                  requests[position][3]) for position in lexical_positions))
+
+    vector_results, lexical_results = await asyncio.gather(vector_search(), lexical_search())
+    vector_by_position = dict(zip(vector_positions, vector_results))
+    lexical_by_position = dict(zip(lexical_positions, lexical_results))
+    for position, (query, mode, k, filters) in enumerate(requests):
+        if position in vector_by_position and position in lexical_by_position:
+            results[position] = reciprocal_rank_fusion([vector_by_position[position],
+                                                        lexical_by_position[position]])[:k]
+        else:
+            results[position] = vector_by_position.get(position, lexical_by_position.get(position))
+    return results
+
+def search_filters(params: SearchParams):
+    """
+    (filters, cache key filters) of a search; the mode is part of the cache key and the cursor
+    """
+    filters = {
+        "dominant_sentiment": params.dominant_sentiment,
+        "category": params.category,
+        "author": params.author,
+        "year_from": params.year_from,
+        "year_to": params.year_to,
+    }
+    if params.mode not in SEARCH_MODES:
+        raise ValueError(f"mode must be one of {', '.join(SEARCH_MODES)}")
+    if params.snippet is not None and params.snippet <= 0:
+        raise ValueError("snippet must be a positive number of characters")
+    return filters, {**filters, "mode": params.mode}
+
+def page_bounds(params: SearchParams, cache_filters):
+    offset = params.offset
+    if params.cursor:
+        offset = decode_cursor(params.cursor, params.query, cache_filters)
+    return offset, offset + params.limit
+
+def search_fields(params: SearchParams):
+    # None = metadata completa
+    if not params.fields:
+        return None
+    return [field.strip() for field in params.fields.split(",") if field.strip()]
+
+def search_result(doc, params: SearchParams, fields):
+    doc_metadata = doc.get("metadata") or {}
+    result = {"uuid": doc_metadata.get("isbn") or doc_metadata.get("uuid") or ""}
+    if params.snippet:
+        result["content"] = snippet(doc["content"], params.query, params.snippet)
+    elif fields is None or "content" in fields:
+        result["content"] = doc["content"]
+    result["metadata"] = doc_metadata if fields is None else {
+        field: doc_metadata[field] for field in fields if field in doc_metadata}
+    return result
+
+def search_page(params: SearchParams, result_set, cache_filters, offset: int, end: int):
+    """
+    One page of a search as a plain dict in the SearchResponse format, ready for
+    FastJSONResponse (the page is built from cached hits; validating it again
+    with pydantic only costs time)
+    """
+    docs = result_set.hits
+    sliced = docs[offset:end]
+    fields = search_fields(params)
+
+    with stage("serialize"):
+        results = [search_result(doc, params, fields) for doc in sliced]
+    has_more = end < len(docs) or not result_set.can_serve(end + 1)
+    return {
+        "results": results,
+        "limit": params.limit,
+        "offset": offset,
+        "total": len(docs),
+        "next_cursor": encode_cursor(params.query, cache_filters, end) if has_more else None,
+    }
+
+@app.get("/search", responses={200: {"model": SearchResponse}})
 async def search(params: SearchParams = Depends()):
     try:
-        k = params.limit + params.offset
-        search_kwargs = {}
-        if params.dominant_sentiment:
-            search_kwargs["filter"] = {"metadata": {"dominant_sentiment": params.dominant_sentiment}}
-        
-        k = min(k, 50)
+        filters, cache_filters = search_filters(params)
+        offset, end = page_bounds(params, cache_filters)
         
-        docs = vectorstore.similarity_search(
-            query=params.query, 
-            k=k,
-            **search_kwargs
-        )
-        
-        end_idx = min(params.offset + params.limit, len(docs))
-        sliced = docs[params.offset:end_idx] if params.offset < len(docs) else []
+        # Reutilizar el ranking en caché; solo se vuelve a buscar si la página pide más de lo guardado
+        result_set = search_cache.get(params.query, cache_filters)
+        if result_set is None or not result_set.can_serve(end):
+            k = result_set.next_depth(end) if result_set else first_depth(end)
+            hits = await ranked_hits(params.query, params.mode, k, filters)
+            # Varios fragmentos del mismo libro cuentan como un solo resultado
+            result_set = search_cache.put(params.query, cache_filters, collapse_chunks(hits), depth=k, fetched=len(hits))
+        else:
+            record_event("search_page_from_cache")
         
-        results = [
-            SearchResult(
-                uuid=doc.metadata.get("isbn") or doc.metadata.get("uuid") or "",
-                content=doc.page_content,
-                metadata=doc.metadata
-            )
-            for doc in sliced
-        ]
-        return SearchResponse(
-            results=results,
-            limit=params.limit,
-            offset=params.offset,
-            total=len(docs)
-        )
+        return FastJSONResponse(search_page(params, result_set, cache_filters, offset, end))
     except Exception as e:
         return ErrorResponse(error=str(e))
 
+@app.post("/search_batch", responses={200: {"model": SearchBatchResponse}})
+async def search_batch(params: SearchBatchParams):
+    """
+    Run several searches in one request: the queries that are not cached are
+    embedded together and ranked in one vector store call. Each search gets
+    its own response (or error) in the same order
+    """
+    if len(params.searches) > SEARCH_BATCH_MAX:
+        return ErrorResponse(error=f"A batch can have at most {SEARCH_BATCH_MAX} searches")
+    responses = [None] * len(params.searches)
+    plans = {}
+    result_sets = {}
+    # Búsquedas repetidas en el lote (misma consulta, filtros y modo) se resuelven una vez
+    fetches = {}
+    for position, search_params in enumerate(params.searches):
+        try:
+            filters, cache_filters = search_filters(search_params)
+            offset, end = page_bounds(search_params, cache_filters)
+        except Exception as e:
+            responses[position] = ErrorResponse(error=str(e)).model_dump()
+            continue
+        key = result_set_key(search_params.query, cache_filters)
+        plans[position] = (key, cache_filters, offset, end)
+        result_set = result_sets.get(key) or search_cache.get(search_params.query, cache_filters)
+        if result_set is not None and result_set.can_serve(end):
+            result_sets[key] = result_set
+            record_event("search_page_from_cache")
+            continue
+        k = result_set.next_depth(end) if result_set else first_depth(end)
+        if key in fetches:
+            k = max(k, fetches[key][3])
+        fetches[key] = (search_params, filters, cache_filters, k)
+
+    if fetches:
+        try:
+            hits_lists = await ranked_hits_many([(search_params.query, search_params.mode, k, filters)
+                                                 for search_params, filters, _, k in fetches.values()])
+        except Exception as e:
+            return ErrorResponse(error=str(e))
+        for (key, (search_params, _, cache_filters, k)), hits in zip(fetches.items(), hits_lists):
+            # Varios fragmentos del mismo libro cuentan como un solo resultado
+            result_sets[key] = search_cache.put(search_params.query, cache_filters, collapse_chunks(hits),
+                                                depth=k, fetched=len(hits))
+
+    for position, (key, cache_filters, offset, end) in plans.items():
+        responses[position] = search_page(params.searches[position], result_sets[key], cache_filters, offset, end)
+    return FastJSONResponse({"responses": responses})
+
 @app.post("/classify_book")
 async def classify_book(params: ClassifyBookParams):
+    return await classify_text(params)
+
+@app.post("/classify_books")
+async def classify_books(params: ClassifyBooksParams):
+    """
+    Classify many texts in one call; the local classifier groups them into
+    shared forward passes and sentiment runs on the CPU pools
+    """
+    results = await asyncio.gather(*(classify_text(book) for book in params.books))
+    return {"success": all(result["success"] for result in results), "results": results}
+
+async def classify_text(params: ClassifyBookParams):
     try:
         # Inicializar valores de salida
         result = {
@@ -293,14 +687,6 @@ async def classify_book(params: ClassifyBookParams):
         category = params.category
         if not category:
             try:
-                # Definir posibles categorías de libros
-                categories = [
-                    "Fiction", "Non-fiction", "Science Fiction", "Fantasy", "Mystery", 
-                    "Romance", "Biography", "History", "Poetry", "Self-help",
-                    "Business", "Travel", "Religion", "Science", "Philosophy",
-                    "Art", "Thriller", "Horror", "Young Adult", "Children"
-                ]
-                
                 # Obtener solo los primeros 4000 caracteres para el clasificador
                 text_sample = params.content[:4000] if len(params.content) > 4000 else params.content
                 
@@ -310,35 +696,33 @@ async def classify_book(params: ClassifyBookParams):
                 
                 if use_inference_api and hf_token:
                     try:
-                        # Usar el cliente de inferencia de Hugging Face
-                        inference = InferenceClient(
-                            model="facebook/bart-large-mnli",
-                            token=hf_token
-                        )
-                        # Llamar a la API de inferencia con el cliente moderno
-                        classification = inference.zero_shot_classification(
-                            inputs=text_sample,
-                            candidate_labels=categories
-                        )
-                        # Obtener la categoría con mayor puntuación
-                        category = classification['labels'][0]
-                        score = classification['scores'][0]
+                        # Cliente de inferencia de Hugging Face compartido (mantiene la conexión abierta)
+                        inference = clients.inference("facebook/bart-large-mnli", hf_token)
+                        # Llamar a la API de inferencia con el cliente async
+                        with stage("hf_inference"):
+                            classification = await inference.zero_shot_classification(
+                                text_sample,
+                                candidate_labels=CATEGORIES
+                            )
+                        # Obtener la categoría con mayor puntuación (la API devuelve elementos ordenados)
+                        top = max(classification, key=lambda item: item.score)
+                        category = top.label
+                        score = top.score
                         
                         # Añadir información de cómo se obtuvo la clasificación
                         result["model_source"] = "huggingface_api"
                         
                     except Exception as e:
                         # En caso de error, intentar con el modelo local
+                        record_event("hf_api_fallback")
                         result["api_error"] = str(e)
                         use_inference_api = False
                 
                 if not use_inference_api or not hf_token:
-                    # Inicializar el clasificador zero-shot local
-                    classifier = pipeline("zero-shot-classification", 
-                                        model="facebook/bart-large-mnli")
-                    
-                    # Clasificar el contenido localmente
-                    classification = classifier(text_sample, categories)
+                    # Clasificar con el modelo local compartido; las peticiones concurrentes
+                    # se agrupan en un solo forward pass
+                    with stage("zero_shot"):
+                        classification = await classification_batcher.submit(text_sample)
                     
                     # Obtener la categoría con mayor puntuación
                     category = classification['labels'][0]
@@ -360,26 +744,13 @@ async def classify_book(params: ClassifyBookParams):
         sentiment = params.dominant_sentiment
         if not sentiment:
             try:
-                # Usar NLTK para análisis de sentimiento
-                sia = SentimentIntensityAnalyzer()
-                
-                # Obtener muestra del texto para análisis
-                text_sample = params.content[:5000] if len(params.content) > 5000 else params.content
-                
-                # Analizar el sentimiento
-                sentiment_scores = sia.polarity_scores(text_sample)
-                
-                # Determinar el sentimiento dominante y su valor
-                compound_score = sentiment_scores['compound']
-                if compound_score >= 0.05:
-                    dominant_sentiment = "joy"
-                elif compound_score <= -0.05:
-                    dominant_sentiment = "fear"
-                else:
-                    dominant_sentiment = "neutral"
-                
-                result["dominant_sentiment"] = dominant_sentiment
-                result["sentiment_value"] = compound_score
+                # VADER compartido; en modo "sentences" se puntúa el texto completo frase a frase
+                with stage("sentiment"):
+                    sentiment_scores = await sentiment_analyzer.analyze(params.content, mode=params.sentiment_mode)
+                result["dominant_sentiment"] = sentiment_scores["label"]
+                result["sentiment_value"] = sentiment_scores["compound"]
+                if "sentences" in sentiment_scores:
+                    result["sentiment_sentences"] = sentiment_scores["sentences"]
                 
             except Exception as e:
                 result["sentiment_error"] = str(e)
@@ -391,3 +762,7 @@ async def classify_book(params: ClassifyBookParams):
         
     except Exception as e:
         return {"success": False, "error": str(e)}
+
+
+IMPORT_SECONDS = time.perf_counter() - _import_started
+startup_seconds.set(IMPORT_SECONDS, phase="import")
@@ -0,0 +1,182 @@
+import bisect
+import threading
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Set
+
+from dedup import normalize_title
+
+# Filtros de /search que se resuelven con el índice (además de la consulta)
+FILTER_FIELDS = ("dominant_sentiment", "category", "author", "year_from", "year_to")
+
+
+def _split(value: Any) -> List[str]:
+    # El dataset guarda autores y categorías como "A;B"; classify_book usa listas o una cadena
+    if value is None:
+        return []
+    items = value if isinstance(value, (list, tuple)) else str(value).split(";")
+    return [normalize_title(item) for item in items if item is not None and normalize_title(item)]
+
+
+def _year(value: Any) -> Optional[int]:
+    try:
+        return int(float(str(value)[:4])) if value not in (None, "") else None
+    except ValueError:
+        return None
+
+
+def index_fields(metadata: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Normalized filterable fields of a document's metadata
+    """
+    sentiment = metadata.get("dominant_sentiment")
+    return {
+        "dominant_sentiment": str(sentiment).lower() if sentiment else None,
+        "categories": set(_split(metadata.get("categories")) + _split(metadata.get("category"))),
+        "authors": set(_split(metadata.get("authors")) + _split(metadata.get("author"))),
+        "year": _year(metadata.get("published_year")),
+    }
+
+
+def active_filters(filters: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    filters = {name: value for name, value in (filters or {}).items() if value not in (None, "")}
+    unknown = set(filters) - set(FILTER_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown search filters: {sorted(unknown)}")
+    return filters
+
+
+def matches(metadata: Dict[str, Any], filters: Optional[Dict[str, Any]]) -> bool:
+    """
+    Evaluate the search filters against one document (same rules as MetadataIndex.select)
+    """
+    filters = active_filters(filters)
+    if not filters:
+        return True
+    fields = index_fields(metadata)
+    if "dominant_sentiment" in filters and fields["dominant_sentiment"] != str(filters["dominant_sentiment"]).lower():
+        return False
+    if "category" in filters and normalize_title(filters["category"]) not in fields["categories"]:
+        return False
+    if "author" in filters and not any(_author_matches(name, filters["author"]) for name in fields["authors"]):
+        return False
+    year = fields["year"]
+    if "year_from" in filters and (year is None or year < int(filters["year_from"])):
+        return False
+    if "year_to" in filters and (year is None or year > int(filters["year_to"])):
+        return False
+    return True
+
+
+def _author_matches(name: str, query: str) -> bool:
+    # "cervantes" encuentra "miguel de cervantes saavedra"
+    return all(token in name.split() for token in normalize_title(query).split())
+
+
+class MetadataIndex:
+    """
+    Inverted index from metadata values (sentiment, category, author, year)
+    to document keys, so filtered searches can restrict the candidate set
+    before ranking instead of filtering a fixed number of ranked hits
+    """
+
+    def __init__(self):
+        self._fields: Dict[Hashable, Dict[str, Any]] = {}
+        self._sentiments: Dict[str, Set[Hashable]] = {}
+        self._categories: Dict[str, Set[Hashable]] = {}
+        self._authors: Dict[str, Set[Hashable]] = {}
+        self._years: Dict[int, Set[Hashable]] = {}
+        self._sorted_years: List[int] = []
+        self._lock = threading.Lock()
+        self.ready = False
+
+    def __len__(self):
+        return len(self._fields)
+
+    @staticmethod
+    def _post(postings: Dict[Any, Set[Hashable]], value: Any, key: Hashable):
+        postings.setdefault(value, set()).add(key)
+
+    @staticmethod
+    def _unpost(postings: Dict[Any, Set[Hashable]], value: Any, key: Hashable) -> bool:
+        keys = postings.get(value)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del postings[value]
+                return True
+        return False
+
+    def add(self, key: Hashable, metadata: Dict[str, Any]):
+        fields = index_fields(metadata or {})
+        with self._lock:
+            self._remove(key)
+            self._fields[key] = fields
+            if fields["dominant_sentiment"]:
+                self._post(self._sentiments, fields["dominant_sentiment"], key)
+            for category in fields["categories"]:
+                self._post(self._categories, category, key)
+            for author in fields["authors"]:
+                self._post(self._authors, author, key)
+            if fields["year"] is not None:
+                if fields["year"] not in self._years:
+                    bisect.insort(self._sorted_years, fields["year"])
+                self._post(self._years, fields["year"], key)
+
+    def add_many(self, items: Iterable[Any]):
+        for key, metadata in items:
+            self.add(key, metadata)
+
+    def remove(self, key: Hashable):
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key: Hashable):
+        fields = self._fields.pop(key, None)
+        if fields is None:
+            return
+        if fields["dominant_sentiment"]:
+            self._unpost(self._sentiments, fields["dominant_sentiment"], key)
+        for category in fields["categories"]:
+            self._unpost(self._categories, category, key)
+        for author in fields["authors"]:
+            self._unpost(self._authors, author, key)
+        if fields["year"] is not None and self._unpost(self._years, fields["year"], key):
+            self._sorted_years.remove(fields["year"])
+
+    def select(self, filters: Optional[Dict[str, Any]]) -> Optional[Set[Hashable]]:
+        """
+        Keys of the documents that pass every filter, or None if no filter is active
+        """
+        filters = active_filters(filters)
+        if not filters:
+            return None
+        with self._lock:
+            candidates: List[Set[Hashable]] = []
+            if "dominant_sentiment" in filters:
+                candidates.append(self._sentiments.get(str(filters["dominant_sentiment"]).lower(), set()))
+            if "category" in filters:
+                candidates.append(self._categories.get(normalize_title(filters["category"]), set()))
+            if "author" in filters:
+                names = [name for name in self._authors if _author_matches(name, filters["author"])]
+                candidates.append(set().union(*(self._authors[name] for name in names)))
+            if "year_from" in filters or "year_to" in filters:
+                low = bisect.bisect_left(self._sorted_years, int(filters.get("year_from", -10 ** 9)))
+                high = bisect.bisect_right(self._sorted_years, int(filters.get("year_to", 10 ** 9)))
+                candidates.append(set().union(*(self._years[year] for year in self._sorted_years[low:high])))
+            # Intersecar empezando por el conjunto más pequeño
+            candidates.sort(key=len)
+            result = set(candidates[0])
+            for other in candidates[1:]:
+                result &= other
+                if not result:
+                    break
+            return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "documents": len(self._fields),
+            "sentiments": len(self._sentiments),
+            "categories": len(self._categories),
+            "authors": len(self._authors),
+            "years": len(self._years),
+            "ready": self.ready,
+        }
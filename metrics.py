@@ -0,0 +1,270 @@
+"""
+Low-overhead metrics in Prometheus text format, plus per-request stage timings
+for the `Server-Timing` header.
+
+    with stage("embedding"):
+        vector = await embeddings.aembed_query(query)
+
+records the duration in the `stage_seconds{stage="embedding"}` histogram and,
+inside a request, adds `embedding;dur=...` to its Server-Timing header.
+"""
+import bisect
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+SERVER_TIMING = os.getenv("SERVER_TIMING", "true").lower() == "true"
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# (nombre de la muestra, [(etiqueta, valor)], valor) y (nombre, tipo, ayuda, muestras) de cada familia
+Sample = Tuple[str, List[Tuple[str, str]], float]
+Family = Tuple[str, str, str, List[Sample]]
+
+# Etapas medidas en la petición en curso (None fuera de una petición)
+_request_stages: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = contextvars.ContextVar(
+    "request_stages", default=None)
+
+
+def _label_key(labelnames: Tuple[str, ...], labels: Dict[str, Any]) -> Tuple[str, ...]:
+    return tuple(str(labels.get(name, "")) for name in labelnames)
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Iterable[Tuple[str, Any]]) -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in labels]
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(self.labelnames, labels), 0.0)
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name, list(zip(self.labelnames, key)), value) for key, value in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # Por serie: conteo por bucket (no acumulado), suma y total
+        self._series: Dict[Tuple[str, ...], List[Any]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(self.labelnames, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels) -> int:
+        series = self._series.get(_label_key(self.labelnames, labels))
+        return series[2] if series else 0
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            items = [(key, list(series[0]), series[1], series[2]) for key, series in self._series.items()]
+        samples = []
+        for key, counts, total, count in items:
+            labels = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                samples.append((f"{self.name}_bucket", labels + [("le", le)], cumulative))
+            samples.append((f"{self.name}_sum", labels, total))
+            samples.append((f"{self.name}_count", labels, count))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+        # Funciones que devuelven (nombre, tipo, ayuda, etiquetas, valor) en cada lectura de /metrics
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, Dict[str, Any], float]]]] = []
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def counter(self, name: str, help: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self._get_or_create(Counter, name, help, labelnames)
+
+    def gauge(self, name: str, help: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, help, labelnames)
+
+    def histogram(self, name: str, help: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help, labelnames, buckets)
+
+    def register_collector(self, collector: Callable[[], Iterable[Tuple[str, str, str, Dict[str, Any], float]]]):
+        self._collectors.append(collector)
+
+    def families(self) -> List[Family]:
+        """
+        Every metric and collector sample as (name, type, help, samples)
+        """
+        families = [(metric.name, metric.kind, metric.help, metric.samples()) for metric in list(self._metrics.values())]
+        collected: Dict[str, Family] = {}
+        for collector in self._collectors:
+            try:
+                samples = list(collector())
+            except Exception:
+                continue
+            for name, kind, help, labels, value in samples:
+                if name not in collected:
+                    collected[name] = (name, kind, help, [])
+                    families.append(collected[name])
+                collected[name][3].append((name, list(labels.items()), float(value)))
+        return families
+
+    def render(self) -> str:
+        return render_families(self.families())
+
+
+def render_families(families: Iterable[Family]) -> str:
+    lines = []
+    for name, kind, help, samples in families:
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+        for sample_name, labels, value in samples:
+            lines.append(f"{sample_name}{_format_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def merge_worker_families(families_by_worker: Dict[str, List[Family]]) -> List[Family]:
+    """
+    The families of several processes as one exposition: each sample gets a
+    `worker` label, so PromQL can sum them or look at a single worker
+    """
+    merged: Dict[str, Family] = {}
+    for worker, families in families_by_worker.items():
+        for name, kind, help, samples in families:
+            family = merged.setdefault(name, (name, kind, help, []))
+            family[3].extend((sample_name, [tuple(label) for label in labels] + [("worker", worker)], value)
+                             for sample_name, labels, value in samples)
+    return list(merged.values())
+
+
+registry = Registry()
+
+stage_seconds = registry.histogram("stage_seconds", "Duration of each hot-path stage", ("stage",))
+stage_errors = registry.counter("stage_errors_total", "Stages that raised an exception", ("stage",))
+events = registry.counter("events_total", "Notable outcomes and fallback paths", ("event",))
+model_load_seconds = registry.gauge("model_load_seconds", "Time taken to load each model", ("model",))
+startup_seconds = registry.gauge("startup_seconds", "Time spent in each startup phase or background task", ("phase",))
+http_request_seconds = registry.histogram("http_request_seconds", "Request latency by route",
+                                          ("method", "route", "status"))
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Time a block (sync or async code) as stage `name`
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        stage_errors.inc(stage=name)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        stage_seconds.observe(elapsed, stage=name)
+        stages = _request_stages.get()
+        if stages is not None:
+            stages.append((name, elapsed))
+
+
+def record_event(name: str):
+    events.inc(event=name)
+
+
+def server_timing_header(stages: List[Tuple[str, float]]) -> str:
+    # Varias mediciones de la misma etapa en una petición se suman
+    totals: Dict[str, float] = {}
+    for name, elapsed in stages:
+        totals[name] = totals.get(name, 0.0) + elapsed
+    return ", ".join(f"{name};dur={elapsed * 1000:.2f}" for name, elapsed in totals.items())
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware that records request latency per route and, if enabled,
+    sends the stages measured during the request in a Server-Timing header
+    """
+
+    def __init__(self, app, server_timing: bool = SERVER_TIMING):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        stages: List[Tuple[str, float]] = []
+        token = _request_stages.set(stages)
+        status = {"code": 500}
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                if self.server_timing:
+                    total = ("total", time.perf_counter() - started)
+                    header = server_timing_header(stages + [total])
+                    message = {**message, "headers": list(message.get("headers", [])) +
+                               [(b"server-timing", header.encode("latin-1"))]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_stages.reset(token)
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            http_request_seconds.observe(time.perf_counter() - started, method=scope["method"],
+                                         route=route, status=status["code"])
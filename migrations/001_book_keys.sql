@@ -0,0 +1,26 @@
+-- Índice de duplicados: una fila por clave de libro ("title:<hash del título normalizado>", "isbn:<isbn>").
+-- La clave primaria hace que comprobar un duplicado sea una búsqueda indexada y que dos
+-- subidas concurrentes del mismo libro no puedan reservar la misma clave.
+create table if not exists book_keys (
+    key text primary key,
+    document_id uuid not null,
+    created_at timestamptz not null default now()
+);
+
+create index if not exists book_keys_document_id_idx on book_keys (document_id);
+
+-- Al borrar un documento se liberan sus claves
+create or replace function release_book_keys() returns trigger as $$
+begin
+    delete from book_keys where document_id = old.id;
+    return old;
+end;
+$$ language plpgsql;
+
+drop trigger if exists documents_release_book_keys on documents;
+create trigger documents_release_book_keys
+    after delete on documents
+    for each row execute function release_book_keys();
+
+-- Después de aplicar este archivo, rellenar las claves de los documentos existentes:
+--   uv run python -m migrations.backfill_book_keys
@@ -0,0 +1,24 @@
+-- Búsqueda por similitud restringida a un conjunto de documentos. La API obtiene los ids
+-- candidatos de su índice de metadatos (sentimiento, categoría, autor, año) y solo esos
+-- documentos se rankean, en lugar de filtrar los k mejores resultados de toda la tabla.
+create or replace function match_documents_by_ids (
+    query_embedding vector(3072),
+    document_ids uuid[]
+) returns table (
+    id uuid,
+    content text,
+    metadata jsonb,
+    similarity float
+)
+language sql stable
+as $$
+    select
+        documents.id,
+        documents.content,
+        documents.metadata,
+        1 - (documents.embedding <=> query_embedding) as similarity
+    from documents
+    where documents.id = any(document_ids)
+      and documents.embedding is not null
+    order by documents.embedding <=> query_embedding;
+$$;
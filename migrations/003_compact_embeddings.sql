@@ -0,0 +1,111 @@
+-- Embeddings compactos (requiere pgvector >= 0.7). Dos variantes, según la configuración de la API:
+--
+-- * VECTOR_COMPACT_DIM=1024: se guardan las primeras 1024 dimensiones del embedding (renormalizadas)
+--   como halfvec, 6 KB menos por fila que vector(3072), y se indexan con HNSW (pgvector no indexa
+--   vectores de más de 2000 dimensiones). Si se elige otra dimensión hay que cambiar 1024 en todo
+--   el archivo.
+-- * VECTOR_QUANTIZATION=binary: un bit por dimensión del embedding completo (384 bytes) en un índice
+--   de expresión; se preseleccionan candidatos por distancia de Hamming y se vuelven a puntuar con
+--   el embedding completo.
+--
+-- pgvector no tiene tipo int8: VECTOR_QUANTIZATION=int8 solo afecta al índice local (VECTOR_STORE=local).
+
+alter table documents add column if not exists embedding_compact halfvec(1024);
+
+create index if not exists documents_embedding_compact_idx
+    on documents using hnsw (embedding_compact halfvec_cosine_ops);
+
+create index if not exists documents_embedding_binary_idx
+    on documents using hnsw ((binary_quantize(embedding)::bit(3072)) bit_hamming_ops);
+
+create or replace function match_documents_compact (
+    query_embedding halfvec(1024),
+    filter jsonb default '{}'
+) returns table (
+    id uuid,
+    content text,
+    metadata jsonb,
+    similarity float
+)
+language sql stable
+as $$
+    select
+        documents.id,
+        documents.content,
+        documents.metadata,
+        1 - (documents.embedding_compact <=> query_embedding) as similarity
+    from documents
+    where documents.metadata @> filter
+      and documents.embedding_compact is not null
+    order by documents.embedding_compact <=> query_embedding;
+$$;
+
+create or replace function match_documents_compact_by_ids (
+    query_embedding halfvec(1024),
+    document_ids uuid[]
+) returns table (
+    id uuid,
+    content text,
+    metadata jsonb,
+    similarity float
+)
+language sql stable
+as $$
+    select
+        documents.id,
+        documents.content,
+        documents.metadata,
+        1 - (documents.embedding_compact <=> query_embedding) as similarity
+    from documents
+    where documents.id = any(document_ids)
+      and documents.embedding_compact is not null
+    order by documents.embedding_compact <=> query_embedding;
+$$;
+
+-- `candidates` filas por Hamming (la API envía k * VECTOR_RESCORE_FACTOR) y orden final por coseno
+create or replace function match_documents_binary (
+    query_embedding vector(3072),
+    filter jsonb default '{}',
+    candidates int default 200
+) returns table (
+    id uuid,
+    content text,
+    metadata jsonb,
+    similarity float
+)
+language sql stable
+as $$
+    with shortlist as (
+        select documents.id
+        from documents
+        where documents.metadata @> filter
+          and documents.embedding is not null
+        order by binary_quantize(documents.embedding)::bit(3072) <~> binary_quantize(query_embedding)
+        limit candidates
+    )
+    select
+        documents.id,
+        documents.content,
+        documents.metadata,
+        1 - (documents.embedding <=> query_embedding) as similarity
+    from shortlist
+    join documents on documents.id = shortlist.id
+    order by documents.embedding <=> query_embedding;
+$$;
+
+-- Escritura masiva de la columna compacta: [{"id": ..., "embedding_compact": [...]}, ...]
+create or replace function set_compact_embeddings (rows jsonb) returns int
+language sql volatile
+as $$
+    with updated as (
+        update documents
+        set embedding_compact = (row_data.embedding_compact)::text::halfvec(1024)
+        from jsonb_to_recordset(rows) as row_data(id uuid, embedding_compact jsonb)
+        where documents.id = row_data.id
+        returning 1
+    )
+    select count(*)::int from updated;
+$$;
+
+-- Después de aplicar este archivo, rellenar la columna compacta de los documentos existentes:
+--   uv run python -m migrations.compact_embeddings --dim 1024
@@ -0,0 +1,16 @@
+-- Libros guardados por fragmentos antes de que el primer fragmento usara el id del libro:
+-- sus claves apuntan a metadata.parent_id, que no es ninguna fila de documents, y el trigger
+-- de 001_book_keys.sql nunca las liberaba. Se reasignan al fragmento 0 de cada libro.
+update book_keys k
+set document_id = d.id
+from documents d
+where d.metadata->>'parent_id' = k.document_id::text
+  and (d.metadata->>'chunk_index')::int = 0
+  and not exists (select 1 from documents x where x.id = k.document_id);
+
+-- Claves de libros por fragmentos que ya no tienen ninguna fila (borrados antes de esta migración).
+-- Las reservas recientes pueden ser de una subida en curso y se dejan
+delete from book_keys k
+where k.created_at < now() - interval '1 hour'
+  and not exists (select 1 from documents d where d.id = k.document_id)
+  and not exists (select 1 from documents d where d.metadata->>'parent_id' = k.document_id::text);
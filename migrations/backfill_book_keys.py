@@ -0,0 +1,89 @@
+"""
+Fill `book_keys` for documents inserted before the dedup index existed.
+
+    uv run python -m migrations.backfill_book_keys --page-size 1000
+
+Documents are read page by page ordered by id (never the whole table at once).
+When two existing documents share a title or ISBN, the first one by id keeps
+the key and the others are reported as duplicates. Chunk rows of a long book
+copy its metadata, so only chunk 0 (whose id is the book id) is indexed.
+"""
+import argparse
+import asyncio
+import json
+import os
+
+from dedup import DedupIndex, book_keys
+
+
+async def backfill(db, page_size: int = 1000) -> dict:
+    dedup = DedupIndex(db)
+    stats = {"documents": 0, "chunks": 0, "indexed": 0, "without_keys": 0, "duplicates": []}
+    last_id = None
+    while True:
+        query = db.table("documents") \
+            .select("id, title:metadata->>title, isbn:metadata->>isbn, chunk_index:metadata->>chunk_index") \
+            .order("id") \
+            .limit(page_size)
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        rows = (await query.execute()).data or []
+        if not rows:
+            break
+
+        keys_by_document = {}
+        for row in rows:
+            # Los fragmentos 1..N repiten los metadatos del libro; ->> devuelve el índice como texto
+            if int(row.get("chunk_index") or 0) > 0:
+                stats["chunks"] += 1
+                continue
+            stats["documents"] += 1
+            keys = book_keys({"title": row.get("title"), "isbn": row.get("isbn")})
+            if keys:
+                keys_by_document[row["id"]] = keys
+            else:
+                stats["without_keys"] += 1
+
+        # Las claves que ya tenía el mismo documento (backfill repetido) no cuentan como duplicado
+        existing = await dedup.find_existing(key for keys in keys_by_document.values() for key in keys)
+        pending = {}
+        for document_id, keys in keys_by_document.items():
+            owners = {existing[key] for key in keys if key in existing}
+            if owners - {document_id}:
+                stats["duplicates"].append({"document_id": document_id, "existing_document_id": sorted(owners)[0]})
+            elif len(owners) < len(keys):
+                pending[document_id] = [key for key in keys if key not in existing]
+            else:
+                stats["indexed"] += 1
+
+        claimed = await dedup.claim(pending)
+        stats["indexed"] += len(claimed)
+        stats["duplicates"].extend({"document_id": document_id} for document_id in pending if document_id not in claimed)
+        last_id = rows[-1]["id"]
+    return stats
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Backfill the book_keys dedup index")
+    parser.add_argument("--page-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    from clients import clients
+
+    load_dotenv()
+    supabase_url = os.getenv("SUPABASE_URL")
+    supabase_key = os.getenv("SUPABASE_SERVICE_KEY") or os.getenv("SUPABASE_ANON_KEY")
+    if not supabase_url or not supabase_key:
+        raise ValueError("Supabase URL and Key must be set in environment variables")
+
+    db = clients.supabase(supabase_url, supabase_key)
+    try:
+        stats = await backfill(db, page_size=args.page_size)
+    finally:
+        await clients.aclose()
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
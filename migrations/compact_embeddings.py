@@ -0,0 +1,70 @@
+"""
+Fill `embedding_compact` (migrations/003_compact_embeddings.sql) for documents
+inserted before VECTOR_COMPACT_DIM was set, or re-encode them after changing it.
+
+    uv run python -m migrations.compact_embeddings --dim 1024 --page-size 500
+
+Documents are read page by page ordered by id and each page is written back
+with one `set_compact_embeddings` call. `--dry-run` only reports the sizes.
+"""
+import argparse
+import asyncio
+import json
+import os
+
+from quantization import VECTOR_COMPACT_DIM, truncate
+from vector_store import VECTOR_DIM, iter_documents, parse_embedding
+
+
+async def compact(db, dim: int, page_size: int = 500, dry_run: bool = False) -> dict:
+    stats = {"documents": 0, "updated": 0, "without_embedding": 0, "dim": dim}
+    async for rows in iter_documents(db, "id, embedding", page_size):
+        stats["documents"] += len(rows)
+        updates = []
+        for row in rows:
+            vector = parse_embedding(row.get("embedding"))
+            if vector is None:
+                stats["without_embedding"] += 1
+                continue
+            updates.append({"id": row["id"], "embedding_compact": truncate(vector, dim).tolist()})
+        if updates and not dry_run:
+            response = await db.rpc("set_compact_embeddings", {"rows": updates}).execute()
+            stats["updated"] += response.data or 0
+        elif dry_run:
+            stats["updated"] += len(updates)
+
+    embedded = stats["documents"] - stats["without_embedding"]
+    # vector(n) ocupa 4 bytes por dimensión y halfvec(n) 2 (sin contar cabeceras ni índices)
+    stats["embedding_bytes"] = embedded * VECTOR_DIM * 4
+    stats["compact_bytes"] = embedded * dim * 2
+    stats["binary_bytes"] = embedded * VECTOR_DIM // 8
+    return stats
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Re-encode the embedding_compact column of documents")
+    parser.add_argument("--dim", type=int, default=VECTOR_COMPACT_DIM or 1024,
+                        help="must match the halfvec(n) column of migrations/003_compact_embeddings.sql")
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    from clients import clients
+
+    load_dotenv()
+    supabase_url = os.getenv("SUPABASE_URL")
+    supabase_key = os.getenv("SUPABASE_SERVICE_KEY") or os.getenv("SUPABASE_ANON_KEY")
+    if not supabase_url or not supabase_key:
+        raise ValueError("Supabase URL and Key must be set in environment variables")
+
+    db = clients.supabase(supabase_url, supabase_key)
+    try:
+        stats = await compact(db, args.dim, page_size=args.page_size, dry_run=args.dry_run)
+    finally:
+        await clients.aclose()
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,324 @@
+"""
+Shared local inference process for multi-worker deployments. The zero-shot
+classifier (BART-large-mnli) and the VADER analyzer are loaded once in this
+process and the API workers call it over a Unix socket, so N workers keep one
+copy of the weights instead of N. Classification requests from every worker
+go through the same micro-batcher, so they also share forward passes.
+
+    python model_server.py --socket /tmp/api-book-inference.sock
+
+Messages are JSON objects framed by a 4-byte big-endian length. A request is
+{"id", "op", "args"} and its response {"id", "result"} or {"id", "error"};
+requests on one connection are answered as they finish, not in order.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import signal
+import struct
+import time
+from typing import Any, Dict, Optional
+
+from classifier import CATEGORIES, MicroBatcher, ZeroShotClassifier, zero_shot_classifier
+from executors import cpu_pool, run_io
+from sentiment import SentimentAnalyzer, sentiment_analyzer
+
+# Socket del proceso de inferencia compartido; vacío = cada worker carga sus propios modelos
+INFERENCE_SOCKET = os.getenv("INFERENCE_SOCKET", "")
+INFERENCE_TIMEOUT = float(os.getenv("INFERENCE_TIMEOUT", "120"))
+
+_HEADER = struct.Struct(">I")
+
+
+class InferenceError(RuntimeError):
+    """
+    Error raised by the inference server while handling a request
+    """
+
+
+async def read_message(reader: asyncio.StreamReader) -> Dict[str, Any]:
+    size = _HEADER.unpack(await reader.readexactly(_HEADER.size))[0]
+    return json.loads(await reader.readexactly(size))
+
+
+def encode_message(message: Dict[str, Any]) -> bytes:
+    body = json.dumps(message, ensure_ascii=False).encode("utf-8")
+    return _HEADER.pack(len(body)) + body
+
+
+class InferenceServer:
+    """
+    Serves `classify`, `sentiment` and `status` requests on a Unix socket.
+    The models are loaded before the socket is created, so a client that
+    connects finds them ready
+    """
+
+    def __init__(self, path: str, classifier: ZeroShotClassifier = zero_shot_classifier,
+                 sentiment: SentimentAnalyzer = sentiment_analyzer, batcher: Optional[MicroBatcher] = None):
+        self.path = path
+        self.classifier = classifier
+        self.sentiment = sentiment
+        self.batcher = batcher or MicroBatcher(lambda texts: classifier.classify_batch(texts, CATEGORIES),
+                                               executor=cpu_pool)
+        self.requests = 0
+        self.connections = 0
+        self.load_seconds = 0.0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._writers = set()
+
+    async def start(self):
+        started = time.perf_counter()
+        await asyncio.gather(run_io(self.classifier.load), run_io(self.sentiment.load))
+        self.load_seconds = time.perf_counter() - started
+        # Un socket de una ejecución anterior impediría escuchar
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(self._handle, path=self.path)
+
+    async def serve_forever(self):
+        await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            # wait_closed espera a que terminen las conexiones abiertas por los workers
+            for writer in list(self._writers):
+                writer.close()
+            await self._server.wait_closed()
+            self._server = None
+        await self.batcher.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        self._writers.add(writer)
+        tasks = set()
+        try:
+            while True:
+                try:
+                    request = await read_message(reader)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                # Cada petición en su propia tarea: las de un mismo worker entran juntas en el lote
+                task = asyncio.create_task(self._respond(request, writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        finally:
+            for task in tasks:
+                task.cancel()
+            self.connections -= 1
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _respond(self, request: Dict[str, Any], writer: asyncio.StreamWriter):
+        self.requests += 1
+        try:
+            response = {"id": request.get("id"), "result": await self.dispatch(request["op"], request.get("args") or {})}
+        except Exception as e:
+            response = {"id": request.get("id"), "error": str(e) or type(e).__name__}
+        if not writer.is_closing():
+            # Cada mensaje se escribe de una vez: las respuestas concurrentes no se mezclan
+            writer.write(encode_message(response))
+            await writer.drain()
+
+    async def dispatch(self, op: str, args: Dict[str, Any]) -> Any:
+        if op == "classify":
+            return await self.batcher.submit(args["text"])
+        if op == "sentiment":
+            return await self.sentiment.analyze(args["text"], mode=args.get("mode"))
+        if op == "status":
+            return {
+                "pid": os.getpid(),
+                "classifier": self.classifier.loaded,
+                "classifier_backend": getattr(self.classifier, "active_backend", None),
+                "sentiment": self.sentiment.loaded,
+                "requests": self.requests,
+                "connections": self.connections,
+                "load_seconds": round(self.load_seconds, 3),
+            }
+        raise ValueError(f"Unknown operation: {op}")
+
+
+class InferenceClient:
+    """
+    Connection from an API worker to the inference server. Concurrent calls
+    share one connection and are matched to their responses by id; the
+    connection is opened on first use and reopened after an error
+    """
+
+    def __init__(self, path: str = INFERENCE_SOCKET, timeout: float = INFERENCE_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+        self.status: Dict[str, Any] = {}
+        self.calls = 0
+        self.errors = 0
+        self._ids = itertools.count(1)
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._connecting: Optional[asyncio.Lock] = None
+
+    async def _connection(self) -> asyncio.StreamWriter:
+        loop = asyncio.get_running_loop()
+        # La conexión pertenece a un event loop concreto (TestClient crea uno nuevo)
+        if self._loop is not loop:
+            self._loop = loop
+            self._connecting = asyncio.Lock()
+            self._writer = None
+        async with self._connecting:
+            if self._writer is None or self._writer.is_closing():
+                reader, self._writer = await asyncio.open_unix_connection(self.path)
+                self._reader_task = loop.create_task(self._read_responses(reader))
+        return self._writer
+
+    async def _read_responses(self, reader: asyncio.StreamReader):
+        try:
+            while True:
+                message = await read_message(reader)
+                future = self._pending.pop(message.get("id"), None)
+                if future is None or future.done():
+                    continue
+                if "error" in message:
+                    future.set_exception(InferenceError(message["error"]))
+                else:
+                    future.set_result(message["result"])
+        except (asyncio.IncompleteReadError, ConnectionError) as e:
+            # El servidor se cerró: fallan las llamadas en curso y la siguiente reconecta
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+            pending, self._pending = self._pending, {}
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError(f"Inference server closed the connection: {e}"))
+
+    async def call(self, op: str, **args) -> Any:
+        self.calls += 1
+        request_id = next(self._ids)
+        try:
+            writer = await self._connection()
+            future = self._pending[request_id] = asyncio.get_running_loop().create_future()
+            writer.write(encode_message({"id": request_id, "op": op, "args": args}))
+            await writer.drain()
+            return await asyncio.wait_for(future, self.timeout)
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            self._pending.pop(request_id, None)
+
+    async def refresh_status(self) -> Dict[str, Any]:
+        self.status = await self.call("status")
+        return self.status
+
+    async def wait_ready(self, timeout: float = 300.0, interval: float = 0.2) -> Dict[str, Any]:
+        """
+        Wait until the server accepts connections (it listens once its models
+        are loaded)
+        """
+        deadline = asyncio.get_running_loop().time() + timeout
+        while True:
+            try:
+                return await self.refresh_status()
+            except (ConnectionError, FileNotFoundError):
+                if asyncio.get_running_loop().time() >= deadline:
+                    raise
+                await asyncio.sleep(interval)
+
+    async def aclose(self):
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            await asyncio.gather(self._reader_task, return_exceptions=True)
+            self._reader_task = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+class RemoteModel:
+    """
+    Model held by the inference server. `load` does nothing in the worker;
+    `loaded` reflects the last status reported by the server
+    """
+
+    def __init__(self, client: InferenceClient, name: str):
+        self.client = client
+        self.name = name
+
+    @property
+    def loaded(self) -> bool:
+        return bool(self.client.status.get(self.name))
+
+    def load(self):
+        return None
+
+
+class RemoteClassificationBatcher:
+    """
+    Drop-in for the local classification MicroBatcher: each text is sent on
+    its own and the server batches the texts of every worker together
+    """
+
+    def __init__(self, client: InferenceClient):
+        self.client = client
+
+    async def submit(self, text: str) -> Dict[str, Any]:
+        return await self.client.call("classify", text=text)
+
+    async def close(self):
+        pass
+
+
+class RemoteSentimentAnalyzer(RemoteModel):
+    """
+    Drop-in for SentimentAnalyzer.analyze; long texts are split on the
+    server's process pool
+    """
+
+    def __init__(self, client: InferenceClient):
+        super().__init__(client, "sentiment")
+
+    async def analyze(self, text: str, mode: Optional[str] = None, executor=None) -> Dict[str, Any]:
+        return await self.client.call("sentiment", text=text, mode=mode)
+
+
+def remote_models(client: InferenceClient):
+    """
+    (classifier, classification batcher, sentiment analyzer) backed by the
+    inference server, with the interface of the local ones
+    """
+    return RemoteModel(client, "classifier"), RemoteClassificationBatcher(client), RemoteSentimentAnalyzer(client)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--socket", default=INFERENCE_SOCKET or "/tmp/api-book-inference.sock")
+    args = parser.parse_args()
+
+    server = InferenceServer(args.socket)
+
+    async def run():
+        task = asyncio.current_task()
+        # serve.py para el servidor con SIGTERM: se cierra borrando el socket
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, task.cancel)
+        try:
+            await server.serve_forever()
+        except asyncio.CancelledError:
+            pass
+        finally:
+            await server.close()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""
+Optimized CPU backends for the zero-shot classifier (CLASSIFIER_BACKEND):
+
+- "int8": the PyTorch model with its Linear layers dynamically quantized to int8
+- "onnx": an exported ONNX model (optionally int8) run with onnxruntime
+
+Both run through NLIZeroShotPipeline, which puts the (text, hypothesis) pairs
+of every text in the batch and all candidate labels into one padded forward
+pass, and tokenizes the fixed hypotheses ("This example is Fantasy.") once
+instead of on every call. Scores match the transformers zero-shot pipeline:
+softmax of the entailment logits over the candidate labels.
+
+Export the ONNX model (needs `onnxruntime`, not installed by default):
+
+    python nli_backend.py export --out models/bart-large-mnli.onnx
+"""
+import argparse
+import os
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Hilos de inferencia del clasificador (0 = lo que decida torch / onnxruntime)
+CLASSIFIER_THREADS = int(os.getenv("CLASSIFIER_THREADS", "0"))
+CLASSIFIER_ONNX_PATH = os.getenv("CLASSIFIER_ONNX_PATH", "models/bart-large-mnli.onnx")
+# Máximo de pares (texto, hipótesis) por forward pass; los pares de un mismo texto no se separan
+CLASSIFIER_MAX_PAIRS = int(os.getenv("CLASSIFIER_MAX_PAIRS", "256"))
+# La misma plantilla que usa por defecto el pipeline de transformers
+HYPOTHESIS_TEMPLATE = "This example is {}."
+
+Forward = Callable[[np.ndarray, np.ndarray], np.ndarray]
+
+
+def entailment_index(label2id: Dict[str, int]) -> int:
+    for label, index in label2id.items():
+        if label.lower().startswith("entail"):
+            return int(index)
+    raise ValueError(f"The model has no entailment label: {sorted(label2id)}")
+
+
+class NLIZeroShotPipeline:
+    """
+    Zero-shot classification with the interface of the transformers pipeline
+    (`pipeline(texts, labels)` -> {"sequence", "labels", "scores"} per text),
+    on top of any `forward(input_ids, attention_mask) -> logits` function
+    """
+
+    def __init__(self, tokenizer, forward: Forward, entailment_id: int,
+                 hypothesis_template: str = HYPOTHESIS_TEMPLATE, max_pairs: int = CLASSIFIER_MAX_PAIRS,
+                 max_length: Optional[int] = None):
+        self.tokenizer = tokenizer
+        self.forward = forward
+        self.entailment_id = entailment_id
+        self.hypothesis_template = hypothesis_template
+        self.max_pairs = max_pairs
+        model_max = getattr(tokenizer, "model_max_length", 1024)
+        # Algunos tokenizadores devuelven un entero enorme cuando no tienen límite
+        self.max_length = max_length or (model_max if model_max < 100_000 else 1024)
+        self.pad_id = tokenizer.pad_token_id if tokenizer.pad_token_id is not None else 0
+        self.special_tokens = tokenizer.num_special_tokens_to_add(pair=True)
+        self._hypotheses: Dict[Tuple[str, ...], List[List[int]]] = {}
+        self.forward_passes = 0
+
+    def hypotheses(self, labels: Sequence[str]) -> List[List[int]]:
+        # Las categorías son fijas: sus hipótesis se tokenizan una vez por proceso
+        key = tuple(labels)
+        ids = self._hypotheses.get(key)
+        if ids is None:
+            sentences = [self.hypothesis_template.format(label) for label in labels]
+            ids = self._hypotheses[key] = self.tokenizer(sentences, add_special_tokens=False)["input_ids"]
+        return ids
+
+    def _pairs(self, premise: List[int], hypotheses: List[List[int]]) -> List[List[int]]:
+        rows = []
+        for hypothesis in hypotheses:
+            # Se recorta el texto, nunca la hipótesis
+            limit = max(0, self.max_length - self.special_tokens - len(hypothesis))
+            rows.append(self.tokenizer.build_inputs_with_special_tokens(premise[:limit], hypothesis))
+        return rows
+
+    def _pad(self, rows: List[List[int]]) -> Tuple[np.ndarray, np.ndarray]:
+        width = max(len(row) for row in rows)
+        input_ids = np.full((len(rows), width), self.pad_id, dtype=np.int64)
+        attention_mask = np.zeros((len(rows), width), dtype=np.int64)
+        for i, row in enumerate(rows):
+            input_ids[i, :len(row)] = row
+            attention_mask[i, :len(row)] = 1
+        return input_ids, attention_mask
+
+    def entailment_logits(self, texts: Sequence[str], labels: Sequence[str]) -> np.ndarray:
+        """
+        Entailment logit of every (text, label) pair, shape (len(texts), len(labels))
+        """
+        hypotheses = self.hypotheses(labels)
+        premises = self.tokenizer(list(texts), add_special_tokens=False)["input_ids"]
+        logits = np.empty((len(texts), len(labels)), dtype=np.float32)
+        # Textos de longitud parecida en la misma pasada: menos relleno
+        order = sorted(range(len(texts)), key=lambda i: len(premises[i]))
+        per_pass = max(1, self.max_pairs // max(1, len(labels)))
+        for start in range(0, len(order), per_pass):
+            chunk = order[start:start + per_pass]
+            rows = [row for i in chunk for row in self._pairs(premises[i], hypotheses)]
+            output = np.asarray(self.forward(*self._pad(rows)), dtype=np.float32)
+            self.forward_passes += 1
+            logits[chunk] = output[:, self.entailment_id].reshape(len(chunk), len(labels))
+        return logits
+
+    def __call__(self, texts, labels: Sequence[str], batch_size: Optional[int] = None, **kwargs):
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        labels = list(labels)
+        logits = self.entailment_logits(texts, labels)
+        scores = np.exp(logits - logits.max(axis=1, keepdims=True))
+        scores /= scores.sum(axis=1, keepdims=True)
+        outputs = []
+        for text, row in zip(texts, scores):
+            ranked = np.argsort(-row, kind="stable")
+            outputs.append({"sequence": text, "labels": [labels[i] for i in ranked],
+                            "scores": [float(row[i]) for i in ranked]})
+        return outputs[0] if single else outputs
+
+
+def torch_int8_forward(model_name: str, threads: int = CLASSIFIER_THREADS) -> Tuple[Forward, Any]:
+    import torch
+    from transformers import AutoModelForSequenceClassification
+
+    if threads:
+        torch.set_num_threads(threads)
+    model = AutoModelForSequenceClassification.from_pretrained(model_name).eval()
+    model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    def forward(input_ids: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        with torch.inference_mode():
+            output = model(input_ids=torch.from_numpy(input_ids), attention_mask=torch.from_numpy(attention_mask))
+        return output.logits.float().numpy()
+
+    return forward, model.config
+
+
+def onnx_forward(model_name: str, threads: int = CLASSIFIER_THREADS,
+                 path: str = CLASSIFIER_ONNX_PATH) -> Tuple[Forward, Any]:
+    import onnxruntime
+    from transformers import AutoConfig
+
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No ONNX model at {path}; run `python nli_backend.py export --out {path}`")
+    options = onnxruntime.SessionOptions()
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if threads:
+        options.intra_op_num_threads = threads
+    session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+
+    def forward(input_ids: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        return session.run(["logits"], {"input_ids": input_ids, "attention_mask": attention_mask})[0]
+
+    return forward, AutoConfig.from_pretrained(model_name)
+
+
+BACKENDS = {"int8": torch_int8_forward, "onnx": onnx_forward}
+
+
+def load_backend(name: str, model_name: str, threads: Optional[int] = None) -> NLIZeroShotPipeline:
+    """
+    Build the optimized pipeline for backend `name`; raises if its runtime or
+    model files are missing, so the caller can fall back to transformers
+    """
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown classifier backend: {name}; expected pipeline, {', '.join(BACKENDS)}")
+    from transformers import AutoTokenizer
+
+    forward, config = BACKENDS[name](model_name, CLASSIFIER_THREADS if threads is None else threads)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    return NLIZeroShotPipeline(tokenizer, forward, entailment_index(config.label2id))
+
+
+def export_onnx(model_name: str, out: str, quantize: bool = True, opset: int = 17) -> str:
+    """
+    Export `model_name` to ONNX at `out` (int8 weights when `quantize`)
+    """
+    import torch
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+    model = AutoModelForSequenceClassification.from_pretrained(model_name).eval()
+    model.config.return_dict = False
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    sample = tokenizer(["A book about dragons."], ["This example is Fantasy."], return_tensors="pt")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    float_path = out.replace(".onnx", ".fp32.onnx") if quantize else out
+    torch.onnx.export(
+        model, (sample["input_ids"], sample["attention_mask"]), float_path,
+        input_names=["input_ids", "attention_mask"], output_names=["logits"],
+        dynamic_axes={"input_ids": {0: "pairs", 1: "tokens"}, "attention_mask": {0: "pairs", 1: "tokens"},
+                      "logits": {0: "pairs"}},
+        opset_version=opset,
+    )
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(float_path, out, weight_type=QuantType.QInt8)
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    export = commands.add_parser("export", help="export the classifier to ONNX")
+    export.add_argument("--model", default="facebook/bart-large-mnli")
+    export.add_argument("--out", default=CLASSIFIER_ONNX_PATH)
+    export.add_argument("--no-quantize", action="store_true", help="keep float32 weights")
+    args = parser.parse_args()
+    print(export_onnx(args.model, args.out, quantize=not args.no_quantize))
+
+
+if __name__ == "__main__":
+    main()
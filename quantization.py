@@ -0,0 +1,164 @@
+"""
+Compact representations of the embeddings.
+
+- Truncation: text-embedding-3 models are trained with Matryoshka
+  representation learning, so the first 256/1024 dimensions of a vector
+  (renormalized) are a usable embedding on their own.
+- int8: one signed byte per dimension plus a per-vector scale (4x smaller
+  than float32).
+- binary: one bit per dimension, the sign (32x smaller), compared with the
+  Hamming distance.
+
+Quantized scores are only used to shortlist `k * rescore_factor` candidates,
+which are then rescored with the float vectors.
+"""
+import os
+from typing import Any, Dict
+
+import numpy as np
+
+# Dimensiones que se guardan de cada embedding (0 = completas). 256 y 1024 son las recomendadas por OpenAI
+VECTOR_COMPACT_DIM = int(os.getenv("VECTOR_COMPACT_DIM", "0"))
+# "none", "int8" o "binary"
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "none")
+# Candidatos por resultado que se preseleccionan con los códigos y se vuelven a puntuar en float32
+VECTOR_RESCORE_FACTOR = int(os.getenv("VECTOR_RESCORE_FACTOR", "4"))
+# Tamaño del bloque float32 al puntuar códigos int8: cabe en la caché L2 y se reutiliza en cada bloque
+SCORE_BLOCK_BYTES = 1 << 19
+
+
+def truncate(vectors: np.ndarray, dim: int) -> np.ndarray:
+    """
+    Keep the first `dim` dimensions and renormalize to unit length
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if dim and vectors.shape[-1] > dim:
+        vectors = vectors[..., :dim]
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+def compact_columns(embedding: Any, dim: int = VECTOR_COMPACT_DIM) -> Dict[str, Any]:
+    """
+    Extra `documents` columns stored next to a full embedding: the truncated
+    vector for the `embedding_compact` halfvec column, or nothing when
+    VECTOR_COMPACT_DIM is off
+    """
+    if not dim or embedding is None:
+        return {}
+    return {"embedding_compact": truncate(embedding, dim).tolist()}
+
+
+class Codec:
+    """
+    Float32 codec: the codes are the vectors themselves
+    """
+
+    name = "none"
+    dtype = np.float32
+
+    def __init__(self, dim: int):
+        self.dim = dim
+
+    @property
+    def width(self) -> int:
+        return self.dim
+
+    @property
+    def bytes_per_vector(self) -> int:
+        return self.width * np.dtype(self.dtype).itemsize
+
+    def encode(self, vectors: np.ndarray):
+        """
+        Return (codes, scales) for a (n, dim) matrix of unit vectors
+        """
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        return vectors.astype(self.dtype), np.ones(len(vectors), dtype=np.float32)
+
+    def scores(self, codes: np.ndarray, scales: np.ndarray, query: np.ndarray) -> np.ndarray:
+        """
+        Approximate similarity of every row of `codes` to a unit query vector
+        """
+        return codes @ query
+
+
+class Int8Codec(Codec):
+    """
+    Symmetric per-vector int8 quantization: x ≈ code * scale with
+    scale = max|x| / 127
+    """
+
+    name = "int8"
+    dtype = np.int8
+
+    @property
+    def bytes_per_vector(self) -> int:
+        # Más la escala float32 de cada vector
+        return self.width + 4
+
+    def encode(self, vectors: np.ndarray):
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        scales = np.abs(vectors).max(axis=1) / 127
+        scales = np.where(scales == 0, 1.0, scales).astype(np.float32)
+        codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+        return codes, scales
+
+    def scores(self, codes: np.ndarray, scales: np.ndarray, query: np.ndarray) -> np.ndarray:
+        # numpy no tiene producto de matrices int8 rápido: se convierte a float32 por bloques pequeños
+        rows = max(16, SCORE_BLOCK_BYTES // (4 * self.dim))
+        buffer = np.empty((min(rows, len(codes)), self.dim), dtype=np.float32)
+        scores = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), rows):
+            block = codes[start:start + rows]
+            buffer[:len(block)] = block
+            np.matmul(buffer[:len(block)], query, out=scores[start:start + len(block)])
+        return scores * scales
+
+
+class BinaryCodec(Codec):
+    """
+    Sign bits packed into bytes, padded to whole 64-bit words so the Hamming
+    distance is a XOR and a popcount per word
+    """
+
+    name = "binary"
+    dtype = np.uint8
+
+    @property
+    def width(self) -> int:
+        return -(-self.dim // 64) * 8
+
+    def encode(self, vectors: np.ndarray):
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        codes = np.zeros((len(vectors), self.width), dtype=np.uint8)
+        packed = np.packbits(vectors > 0, axis=1)
+        codes[:, :packed.shape[1]] = packed
+        return codes, np.ones(len(vectors), dtype=np.float32)
+
+    def scores(self, codes: np.ndarray, scales: np.ndarray, query: np.ndarray) -> np.ndarray:
+        query_code = self.encode(query)[0].view(np.uint64)
+        words = np.ascontiguousarray(codes).view(np.uint64)
+        distance = np.bitwise_count(words ^ query_code).sum(axis=1, dtype=np.int32)
+        # Fracción de signos que coinciden, en la escala de la similitud coseno (-1..1)
+        return 1 - 2 * distance.astype(np.float32) / self.dim
+
+
+CODECS = {codec.name: codec for codec in (Codec, Int8Codec, BinaryCodec)}
+
+
+def get_codec(name: str, dim: int) -> Codec:
+    if name not in CODECS:
+        raise ValueError(f"Unknown VECTOR_QUANTIZATION: {name} (expected one of {', '.join(CODECS)})")
+    return CODECS[name](dim)
+
+
+def shortlist(scores: np.ndarray, count: int) -> np.ndarray:
+    """
+    Indices of the `count` highest scores, best first
+    """
+    count = min(count, len(scores))
+    if count <= 0:
+        return np.empty(0, dtype=np.int64)
+    best = np.argpartition(-scores, count - 1)[:count]
+    return best[np.argsort(-scores[best])]
+
@@ -0,0 +1,145 @@
+"""
+Lean JSON responses and response compression.
+
+FastJSONResponse serializes plain dicts with orjson when it is installed
+(requirements.txt brings it), so hot endpoints can skip the pydantic
+validation and serialization FastAPI applies to returned models.
+
+CompressionMiddleware compresses complete responses with brotli (when the
+`brotli` package is installed) or gzip, following the client's
+Accept-Encoding. Streamed responses (server-sent events, NDJSON) are sent
+as they are.
+"""
+import gzip
+import os
+from typing import Any, Optional
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers, MutableHeaders
+
+from metrics import record_event, stage
+
+try:
+    import orjson
+except ImportError:  # Sin orjson se usa el json de la biblioteca estándar
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # Opcional: sin el paquete solo se comprime con gzip
+    brotli = None
+
+COMPRESSION = os.getenv("COMPRESSION", "true").lower() == "true"
+# Por debajo de este tamaño la cabecera y el coste de CPU no compensan
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+# Niveles bajos: respuestas dinámicas, importa más la latencia que el último byte
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "5"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+COMPRESSIBLE_TYPES = ("application/json", "text/")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered with orjson (same compact, non-ASCII output)
+    """
+
+    def render(self, content: Any) -> bytes:
+        if orjson is None:
+            return super().render(content)
+        try:
+            return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+        except TypeError:
+            # Tipos que orjson no conoce (Decimal, modelos...): el camino lento de FastAPI
+            return super().render(jsonable_encoder(content))
+
+
+def encodings() -> tuple:
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def accepted_encoding(header: str) -> Optional[str]:
+    """
+    Best supported encoding the client accepts ("br" before "gzip"), or None
+    """
+    accepted = {}
+    for part in header.split(","):
+        name, _, params = part.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for encoding in encodings():
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    # mtime fijo: la misma respuesta da los mismos bytes (ETags, cachés intermedias)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware that compresses single-message responses of JSON or text
+    of at least `minimum_size` bytes
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    def compressible(self, headers: Headers, body: bytes) -> bool:
+        content_type = headers.get("content-type", "")
+        return (len(body) >= self.minimum_size and "content-encoding" not in headers
+                and content_type.startswith(COMPRESSIBLE_TYPES) and not content_type.startswith("text/event-stream"))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = accepted_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        pending = {"start": None}
+
+        async def send_compressed(message):
+            # El inicio se retiene hasta ver el cuerpo: la longitud y la codificación dependen de él
+            if message["type"] == "http.response.start":
+                pending["start"] = message
+                return
+            start, pending["start"] = pending["start"], None
+            if start is None:
+                await send(message)
+                return
+            body = message.get("body", b"")
+            headers = MutableHeaders(raw=list(start.get("headers", [])))
+            # Las respuestas en streaming no se retienen
+            if message["type"] != "http.response.body" or message.get("more_body", False) \
+                    or not self.compressible(headers, body):
+                await send(start)
+                await send(message)
+                return
+            with stage("compress"):
+                compressed = compress(body, encoding)
+            headers.add_vary_header("Accept-Encoding")
+            if len(compressed) >= len(body):
+                await send({**start, "headers": headers.raw})
+                await send(message)
+                return
+            record_event(f"response_{encoding}")
+            headers["content-encoding"] = encoding
+            headers["content-length"] = str(len(compressed))
+            await send({**start, "headers": headers.raw})
+            await send({**message, "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
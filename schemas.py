@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
+from pydantic import BaseModel, Field
+from typing import Optional, List, Dict, Any, Union
 
 class SearchParams(BaseModel):
     """
@@ -7,8 +7,16 @@ class SearchParams(BaseModel):
     """
     query: str
     dominant_sentiment: Optional[str] = None
-    limit: int = 10
-    offset: int = 0
+    category: Optional[str] = None
+    author: Optional[str] = None  # Coincide con cualquier autor que contenga todas las palabras
+    year_from: Optional[int] = None
+    year_to: Optional[int] = None
+    mode: str = "vector"  # "vector", "hybrid" (BM25 + vectores con RRF) o "lexical" (sin llamar a OpenAI)
+    limit: int = Field(10, ge=0)
+    offset: int = Field(0, ge=0)
+    cursor: Optional[str] = None  # Token de continuación devuelto en next_cursor; tiene prioridad sobre offset
+    fields: Optional[str] = None  # Claves de metadata a devolver, separadas por comas ("title,authors,isbn"); "content" añade el texto
+    snippet: Optional[int] = None  # Devolver solo ~N caracteres del contenido alrededor de los términos de la consulta
 
 class GetSummaryParams(BaseModel):
     title: str
@@ -19,12 +27,31 @@ class UploadBookParams(BaseModel):
     content: str
     metadata: Dict[str, Any]
 
+class EnrichBookParams(UploadBookParams):
+    """
+    Parameters for the background pipeline: classify, embed and insert a book
+    """
+    summarize: bool = False  # Generar también el resumen (usa metadata.title y metadata.description)
+    sentiment_mode: Optional[str] = None
+
+class EnrichBooksParams(BaseModel):
+    """
+    Parameters for queueing many books in the background pipeline
+    """
+    books: List[EnrichBookParams]
+
+class UploadBooksParams(BaseModel):
+    """
+    Parameters for uploading many books in one request
+    """
+    books: List[UploadBookParams]
+
 class SearchResult(BaseModel):
     """
     Format for individual search results
     """
     uuid: str
-    content: str
+    content: Optional[str] = None  # Se omite si `fields` no incluye "content" ni se pide `snippet`
     metadata: Dict[str, Any]
 
 class SearchResponse(BaseModel):
@@ -35,6 +62,7 @@ class SearchResponse(BaseModel):
     limit: int
     offset: int
     total: int
+    next_cursor: Optional[str] = None
 
 class ErrorResponse(BaseModel):
     """
@@ -43,6 +71,18 @@ class ErrorResponse(BaseModel):
     error: str
     details: Optional[str] = None
 
+class SearchBatchParams(BaseModel):
+    """
+    Several searches answered in one request (e.g. one per home screen shelf)
+    """
+    searches: List[SearchParams]
+
+class SearchBatchResponse(BaseModel):
+    """
+    One search response (or error) per requested search, in the same order
+    """
+    responses: List[Union[SearchResponse, ErrorResponse]]
+
 class ClassifyBookParams(BaseModel):
     """
     Parameters for classifying a book's content to get category and sentiment
@@ -50,3 +90,10 @@ class ClassifyBookParams(BaseModel):
     content: str  # El contenido es obligatorio
     category: Optional[str] = None  # Categoría opcional, se obtendrá automáticamente si es None
     dominant_sentiment: Optional[str] = None  # Sentimiento opcional, se obtendrá automáticamente si es None
+    sentiment_mode: Optional[str] = None  # "sentences" (texto completo) o "sample" (primeros 5000 caracteres)
+
+class ClassifyBooksParams(BaseModel):
+    """
+    Parameters for classifying many texts in one request
+    """
+    books: List[ClassifyBookParams]
@@ -0,0 +1,135 @@
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from embedding_cache import normalize_text
+
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "256"))
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "300"))
+# Resultados que se piden al vector store en la primera búsqueda de una consulta
+SEARCH_CACHE_DEPTH = int(os.getenv("SEARCH_CACHE_DEPTH", "50"))
+# Máximo de resultados que se pueden paginar para una misma consulta
+SEARCH_MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", "500"))
+# Máximo de búsquedas en una petición a /search_batch
+SEARCH_BATCH_MAX = int(os.getenv("SEARCH_BATCH_MAX", "20"))
+
+
+def first_depth(end: int) -> int:
+    # Primera búsqueda de una consulta: nunca más hondo que lo que se puede paginar
+    return min(max(SEARCH_CACHE_DEPTH, end), SEARCH_MAX_RESULTS)
+
+
+def result_set_key(query: str, filters: Dict[str, Any]) -> str:
+    active = {name: value for name, value in filters.items() if value is not None}
+    raw = json.dumps([normalize_text(query), active], sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class ResultSet:
+    """
+    Ranked hits of one vector search, fetched with `depth` as k
+    """
+    hits: List[Dict[str, Any]]
+    depth: int
+    # Filas devueltas por el vector store antes de agrupar fragmentos del mismo libro
+    fetched: Optional[int] = None
+    created_at: float = field(default_factory=time.time)
+
+    @property
+    def exhausted(self) -> bool:
+        # Si el vector store devolvió menos de lo pedido, no hay más resultados
+        fetched = len(self.hits) if self.fetched is None else self.fetched
+        return fetched < self.depth
+
+    def can_serve(self, end: int) -> bool:
+        return end <= len(self.hits) or self.exhausted or self.depth >= SEARCH_MAX_RESULTS
+
+    def next_depth(self, end: int) -> int:
+        return min(max(end, self.depth * 2), SEARCH_MAX_RESULTS)
+
+
+class SearchResultCache:
+    """
+    LRU cache of ranked search results so later pages of a query are served
+    from memory instead of re-running the embedding and the vector search
+    """
+
+    def __init__(self, max_entries: int = SEARCH_CACHE_SIZE, ttl: float = SEARCH_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, ResultSet]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, query: str, filters: Dict[str, Any]) -> Optional[ResultSet]:
+        key = result_set_key(query, filters)
+        with self._lock:
+            result_set = self._entries.get(key)
+            if result_set is not None and (not self.ttl or time.time() - result_set.created_at <= self.ttl):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return result_set
+            self._entries.pop(key, None)
+            self.misses += 1
+            return None
+
+    def put(self, query: str, filters: Dict[str, Any], hits: List[Dict[str, Any]], depth: int,
+            fetched: Optional[int] = None) -> ResultSet:
+        result_set = ResultSet(hits=list(hits), depth=depth, fetched=fetched)
+        key = result_set_key(query, filters)
+        with self._lock:
+            self._entries[key] = result_set
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return result_set
+
+    def invalidate(self):
+        """
+        Drop every cached result set (called when new documents are inserted)
+        """
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+def encode_cursor(query: str, filters: Dict[str, Any], offset: int) -> str:
+    payload = json.dumps({"k": result_set_key(query, filters)[:16], "o": offset})
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, query: str, filters: Dict[str, Any]) -> int:
+    """
+    Return the offset stored in a continuation token. Raises ValueError if the
+    token is malformed or was issued for a different query
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        offset = int(payload["o"])
+        key = payload["k"]
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if key != result_set_key(query, filters)[:16] or offset < 0:
+        raise ValueError("Cursor does not match this query")
+    return offset
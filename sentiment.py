@@ -0,0 +1,134 @@
+import asyncio
+import functools
+import os
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from executors import cpu_pool, get_process_pool
+from metrics import model_load_seconds
+
+# "sentences": todo el texto, frase a frase; "sample": solo los primeros SENTIMENT_SAMPLE_CHARS
+SENTIMENT_MODE = os.getenv("SENTIMENT_MODE", "sentences")
+SENTIMENT_SAMPLE_CHARS = 5000
+# A partir de este tamaño las frases se puntúan repartidas en el pool de procesos
+SENTIMENT_PROCESS_THRESHOLD = int(os.getenv("SENTIMENT_PROCESS_THRESHOLD", "200000"))
+SENTIMENT_CHUNK_SENTENCES = int(os.getenv("SENTIMENT_CHUNK_SENTENCES", "2000"))
+
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?…])\s+|\n\s*\n")
+
+
+def sentiment_label(compound: float) -> str:
+    if compound >= 0.05:
+        return "joy"
+    if compound <= -0.05:
+        return "fear"
+    return "neutral"
+
+
+def split_sentences(text: str) -> List[str]:
+    # Separador por puntuación; no requiere descargar los modelos punkt de NLTK
+    return [sentence.strip() for sentence in _SENTENCE_BOUNDARY.split(text) if sentence.strip()]
+
+
+def _load_vader():
+    from nltk.sentiment import SentimentIntensityAnalyzer
+    return SentimentIntensityAnalyzer()
+
+
+def score_sentences(analyzer, sentences: List[str]) -> Tuple[float, int, int, int]:
+    """
+    Return (length-weighted compound sum, total weight, positive count, negative count)
+    """
+    total, weight, positive, negative = 0.0, 0, 0, 0
+    for sentence in sentences:
+        compound = analyzer.polarity_scores(sentence)["compound"]
+        total += compound * len(sentence)
+        weight += len(sentence)
+        positive += compound >= 0.05
+        negative += compound <= -0.05
+    return total, weight, positive, negative
+
+
+# Un analizador por proceso del pool, creado en la primera tarea que recibe
+_worker_analyzers: Dict[Any, Any] = {}
+
+
+def _score_in_worker(sentences: List[str], loader: Optional[Callable[[], Any]] = None):
+    analyzer = _worker_analyzers.get(loader)
+    if analyzer is None:
+        analyzer = _worker_analyzers[loader] = (loader or _load_vader)()
+    return score_sentences(analyzer, sentences)
+
+
+class SentimentAnalyzer:
+    """
+    Process-wide VADER analyzer: the lexicon is loaded once and reused
+    """
+
+    def __init__(self, loader: Optional[Callable[[], Any]] = None):
+        self._loader = loader
+        self._analyzer = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._analyzer is not None
+
+    def load(self):
+        if self._analyzer is None:
+            with self._lock:
+                if self._analyzer is None:
+                    started = time.perf_counter()
+                    self._analyzer = (self._loader or _load_vader)()
+                    model_load_seconds.set(time.perf_counter() - started, model="vader")
+        return self._analyzer
+
+    def polarity(self, text: str) -> Dict[str, Any]:
+        compound = self.load().polarity_scores(text)["compound"]
+        return {"compound": compound, "label": sentiment_label(compound)}
+
+    def polarity_sentences(self, text: str) -> Dict[str, Any]:
+        sentences = split_sentences(text)
+        return self._aggregate([score_sentences(self.load(), sentences)], len(sentences))
+
+    @staticmethod
+    def _aggregate(parts: List[Tuple[float, int, int, int]], count: int) -> Dict[str, Any]:
+        total = sum(part[0] for part in parts)
+        weight = sum(part[1] for part in parts)
+        compound = round(total / weight, 4) if weight else 0.0
+        return {
+            "compound": compound,
+            "label": sentiment_label(compound),
+            "sentences": count,
+            "positive_ratio": round(sum(part[2] for part in parts) / count, 4) if count else 0.0,
+            "negative_ratio": round(sum(part[3] for part in parts) / count, 4) if count else 0.0,
+        }
+
+    async def analyze(self, text: str, mode: Optional[str] = None, executor=None) -> Dict[str, Any]:
+        """
+        Score `text` without blocking the event loop. Long texts in sentence mode
+        are split into groups of sentences scored in parallel on `executor`
+        (the shared process pool by default)
+        """
+        mode = mode or SENTIMENT_MODE
+        loop = asyncio.get_running_loop()
+        if mode == "sample":
+            return await loop.run_in_executor(cpu_pool, self.polarity, text[:SENTIMENT_SAMPLE_CHARS])
+        if mode != "sentences":
+            raise ValueError(f"Unknown sentiment mode: {mode}")
+        if len(text) < SENTIMENT_PROCESS_THRESHOLD:
+            return await loop.run_in_executor(cpu_pool, self.polarity_sentences, text)
+
+        sentences = await loop.run_in_executor(cpu_pool, split_sentences, text)
+        executor = executor or get_process_pool()
+        worker = functools.partial(_score_in_worker, loader=self._loader)
+        parts = await asyncio.gather(*(
+            loop.run_in_executor(executor, worker, sentences[start:start + SENTIMENT_CHUNK_SENTENCES])
+            for start in range(0, len(sentences), SENTIMENT_CHUNK_SENTENCES)
+        ))
+        return self._aggregate(list(parts), len(sentences))
+
+
+sentiment_analyzer = SentimentAnalyzer()
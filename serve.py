@@ -0,0 +1,132 @@
+"""
+Production launcher. With one worker it runs `uvicorn main:app` as before.
+With WEB_WORKERS > 1 it first starts the shared inference process
+(model_server.py), which loads the classifier and VADER once, and then the
+uvicorn workers, which call it over a Unix socket instead of loading their
+own copies. uvicorn starts its workers with multiprocessing "spawn", so
+weights loaded in this process before the workers start would not be
+shared: they have to live in a process of their own.
+
+The on-disk caches (embeddings, summaries, Wikipedia context, jobs) are
+SQLite files opened by every worker in WAL mode with mmap, so an entry
+written by one worker is read by all of them from the OS page cache. They
+live in DATA_DIR; without it, the files the workers cannot do without
+(query embeddings, jobs, shared state) go to a temporary directory that
+is removed on exit. The
+in-memory indexes stay per worker and follow each other through the change
+feed of shared_state.py, which also merges the metrics of all workers.
+
+    python serve.py --workers 4
+    WEB_WORKERS=4 python serve.py --port 8000
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent
+
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", "1"))
+DEFAULT_INFERENCE_SOCKET = "/tmp/api-book-inference.sock"
+
+
+def shared_environment(workers: int) -> Optional[str]:
+    """
+    Settings every worker must agree on when several run at once. The files
+    they share go to DATA_DIR or, without it, to a temporary directory for
+    this run, whose path is returned so it can be removed on exit
+    """
+    if workers <= 1:
+        return None
+    os.environ.setdefault("INFERENCE_SOCKET", DEFAULT_INFERENCE_SOCKET)
+    run_dir = None
+    directory = os.getenv("DATA_DIR")
+    if not directory:
+        directory = run_dir = tempfile.mkdtemp(prefix="api-book-")
+    # La caché de embeddings de consultas pasa a un archivo compartido (sin ella cada worker tiene la suya)
+    os.environ.setdefault("EMBEDDING_CACHE_PATH", os.path.join(directory, "embedding_cache.sqlite"))
+    # Registro de documentos insertados por cada worker y sus métricas (ver shared_state.py)
+    os.environ.setdefault("SHARED_STATE_PATH", os.path.join(directory, "shared_state.sqlite"))
+    # /jobs/{id} puede llegar a un worker distinto del que recibió el trabajo
+    os.environ.setdefault("JOB_STORE_PATH", os.path.join(directory, "jobs.sqlite"))
+    return run_dir
+
+
+def check_shared_state(workers: int):
+    """
+    Refuse to run several workers with per-process indexes and no shared
+    state: a book uploaded through one worker would never reach the BM25
+    or local vector index of the others
+    """
+    if workers <= 1 or os.getenv("SHARED_STATE_PATH"):
+        return
+    per_process = []
+    if os.getenv("LEXICAL_SEARCH", "false").lower() == "true":
+        per_process.append("LEXICAL_SEARCH")
+    if os.getenv("VECTOR_STORE", "supabase") == "local":
+        per_process.append("VECTOR_STORE=local")
+    if per_process:
+        raise SystemExit(f"{' and '.join(per_process)} keep an index per worker: set SHARED_STATE_PATH "
+                         f"or run a single worker")
+
+
+def start_inference_server(socket_path: str, command: Optional[List[str]] = None,
+                           env: Optional[Dict[str, str]] = None, timeout: float = 600.0) -> subprocess.Popen:
+    """
+    Start the inference process and wait until it listens on `socket_path`
+    (it only listens once its models are loaded)
+    """
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    command = command or [sys.executable, str(ROOT / "model_server.py"), "--socket", socket_path]
+    process = subprocess.Popen(command, cwd=ROOT, env=env)
+    deadline = time.monotonic() + timeout
+    while not os.path.exists(socket_path):
+        if process.poll() is not None:
+            raise RuntimeError(f"Inference server exited with status {process.returncode}")
+        if time.monotonic() > deadline:
+            process.terminate()
+            raise TimeoutError(f"Inference server did not listen on {socket_path} in {timeout:.0f}s")
+        time.sleep(0.1)
+    return process
+
+
+def stop(process: subprocess.Popen, timeout: float = 10.0):
+    if process.poll() is None:
+        process.terminate()
+        try:
+            process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=WEB_WORKERS)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    run_dir = shared_environment(args.workers)
+    server = None
+    try:
+        check_shared_state(args.workers)
+        if os.getenv("INFERENCE_SOCKET"):
+            server = start_inference_server(os.environ["INFERENCE_SOCKET"])
+        uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers, app_dir=str(ROOT))
+    finally:
+        if server is not None:
+            stop(server)
+        if run_dir is not None:
+            shutil.rmtree(run_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
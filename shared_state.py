@@ -0,0 +1,177 @@
+"""
+State the uvicorn workers of one host share through a SQLite file
+(SHARED_STATE_PATH, set by serve.py when WEB_WORKERS > 1):
+
+- a change feed with the ids of the documents each worker inserts or
+  removes. The other workers poll it every SHARED_STATE_POLL seconds, drop
+  their cached search results and re-read those rows into their own
+  in-memory indexes (BM25, local vector index, duplicate keys), so a book
+  uploaded through one worker is found through all of them
+- the metric samples of every worker, so /metrics on any worker reports the
+  whole server (each sample labelled with its worker)
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from executors import io_pool, run_io
+from metrics import Family, merge_worker_families, record_event, registry, render_families
+from storage import connect_sqlite
+
+SHARED_STATE_PATH = os.getenv("SHARED_STATE_PATH", "")
+# Cada cuánto mira un worker los cambios de los demás (retraso máximo de sus índices y su caché)
+SHARED_STATE_POLL = float(os.getenv("SHARED_STATE_POLL", "0.5"))
+# Cada cuánto publica un worker sus métricas; /metrics ignora las de workers que llevan 3 intervalos sin hacerlo
+SHARED_METRICS_INTERVAL = float(os.getenv("SHARED_METRICS_INTERVAL", "5"))
+# Los cambios más antiguos se borran al arrancar (los workers nuevos cargan sus índices completos)
+SHARED_CHANGES_RETENTION = 24 * 3600
+
+
+class SharedStateStore:
+    """
+    The change feed and per-worker metric snapshots in SQLite
+    """
+
+    def __init__(self, path: str = SHARED_STATE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+
+    @property
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = connect_sqlite(self.path)
+            self._conn.execute("CREATE TABLE IF NOT EXISTS document_changes (seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+                               "origin TEXT, ids TEXT, created_at REAL)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS worker_metrics (worker TEXT PRIMARY KEY, families TEXT, "
+                               "updated_at REAL)")
+            self._conn.commit()
+        return self._conn
+
+    def publish_changes(self, origin: str, ids: List[str]) -> int:
+        with self._lock:
+            cursor = self._db.execute("INSERT INTO document_changes (origin, ids, created_at) VALUES (?, ?, ?)",
+                                      (origin, json.dumps(ids), time.time()))
+            self._db.commit()
+            return cursor.lastrowid
+
+    def last_change(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COALESCE(MAX(seq), 0) FROM document_changes").fetchone()[0]
+
+    def changes_since(self, seq: int, origin: str) -> Tuple[int, List[str]]:
+        """
+        (last sequence number, ids inserted by other workers after `seq`)
+        """
+        with self._lock:
+            rows = self._db.execute("SELECT seq, origin, ids FROM document_changes WHERE seq > ? ORDER BY seq",
+                                    (seq,)).fetchall()
+        ids: Dict[str, None] = {}
+        for _, row_origin, row_ids in rows:
+            if row_origin != origin:
+                ids.update(dict.fromkeys(json.loads(row_ids)))
+        return (rows[-1][0] if rows else seq), list(ids)
+
+    def purge_changes(self, before: float):
+        with self._lock:
+            self._db.execute("DELETE FROM document_changes WHERE created_at < ?", (before,))
+            self._db.commit()
+
+    def publish_metrics(self, worker: str, families: List[Family]):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO worker_metrics (worker, families, updated_at) VALUES (?, ?, ?)",
+                             (worker, json.dumps(families), time.time()))
+            self._db.commit()
+
+    def worker_metrics(self, updated_after: float) -> Dict[str, List[Family]]:
+        with self._lock:
+            rows = self._db.execute("SELECT worker, families FROM worker_metrics WHERE updated_at >= ? ORDER BY worker",
+                                    (updated_after,)).fetchall()
+        return {worker: json.loads(families) for worker, families in rows}
+
+    def remove_worker(self, worker: str):
+        with self._lock:
+            self._db.execute("DELETE FROM worker_metrics WHERE worker = ?", (worker,))
+            self._db.commit()
+
+
+class SharedState:
+    """
+    One worker's side of the shared state: publishes the ids it inserts or
+    removes, applies the ones changed elsewhere with `apply_remote(ids)` and keeps
+    its metrics in the store
+    """
+
+    def __init__(self, store: SharedStateStore, apply_remote: Callable[[List[str]], Awaitable[Any]],
+                 poll_interval: float = SHARED_STATE_POLL, metrics_interval: float = SHARED_METRICS_INTERVAL,
+                 worker: Optional[str] = None):
+        self.store = store
+        self.apply_remote = apply_remote
+        self.poll_interval = poll_interval
+        self.metrics_interval = metrics_interval
+        self.worker = worker or str(os.getpid())
+        self.seen = 0
+        self.applied = 0
+        self._metrics_published = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        await run_io(self.store.purge_changes, time.time() - SHARED_CHANGES_RETENTION)
+        # Lo anterior ya está en la tabla que este worker carga al arrancar; aplicar algo dos veces no cambia nada
+        self.seen = await run_io(self.store.last_change)
+        await self.publish_metrics()
+        self._task = asyncio.create_task(self._poll_loop())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        try:
+            await run_io(self.store.remove_worker, self.worker)
+        except Exception:
+            record_event("shared_state_error")
+
+    def publish(self, ids: List[str]):
+        """
+        Announce inserted documents (non-blocking: the write runs on the I/O pool)
+        """
+        if ids:
+            return io_pool.submit(self.store.publish_changes, self.worker, list(ids))
+
+    async def poll(self):
+        seen, ids = await run_io(self.store.changes_since, self.seen, self.worker)
+        if ids:
+            await self.apply_remote(ids)
+            self.applied += len(ids)
+        self.seen = seen
+
+    async def _poll_loop(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.poll()
+                if time.monotonic() - self._metrics_published >= self.metrics_interval:
+                    await self.publish_metrics()
+            except Exception:
+                # Se reintenta en la siguiente vuelta con el mismo número de secuencia
+                record_event("shared_state_error")
+
+    async def publish_metrics(self):
+        # Los colectores de métricas hacen consultas a SQLite: también en el pool de E/S
+        await run_io(lambda: self.store.publish_metrics(self.worker, registry.families()))
+        self._metrics_published = time.monotonic()
+
+    async def render_metrics(self) -> str:
+        """
+        Prometheus text with the samples of every live worker
+        """
+        await self.publish_metrics()
+        by_worker = await run_io(self.store.worker_metrics, time.time() - 3 * self.metrics_interval)
+        return render_families(merge_worker_families(by_worker))
+
+    def stats(self) -> Dict[str, Any]:
+        return {"worker": self.worker, "seen": self.seen, "applied": self.applied}
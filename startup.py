@@ -0,0 +1,77 @@
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from executors import run_io
+from metrics import startup_seconds
+
+# Modelos y clientes que se cargan en segundo plano al arrancar (lista separada por comas):
+# classifier, sentiment, embeddings, llm. El resto se carga en la primera petición que los usa
+WARMUP = os.getenv("WARMUP", "")
+
+
+def warmup_targets(value: str = WARMUP, preload_classifier: Optional[bool] = None) -> List[str]:
+    targets = [name.strip() for name in value.split(",") if name.strip()]
+    # PRELOAD_CLASSIFIER=true se mantiene como alias de WARMUP=classifier
+    if preload_classifier is None:
+        preload_classifier = os.getenv("PRELOAD_CLASSIFIER", "false").lower() == "true"
+    if preload_classifier and "classifier" not in targets:
+        targets.append("classifier")
+    return targets
+
+
+class StartupTracker:
+    """
+    Runs the background startup work (index loads, model warmup) without
+    delaying the first request, and reports the state of each task for the
+    readiness probe
+    """
+
+    def __init__(self):
+        self.started_at = time.time()
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._seconds: Dict[str, float] = {}
+        self._errors: Dict[str, str] = {}
+
+    def run(self, name: str, awaitable: Awaitable[Any]) -> asyncio.Task:
+        async def tracked():
+            started = time.perf_counter()
+            try:
+                await awaitable
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Un fallo al cargar no tumba la app: esa ruta lo volverá a intentar en su primer uso
+                self._errors[name] = str(e) or type(e).__name__
+            finally:
+                self._seconds[name] = time.perf_counter() - started
+                startup_seconds.set(self._seconds[name], phase=name)
+
+        task = self._tasks[name] = asyncio.create_task(tracked())
+        return task
+
+    def warm(self, name: str, load: Callable[[], Any]) -> asyncio.Task:
+        # Las cargas de modelos son bloqueantes (disco, red e imports pesados)
+        return self.run(f"warmup_{name}", run_io(load))
+
+    @property
+    def done(self) -> bool:
+        return all(task.done() for task in self._tasks.values())
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        report = {}
+        for name, task in self._tasks.items():
+            if not task.done():
+                report[name] = {"state": "loading", "seconds": round(time.time() - self.started_at, 3)}
+            elif name in self._errors:
+                report[name] = {"state": "failed", "seconds": round(self._seconds[name], 3), "error": self._errors[name]}
+            else:
+                report[name] = {"state": "ready", "seconds": round(self._seconds.get(name, 0.0), 3)}
+        return report
+
+    async def cancel(self):
+        for task in self._tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        self._tasks.clear()
@@ -0,0 +1,39 @@
+"""
+SQLite connections for the on-disk stores (embeddings, Wikipedia context,
+summaries, jobs). Every API worker opens the same files: WAL lets readers run
+while another process writes, and the memory-mapped pages live in the OS page
+cache, so an entry written by one worker is served to all of them without
+each process keeping its own copy.
+"""
+import os
+import sqlite3
+
+# Directorio de los archivos SQLite (cachés, trabajos...). Vacío = ningún archivo: cada almacén
+# se queda en memoria o desactivado, salvo que se configure su propia ruta
+DATA_DIR = os.getenv("DATA_DIR", "")
+# Bytes de cada archivo que SQLite lee con mmap (compartidos entre procesos por la caché de páginas)
+SQLITE_MMAP_BYTES = int(os.getenv("SQLITE_MMAP_BYTES", str(256 * 2 ** 20)))
+# Espera máxima por el bloqueo de escritura de otro proceso
+SQLITE_BUSY_TIMEOUT = float(os.getenv("SQLITE_BUSY_TIMEOUT", "10"))
+
+
+def data_path(name: str) -> str:
+    """
+    Default path of an on-disk store: `name` inside DATA_DIR, or "" without it
+    """
+    return os.path.join(DATA_DIR, name) if DATA_DIR else ""
+
+
+def connect_sqlite(path: str) -> sqlite3.Connection:
+    """
+    Open `path` for use from several threads and processes
+    """
+    if path != ":memory:":
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False, timeout=SQLITE_BUSY_TIMEOUT)
+    if path != ":memory:":
+        conn.execute("PRAGMA journal_mode=WAL")
+        # Con WAL, NORMAL solo puede perder las últimas transacciones si se cae el sistema, no el proceso
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA mmap_size={SQLITE_MMAP_BYTES}")
+    return conn
@@ -0,0 +1,243 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+from executors import run_io
+from metrics import model_load_seconds, stage, stage_seconds
+from storage import connect_sqlite, data_path
+
+SUMMARY_MODEL = os.getenv("SUMMARY_MODEL", "gpt-4.1-nano")
+# Vacío (sin DATA_DIR) = sin caché
+SUMMARY_CACHE_PATH = os.getenv("SUMMARY_CACHE_PATH", data_path("summary_cache.sqlite"))
+# Cambiar al modificar los prompts: invalida los resúmenes guardados con la versión anterior
+PROMPT_VERSION = "1"
+UNKNOWN_BOOK_INFO = "UNKNOWN_BOOK_INFO"
+UNABLE_TO_SUMMARIZE = "Unable to generate summary for this book"
+
+SYSTEM_PROMPT = (
+    "You are an expert librarian and a skilled summary writer. Your task is to write comprehensive, engaging, and strictly spoiler-free book summaries for catalogs. "
+    "The summary must be structured into exactly FOUR distinct paragraphs. "
+    "Each paragraph should ideally be between 100 and 250 words. "
+    "The summary must capture the main themes, an overview of the plot (without revealing spoilers, major twists, or the ending), key characters (if central to a non-spoiler overview), and the general tone of the work. "
+    "You must use all the information provided: the book title, the original description from the dataset, and any supplemental context from Wikipedia. Synthesize this information effectively. "
+    "CRITICALLY IMPORTANT: DO NOT REVEAL ANY SPOILERS, major plot twists, or the ending of the book. Maintain a neutral and informative tone suitable for a catalog."
+    "\n\nIf, even with all the provided information, you cannot create a meaningful, accurate, and spoiler-free summary adhering to the requested length (4 paragraphs, 100-250 words each) and structure, "
+    "or if the book is entirely unfamiliar and the provided details are grossly insufficient for such a summary, "
+    "please respond with the exact phrase: UNKNOWN_BOOK_INFO"
+)
+
+USER_PROMPT_TEMPLATE = (
+    "Please generate a detailed, four-paragraph, spoiler-free summary for the following book. "
+    "Aim for each paragraph to be between 100 and 250 words.\n\n"
+    "Book Title: {title}\n\n"
+    "Original Description (from dataset):\n{original_description}\n\n"
+    "Supplemental Information (from Wikipedia):\n{wikipedia_context}\n\n"
+    "Summary (FOUR paragraphs, 100-250 words each, ABSOLUTELY NO SPOILERS):"
+)
+
+
+def build_messages(title: str, original_description: str, wikipedia_context: str):
+    from llama_index.core.llms import ChatMessage, MessageRole
+
+    user_content = USER_PROMPT_TEMPLATE.format(
+        title=title,
+        original_description=original_description,
+        wikipedia_context=wikipedia_context if wikipedia_context else "No Wikipedia context available",
+    )
+    return [
+        ChatMessage(role=MessageRole.SYSTEM, content=SYSTEM_PROMPT),
+        ChatMessage(role=MessageRole.USER, content=user_content),
+    ]
+
+
+def summary_key(title: str, original_description: str, wikipedia_context: str, model: str = SUMMARY_MODEL) -> str:
+    raw = json.dumps([title, original_description, wikipedia_context, PROMPT_VERSION, model])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def default_llm():
+    from llama_index.llms.openai import OpenAI
+    from clients import clients
+
+    # Mismo pool de conexiones (y reintentos) que los embeddings
+    return OpenAI(model=SUMMARY_MODEL, temperature=0.7, max_tokens=1600,
+                  async_http_client=clients.http("openai"), max_retries=0)
+
+
+class SummaryStore:
+    """
+    Persistent store of generated summaries in SQLite
+    """
+
+    def __init__(self, path: str = SUMMARY_CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+
+    @property
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = connect_sqlite(self.path)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS summaries (key TEXT PRIMARY KEY, summary TEXT, created_at REAL)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._db.execute("SELECT summary FROM summaries WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def put(self, key: str, summary: str):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO summaries (key, summary, created_at) VALUES (?, ?, ?)",
+                (key, summary, time.time()),
+            )
+            self._db.commit()
+
+
+class SummaryService:
+    """
+    Generates book summaries with one shared LLM client, memoizing the result
+    of each (title, description, Wikipedia context, prompt version) input
+    """
+
+    def __init__(self, wikipedia, store: Optional[SummaryStore] = None,
+                 llm_factory: Callable[[], Any] = default_llm, model: str = SUMMARY_MODEL):
+        self.wikipedia = wikipedia
+        self.store = store
+        self.model = model
+        self._llm_factory = llm_factory
+        self._llm = None
+        self._llm_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self._llm is not None
+
+    @property
+    def llm(self):
+        # Un solo cliente para todo el proceso, creado en el primer uso (también desde un hilo)
+        if self._llm is None:
+            with self._llm_lock:
+                if self._llm is None:
+                    started = time.perf_counter()
+                    self._llm = self._llm_factory()
+                    model_load_seconds.set(time.perf_counter() - started, model="summary_llm")
+        return self._llm
+
+    async def _wikipedia_context(self, title: str) -> str:
+        with stage("wikipedia"):
+            return await self.wikipedia.get_context(title)
+
+    async def _prepare(self, title: str) -> str:
+        """
+        Look up the Wikipedia context while the LLM client is made ready
+        (created on a worker thread the first time); returns the context
+        """
+        lookup = asyncio.create_task(self._wikipedia_context(title))
+        try:
+            if self._llm is None:
+                try:
+                    await run_io(lambda: self.llm)
+                except Exception:
+                    # El error se vuelve a producir, y se devuelve, al llamar al LLM
+                    pass
+            return await lookup
+        except BaseException:
+            lookup.cancel()
+            raise
+
+    async def _cached(self, key: str) -> Optional[str]:
+        if self.store is None:
+            return None
+        with stage("summary_cache"):
+            summary = await run_io(self.store.get, key)
+        if summary is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return summary
+
+    async def _remember(self, key: str, summary: str):
+        if self.store is not None:
+            await run_io(self.store.put, key, summary)
+
+    async def generate(self, title: str, original_description: str) -> Dict[str, str]:
+        wikipedia_context = await self._prepare(title)
+        key = summary_key(title, original_description, wikipedia_context, self.model)
+        cached = await self._cached(key)
+        if cached is not None:
+            return {"error": "", "summary_text": cached}
+
+        try:
+            with stage("llm"):
+                response = await self.llm.achat(build_messages(title, original_description, wikipedia_context))
+            summary_text = str(response.message.content).strip()
+        except Exception as e:
+            return {"error": str(e), "summary_text": ""}
+
+        if summary_text.upper() == UNKNOWN_BOOK_INFO or not summary_text:
+            return {"error": UNABLE_TO_SUMMARIZE, "summary_text": ""}
+        await self._remember(key, summary_text)
+        return {"error": "", "summary_text": summary_text}
+
+    async def stream(self, title: str, original_description: str) -> AsyncIterator[Dict[str, str]]:
+        """
+        Yield {"delta": ...} events as the summary is generated, then a final
+        {"done": full_text} or {"error": ...} event
+        """
+        wikipedia_context = await self._prepare(title)
+        key = summary_key(title, original_description, wikipedia_context, self.model)
+        cached = await self._cached(key)
+        if cached is not None:
+            yield {"delta": cached}
+            yield {"done": cached}
+            return
+
+        text = ""
+        emitted = 0
+        started = time.perf_counter()
+        try:
+            # La generación ocurre mientras se recorre el stream: la etapa lo cubre entero
+            with stage("llm_stream"):
+                stream = await self.llm.astream_chat(build_messages(title, original_description, wikipedia_context))
+                async for chunk in stream:
+                    if not text:
+                        # Tiempo hasta el primer token: lo que espera el usuario antes de ver texto
+                        stage_seconds.observe(time.perf_counter() - started, stage="llm_first_token")
+                    text += chunk.delta or ""
+                    # Retener el principio hasta saber que no es la respuesta UNKNOWN_BOOK_INFO
+                    if emitted == 0 and UNKNOWN_BOOK_INFO.startswith(text.strip().upper()):
+                        continue
+                    yield {"delta": text[emitted:]}
+                    emitted = len(text)
+        except Exception as e:
+            yield {"error": str(e)}
+            return
+
+        summary_text = text.strip()
+        if summary_text.upper() == UNKNOWN_BOOK_INFO or not summary_text:
+            yield {"error": UNABLE_TO_SUMMARIZE}
+            return
+        if emitted < len(text):
+            yield {"delta": text[emitted:]}
+        await self._remember(key, summary_text)
+        yield {"done": summary_text}
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
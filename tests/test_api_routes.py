@@ -40,6 +40,37 @@ def test_search_pagination():
     assert response.json()["limit"] == 5
     assert response.json()["offset"] == 2
 
+def test_search_rejects_negative_pagination():
+    """Prueba /search con limit u offset negativos: error de validación"""
+    assert client.get("/search?query=aventuras&limit=-1").status_code == 422
+    assert client.get("/search?query=aventuras&offset=-5").status_code == 422
+
+def test_search_fields_and_snippet():
+    """Prueba /search con proyección de campos y fragmentos del contenido"""
+    response = client.get("/search?query=aventuras&limit=3&fields=title,authors")
+    assert response.status_code == 200
+    for result in response.json()["results"]:
+        assert "content" not in result
+        assert set(result["metadata"]) <= {"title", "authors"}
+    response = client.get("/search?query=aventuras&limit=3&snippet=120")
+    for result in response.json()["results"]:
+        assert len(result["content"]) <= 122
+    assert "error" in client.get("/search?query=aventuras&snippet=0").json()
+
+def test_search_batch():
+    """Prueba la ruta /search_batch: una respuesta por búsqueda, en el mismo orden"""
+    response = client.post("/search_batch", json={"searches": [
+        {"query": "aventuras", "dominant_sentiment": "joy", "limit": 3},
+        {"query": "misterio", "limit": 2, "offset": 2},
+        {"query": "aventuras", "mode": "desconocido"},
+    ]})
+    assert response.status_code == 200
+    responses = response.json()["responses"]
+    assert len(responses) == 3
+    assert responses[0]["limit"] == 3 and "results" in responses[0]
+    assert responses[1]["offset"] == 2
+    assert "error" in responses[2]
+
 def test_upload_book_missing_content():
     """Prueba la ruta /upload_book con error: contenido faltante"""
     test_data = {
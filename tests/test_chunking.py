@@ -0,0 +1,133 @@
+import asyncio
+
+import chunking
+from chunking import StreamingSplitter, ChunkedIngester, collapse_chunks, decode_stream, iter_text
+from dedup import DedupIndex
+from fakes import InMemoryPostgrest
+
+
+def words(text):
+    return len(text.split())
+
+
+class FakeEmbeddings:
+    def __init__(self, fail=False, fail_after=None):
+        self.calls = 0
+        self.fail = fail
+        self.fail_after = fail_after
+
+    async def aembed_documents(self, texts):
+        self.calls += 1
+        if self.fail or (self.fail_after is not None and self.calls > self.fail_after):
+            raise RuntimeError("límite de la API")
+        return [[1.0, float(len(text))] for text in texts]
+
+
+BOOK = " ".join(f"palabra{i}" for i in range(2000))
+
+
+def test_streaming_splitter_covers_whole_text():
+    """El texto llega por trozos y todos los fragmentos respetan el tamaño"""
+    splitter = StreamingSplitter(chunk_size=50, chunk_overlap=5, length_function=words, window_chars=2000)
+
+    async def split():
+        chunks = []
+        for start in range(0, len(BOOK), 300):
+            chunks.extend(await splitter.feed(BOOK[start:start + 300]))
+        chunks.extend(await splitter.finish())
+        return chunks
+
+    chunks = asyncio.run(split())
+    assert all(words(chunk) <= 50 for chunk in chunks)
+    assert chunks[0].startswith("palabra0 ")
+    assert chunks[-1].endswith("palabra1999")
+    seen = set(" ".join(chunks).split())
+    assert seen == set(BOOK.split())
+
+
+def test_decode_stream_handles_split_characters():
+    """Un carácter multibyte partido entre dos trozos se decodifica bien"""
+    data = "año ñandú".encode("utf-8")
+
+    async def chunks():
+        yield data[:2]
+        yield data[2:]
+
+    async def collect():
+        return "".join([piece async for piece in decode_stream(chunks())])
+
+    assert asyncio.run(collect()) == "año ñandú"
+
+
+def test_chunked_ingest_links_chunks_to_parent():
+    """Los fragmentos se guardan enlazados al libro y se embeben por lotes"""
+    db = InMemoryPostgrest({"documents": [], "book_keys": []})
+    ingester = ChunkedIngester(db, FakeEmbeddings(), DedupIndex(db), length_function=words)
+    result = asyncio.run(ingester.ingest(iter_text(BOOK, piece_size=500), {"title": "Libro largo"}))
+    assert result["success"] is True
+    rows = db.tables["documents"]
+    assert len(rows) == result["chunks"] > 1
+    assert {row["metadata"]["parent_id"] for row in rows} == {result["document_id"]}
+    assert sorted(row["metadata"]["chunk_index"] for row in rows) == list(range(len(rows)))
+    # Las claves apuntan al fragmento 0, una fila real que el trigger de borrado encuentra
+    first = next(row for row in rows if row["id"] == result["document_id"])
+    assert first["metadata"]["chunk_index"] == 0
+    assert {row["document_id"] for row in db.tables["book_keys"]} == {result["document_id"]}
+    # Un segundo intento con el mismo título es duplicado
+    again = asyncio.run(ingester.ingest(iter_text(BOOK), {"title": "Libro largo"}))
+    assert again["existing_document_id"] == result["document_id"]
+
+
+def test_chunked_ingest_cleans_up_on_failure():
+    """Si falla un lote no quedan fragmentos ni claves reservadas"""
+    db = InMemoryPostgrest({"documents": [], "book_keys": []})
+    ingester = ChunkedIngester(db, FakeEmbeddings(fail=True), DedupIndex(db), length_function=words)
+    try:
+        asyncio.run(ingester.ingest(iter_text(BOOK), {"title": "Libro largo"}))
+        assert False, "debería fallar"
+    except RuntimeError:
+        pass
+    assert db.tables["documents"] == []
+    assert db.tables["book_keys"] == []
+
+
+def test_chunked_ingest_notifies_each_batch(monkeypatch):
+    """Cada lote insertado se avisa en cuanto se guarda, sin esperar al final del libro"""
+    monkeypatch.setattr(chunking, "CHUNK_EMBED_BATCH", 1)
+    db = InMemoryPostgrest({"documents": [], "book_keys": []})
+    notified = []
+    ingester = ChunkedIngester(db, FakeEmbeddings(), DedupIndex(db), on_inserted=notified.append,
+                               length_function=words)
+    result = asyncio.run(ingester.ingest(iter_text(BOOK, piece_size=500), {"title": "Libro largo"}))
+    assert len(notified) == result["chunks"] > 1
+    assert all(len(rows) == 1 for rows in notified)
+
+
+def test_chunked_ingest_withdraws_notified_batches_on_failure(monkeypatch):
+    """Si un lote posterior falla, los fragmentos ya avisados se retiran de los índices"""
+    monkeypatch.setattr(chunking, "CHUNK_EMBED_BATCH", 1)
+    monkeypatch.setattr(chunking, "CHUNK_EMBED_CONCURRENCY", 1)
+    db = InMemoryPostgrest({"documents": [], "book_keys": []})
+    notified, removed = [], []
+    ingester = ChunkedIngester(db, FakeEmbeddings(fail_after=1), DedupIndex(db),
+                               on_inserted=lambda rows: notified.extend(row["id"] for row in rows),
+                               length_function=words, on_removed=removed.extend)
+    try:
+        asyncio.run(ingester.ingest(iter_text(BOOK, piece_size=500), {"title": "Libro largo"}))
+        assert False, "debería fallar"
+    except RuntimeError:
+        pass
+    assert len(notified) == 1
+    assert removed == notified
+    assert db.tables["documents"] == []
+
+
+def test_collapse_chunks_keeps_best_hit_per_book():
+    """La búsqueda devuelve cada libro una sola vez"""
+    hits = [
+        {"id": "1", "metadata": {"parent_id": "a", "chunk_index": 3}},
+        {"id": "2", "metadata": {"title": "Corto"}},
+        {"id": "3", "metadata": {"parent_id": "a", "chunk_index": 0}},
+        {"id": "4", "metadata": {"parent_id": "b", "chunk_index": 1}},
+    ]
+    assert [hit["id"] for hit in collapse_chunks(hits)] == ["1", "2", "4"]
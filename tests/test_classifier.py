@@ -0,0 +1,175 @@
+import asyncio
+import numpy as np
+import pytest
+from classifier import MicroBatcher, ZeroShotClassifier, CATEGORIES
+from fakes import FakeZeroShotPipeline
+from nli_backend import CLASSIFIER_MAX_PAIRS, NLIZeroShotPipeline
+
+
+class FakePipeline:
+    """Pipeline falso que registra el tamaño de cada lote"""
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts, labels, batch_size=None):
+        self.calls.append(len(texts))
+        return [{"sequence": t, "labels": list(labels), "scores": [1.0] + [0.0] * (len(labels) - 1)} for t in texts]
+
+
+def test_classifier_loads_once():
+    """El modelo se carga una sola vez y se reutiliza"""
+    loads = []
+    classifier = ZeroShotClassifier(loader=lambda: loads.append(1) or FakePipeline())
+    classifier.classify_batch(["uno"])
+    classifier.classify_batch(["dos", "tres"])
+    assert len(loads) == 1
+    assert classifier.loaded
+
+
+def test_batch_fills_forward_passes_with_pairs():
+    """batch_size cuenta pares (texto, categoría): un lote de textos no se convierte en una pasada por categoría"""
+    pipeline = FakeZeroShotPipeline()
+    classifier = ZeroShotClassifier(loader=lambda: pipeline)
+    classifier.classify_batch([f"libro {i}" for i in range(8)], CATEGORIES)
+    # 8 textos x 20 categorías = 160 pares, una sola pasada
+    assert pipeline.forward_passes == 1
+    texts = [f"libro {i}" for i in range(CLASSIFIER_MAX_PAIRS // len(CATEGORIES) + 1)]
+    classifier.classify_batch(texts, CATEGORIES)
+    assert pipeline.forward_passes == 1 + 2
+
+
+def test_batcher_groups_concurrent_requests():
+    """Las peticiones concurrentes se agrupan en un solo lote"""
+    fake = FakePipeline()
+    classifier = ZeroShotClassifier(loader=lambda: fake)
+    batcher = MicroBatcher(lambda texts: classifier.classify_batch(texts, CATEGORIES), max_batch_size=8, max_wait_ms=50)
+
+    async def run():
+        results = await asyncio.gather(*(batcher.submit(f"texto {i}") for i in range(5)))
+        await batcher.close()
+        return results
+
+    results = asyncio.run(run())
+    assert [r["sequence"] for r in results] == [f"texto {i}" for i in range(5)]
+    assert fake.calls == [5]
+
+
+def test_batcher_respects_max_batch_size():
+    """Los lotes nunca superan el tamaño máximo configurado"""
+    sizes = []
+
+    def fn(items):
+        sizes.append(len(items))
+        return items
+
+    batcher = MicroBatcher(fn, max_batch_size=3, max_wait_ms=20)
+
+    async def run():
+        results = await asyncio.gather(*(batcher.submit(i) for i in range(7)))
+        await batcher.close()
+        return results
+
+    assert asyncio.run(run()) == list(range(7))
+    assert max(sizes) <= 3
+    assert sum(sizes) == 7
+
+
+def test_batcher_propagates_errors():
+    """Un error en el lote se propaga a todas las peticiones del lote"""
+    def fn(items):
+        raise ValueError("modelo no disponible")
+
+    batcher = MicroBatcher(fn, max_batch_size=4, max_wait_ms=10)
+
+    async def run():
+        with pytest.raises(ValueError):
+            await batcher.submit("texto")
+        await batcher.close()
+
+    asyncio.run(run())
+
+
+class WordTokenizer:
+    """Tokenizador falso: un id por palabra, con los tokens especiales de BART y un registro de llamadas"""
+    pad_token_id = 1
+    model_max_length = 16
+
+    def __init__(self):
+        self.vocab = {}
+        self.calls = []
+
+    def __call__(self, texts, add_special_tokens=True):
+        self.calls.append(list(texts))
+        return {"input_ids": [[self.vocab.setdefault(word, len(self.vocab) + 3) for word in text.lower().split()]
+                              for text in texts]}
+
+    def num_special_tokens_to_add(self, pair=False):
+        return 4
+
+    def build_inputs_with_special_tokens(self, first, second):
+        return [0] + first + [2, 2] + second + [2]
+
+
+def keyword_forward(tokenizer, passes):
+    """Forward falso: implicación alta si la última palabra de la hipótesis aparece en el texto"""
+    def forward(input_ids, attention_mask):
+        passes.append(input_ids.shape)
+        logits = np.zeros((len(input_ids), 3), dtype=np.float32)
+        for i, (row, mask) in enumerate(zip(input_ids, attention_mask)):
+            tokens = row[mask == 1].tolist()
+            separator = tokens.index(2)
+            premise, hypothesis = tokens[1:separator], tokens[separator + 2:-1]
+            logits[i, 2] = 3.0 * (hypothesis[-1] in premise)
+        return logits
+    return forward
+
+
+def test_nli_pipeline_batches_pairs_and_caches_hypotheses():
+    """Todos los pares (texto, categoría) van en un forward pass y las hipótesis se tokenizan una vez"""
+    tokenizer = WordTokenizer()
+    passes = []
+    pipeline = NLIZeroShotPipeline(tokenizer, keyword_forward(tokenizer, passes), entailment_id=2,
+                                   hypothesis_template="about {}")
+    labels = ["dragons", "love", "war"]
+    first = pipeline(["a story of love and war", "dragons everywhere dragons"], labels)
+    second = pipeline("nothing here at all", labels)
+
+    # 2 textos x 3 categorías en una sola pasada
+    assert passes[0][0] == 6
+    assert [output["labels"][0] for output in first] == ["love", "dragons"]
+    assert np.isclose(sum(first[0]["scores"]), 1.0)
+    assert np.isclose(first[0]["scores"][0], first[0]["scores"][1])
+    # Sin coincidencias las puntuaciones son uniformes y el orden el de las etiquetas
+    assert second["labels"] == labels and np.allclose(second["scores"], 1 / 3)
+    hypothesis_calls = [call for call in tokenizer.calls if call[0].startswith("about")]
+    assert len(hypothesis_calls) == 1 and pipeline.forward_passes == 2
+    # El texto se recorta para que la hipótesis quepa entera
+    long_text = " ".join(["filler"] * 40) + " war"
+    assert pipeline(long_text, labels)["labels"][0] != "war"
+    assert max(shape[1] for shape in passes) <= tokenizer.model_max_length
+
+
+def test_nli_pipeline_splits_large_batches_by_text():
+    """Con max_pairs pequeño cada pasada lleva los pares completos de uno o varios textos"""
+    tokenizer = WordTokenizer()
+    passes = []
+    pipeline = NLIZeroShotPipeline(tokenizer, keyword_forward(tokenizer, passes), entailment_id=2,
+                                   hypothesis_template="about {}", max_pairs=4)
+    outputs = pipeline([f"text {i} war" if i % 2 else f"text {i} love" for i in range(5)], ["love", "war"])
+    assert [shape[0] for shape in passes] == [4, 4, 2]
+    assert [output["labels"][0] for output in outputs] == ["love", "war", "love", "war", "love"]
+
+
+def test_optimized_backend_falls_back_to_pipeline(monkeypatch):
+    """Si el backend optimizado no se puede cargar se usa el pipeline de transformers"""
+    import classifier
+    import nli_backend
+
+    def missing(name, model_name, threads=0):
+        raise ImportError("No module named 'onnxruntime'")
+
+    monkeypatch.setattr(nli_backend, "load_backend", missing)
+    monkeypatch.setattr(classifier, "load_pipeline", lambda model: FakePipeline())
+    zero_shot = ZeroShotClassifier(backend="onnx")
+    assert zero_shot.classify_batch(["uno"])[0]["sequence"] == "uno"
+    assert zero_shot.active_backend == "pipeline" and "onnxruntime" in zero_shot.backend_error
@@ -0,0 +1,79 @@
+import asyncio
+
+import httpx
+
+import clients
+from clients import ClientRegistry, RetryTransport, retry_delay
+
+
+def make_client(statuses, retry_all_methods=False):
+    """Cliente con transporte simulado que responde con los códigos indicados, en orden"""
+    calls = []
+
+    def handler(request):
+        calls.append(request.method)
+        status = statuses[min(len(calls), len(statuses)) - 1]
+        return httpx.Response(status, json={"ok": status == 200})
+
+    transport = RetryTransport(httpx.MockTransport(handler), "test", retries=2, retry_all_methods=retry_all_methods)
+    return httpx.AsyncClient(transport=transport, base_url="http://upstream"), calls
+
+
+def test_retries_idempotent_requests(monkeypatch):
+    """Un GET que recibe 503 se repite hasta obtener respuesta"""
+    monkeypatch.setattr(clients, "retry_delay", lambda *args, **kwargs: 0)
+    http, calls = make_client([503, 503, 200])
+    response = asyncio.run(http.get("/items"))
+    assert response.status_code == 200 and calls == ["GET"] * 3
+
+
+def test_does_not_repeat_writes(monkeypatch):
+    """Un POST (p. ej. un insert) no se repite tras un 503, salvo que el servicio lo permita"""
+    monkeypatch.setattr(clients, "retry_delay", lambda *args, **kwargs: 0)
+    http, calls = make_client([503, 200])
+    assert asyncio.run(http.post("/items", json={})).status_code == 503 and len(calls) == 1
+    http, calls = make_client([429, 200], retry_all_methods=True)
+    assert asyncio.run(http.post("/embeddings", json={})).status_code == 200 and len(calls) == 2
+
+
+def test_gives_up_after_retries(monkeypatch):
+    """Tras agotar los reintentos se devuelve la última respuesta"""
+    monkeypatch.setattr(clients, "retry_delay", lambda *args, **kwargs: 0)
+    http, calls = make_client([502])
+    assert asyncio.run(http.get("/items")).status_code == 502 and len(calls) == 3
+
+
+def test_retry_delay_honors_retry_after():
+    """Se respeta Retry-After (acotado) y si no hay, el backoff crece con el intento"""
+    response = httpx.Response(429, headers={"Retry-After": "2"})
+    assert retry_delay(1, response, cap=8) == 2
+    assert retry_delay(1, httpx.Response(429, headers={"Retry-After": "120"}), cap=8) == 8
+    assert 0 <= retry_delay(3, base=0.5, cap=8) <= 2
+
+
+def test_registry_reuses_and_closes_clients():
+    """Un cliente por servicio, reutilizado hasta el cierre"""
+    async def scenario():
+        registry = ClientRegistry()
+        first = registry.http("wikipedia")
+        assert registry.http("wikipedia") is first
+        await registry.aclose()
+        assert first.is_closed and registry.http("wikipedia") is not first
+        await registry.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_supabase_client_uses_pooled_session():
+    """El cliente de PostgREST usa la conexión compartida, con las cabeceras de autenticación y de esquema"""
+    async def scenario():
+        registry = ClientRegistry()
+        db = registry.supabase("http://supabase.test", "clave")
+        session = registry.http("supabase")
+        assert db.session is session
+        assert session.headers["apikey"] == "clave"
+        assert session.headers["authorization"] == "Bearer clave"
+        assert session.headers["accept-profile"] == "public"
+        await registry.aclose()
+
+    asyncio.run(scenario())
@@ -0,0 +1,73 @@
+import asyncio
+from dedup import DedupIndex, book_keys, normalize_title
+from fakes import InMemoryPostgrest
+from migrations.backfill_book_keys import backfill
+
+
+def test_title_normalization():
+    """Títulos con acentos, mayúsculas o espacios distintos son el mismo libro"""
+    assert normalize_title("  Cien Años  de Soledad ") == normalize_title("cien anos de soledad")
+    assert book_keys({"title": "Cien años de soledad"}) == book_keys({"title": "CIEN AÑOS DE SOLEDAD"})
+    assert book_keys({"isbn": "978-84-376-0494-7"}) == ["isbn:9788437604947"]
+    assert book_keys({}) == []
+
+
+def test_check_finds_existing_without_reading_documents():
+    """La comprobación usa la tabla de claves, nunca la de documentos"""
+    db = InMemoryPostgrest({"book_keys": [{"key": key, "document_id": "doc-1"} for key in book_keys({"title": "Rayuela"})]})
+    index = DedupIndex(db)
+    assert asyncio.run(index.check({"title": "rayuela"})) == "doc-1"
+    assert asyncio.run(index.check({"title": "Ficciones"})) is None
+    assert all(table == "book_keys" for _, table in db.calls)
+
+
+def test_warm_index_skips_lookups_for_new_titles():
+    """Con el índice caliente, un título nuevo no necesita consultar la base de datos"""
+    db = InMemoryPostgrest({"book_keys": [{"key": f"title:{i:032d}", "document_id": str(i)} for i in range(25)]})
+    index = DedupIndex(db)
+    asyncio.run(index.warm(page_size=10))
+    assert len(index) == 25
+    calls = len(db.calls)
+    assert asyncio.run(index.check({"title": "Un libro nuevo"})) is None
+    assert len(db.calls) == calls
+
+
+def test_claim_is_exclusive():
+    """Solo un documento puede reservar una clave; las reservas parciales se liberan"""
+    db = InMemoryPostgrest({"book_keys": [{"key": "isbn:123", "document_id": "viejo"}]})
+    index = DedupIndex(db)
+    keys_a = book_keys({"title": "Pedro Páramo"})
+    keys_b = book_keys({"title": "Aura", "isbn": "123"})
+    claimed = asyncio.run(index.claim({"a": keys_a, "b": keys_b}))
+    assert claimed == {"a"}
+    assert {row["key"] for row in db.tables["book_keys"]} == {"isbn:123", keys_a[0]}
+
+
+def test_backfill_indexes_existing_documents():
+    """El backfill crea las claves y reporta duplicados ya existentes"""
+    documents = [{"id": f"{i:02d}", "content": "x", "metadata": {"title": title}}
+                 for i, title in enumerate(["Rayuela", "Ficciones", "rayuela", "Aura"])]
+    db = InMemoryPostgrest({"documents": documents, "book_keys": []})
+    stats = asyncio.run(backfill(db, page_size=2))
+    assert stats["documents"] == 4
+    assert stats["indexed"] == 3
+    assert stats["duplicates"] == [{"document_id": "02", "existing_document_id": "00"}]
+    # Repetir el backfill no crea claves nuevas ni falsos duplicados
+    again = asyncio.run(backfill(db, page_size=2))
+    assert again["indexed"] == 3
+    assert len(again["duplicates"]) == 1
+
+
+def test_backfill_skips_chunks_of_long_books():
+    """Los fragmentos 1..N copian los metadatos del libro y no son duplicados"""
+    chunks = [{"id": "00" if i == 0 else f"00-{i}", "content": "x",
+               "metadata": {"title": "Rayuela", "parent_id": "00", "chunk_index": i}} for i in range(3)]
+    # PostgREST devuelve metadata->>chunk_index como texto
+    chunks[2]["metadata"]["chunk_index"] = "2"
+    documents = chunks + [{"id": "01", "content": "x", "metadata": {"title": "rayuela"}}]
+    db = InMemoryPostgrest({"documents": documents, "book_keys": []})
+    stats = asyncio.run(backfill(db, page_size=2))
+    assert stats["documents"] == 2
+    assert stats["chunks"] == 2
+    assert stats["indexed"] == 1
+    assert stats["duplicates"] == [{"document_id": "01", "existing_document_id": "00"}]
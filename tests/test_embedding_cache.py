@@ -0,0 +1,153 @@
+import asyncio
+import time
+import numpy as np
+from embedding_cache import EmbeddingCache, CachedEmbeddings, LazyEmbeddings, cache_key
+
+
+class FakeEmbeddings:
+    """Modelo de embeddings falso que cuenta las llamadas a la API"""
+    model = "fake-embedding"
+
+    def __init__(self):
+        self.calls = 0
+
+    async def aembed_query(self, text):
+        self.calls += 1
+        return [float(len(text)), 1.0, 2.0]
+
+
+def test_key_normalizes_query():
+    """La clave ignora mayúsculas y espacios repetidos"""
+    assert cache_key("  Don   Quijote ", "m") == cache_key("don quijote", "m")
+    assert cache_key("don quijote", "m") != cache_key("don quijote", "otro-modelo")
+
+
+def test_repeated_query_hits_cache():
+    """Una consulta repetida no vuelve a llamar al modelo"""
+    fake = FakeEmbeddings()
+    cached = CachedEmbeddings(fake, EmbeddingCache(max_entries=10, ttl=0, path=None))
+    first = asyncio.run(cached.aembed_query("aventuras"))
+    second = asyncio.run(cached.aembed_query("Aventuras "))
+    assert fake.calls == 1
+    assert first == second
+    assert cached.cache.stats()["hits"] == 1
+    assert cached.cache.stats()["misses"] == 1
+
+
+def test_lru_eviction():
+    """Se descarta la entrada usada hace más tiempo"""
+    cache = EmbeddingCache(max_entries=2, ttl=0, path=None)
+    cache.put("a", [1.0])
+    cache.put("b", [2.0])
+    cache.get("a")
+    cache.put("c", [3.0])
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_are_float32():
+    """Las entradas se guardan como float32"""
+    cache = EmbeddingCache(max_entries=2, ttl=0, path=None)
+    cache.put("a", [0.1] * 3072)
+    assert cache.get("a").dtype == np.float32
+    assert cache.stats()["memory_bytes"] == 3072 * 4
+
+
+def test_ttl_expires_entries():
+    """Las entradas caducan pasado el TTL"""
+    cache = EmbeddingCache(max_entries=2, ttl=0.01, path=None)
+    cache.put("a", [1.0])
+    time.sleep(0.02)
+    assert cache.get("a") is None
+
+
+def test_sqlite_backend_survives_restart(tmp_path):
+    """El backend SQLite mantiene la caché entre reinicios"""
+    path = str(tmp_path / "embeddings.sqlite")
+    EmbeddingCache(max_entries=2, ttl=0, path=path).put("a", [1.0, 2.0])
+    restarted = EmbeddingCache(max_entries=2, ttl=0, path=path)
+    assert restarted.get("a").tolist() == [1.0, 2.0]
+    assert restarted.stats()["disk_hits"] == 1
+
+
+def test_lazy_embeddings_builds_client_on_first_use():
+    """El cliente de embeddings no se crea hasta la primera llamada"""
+    built = []
+
+    def factory():
+        built.append(1)
+        return FakeEmbeddings()
+
+    lazy = LazyEmbeddings(factory, model="fake-embedding")
+    cached = CachedEmbeddings(lazy, EmbeddingCache(max_entries=10, ttl=0, path=None))
+    assert not lazy.loaded and cached.model == "fake-embedding"
+    asyncio.run(cached.aembed_query("aventuras"))
+    asyncio.run(cached.aembed_query("misterio"))
+    assert lazy.loaded and built == [1]
+
+
+def test_content_store_reuses_document_embeddings(tmp_path):
+    """Un contenido ya ingerido (aunque cambien los espacios) no vuelve a pagar embeddings"""
+    from embedding_cache import ContentAddressedEmbeddings
+    from fakes import FakeEmbeddings as VectorEmbeddings
+
+    fake = VectorEmbeddings(dim=8)
+    path = str(tmp_path / "store.sqlite")
+    store = ContentAddressedEmbeddings(fake, EmbeddingCache(max_entries=10, ttl=0, path=path),
+                                       token_counter=lambda text: len(text.split()))
+    first = asyncio.run(store.aembed_documents(["una novela", "otra novela", "una  novela"]))
+    # El texto repetido dentro del lote se pide una sola vez
+    assert fake.calls == 1 and store.texts_embedded == 2
+    assert np.allclose(first[0], first[2])
+    assert store.tokens_saved == 2
+
+    # Nueva instancia sobre el mismo archivo: la re-subida no llama a la API
+    again = ContentAddressedEmbeddings(fake, EmbeddingCache(max_entries=10, ttl=0, path=path),
+                                       token_counter=lambda text: len(text.split()))
+    vector = asyncio.run(again.aembed_query("otra novela"))
+    assert fake.calls == 1
+    assert np.allclose(vector, first[1], atol=1e-6)
+    mixed = asyncio.run(again.aembed_documents(["otra novela", "un ensayo"]))
+    assert fake.calls == 2 and np.allclose(mixed[1], fake.vector("un ensayo"), atol=1e-6)
+    assert again.stats()["api_calls_saved"] == 1 and again.stats()["texts_reused"] == 2
+    # Con otras mayúsculas el texto enviado a la API es otro: no se reutiliza el vector
+    asyncio.run(again.aembed_documents(["Una Novela"]))
+    assert fake.calls == 3
+
+
+def test_batched_queries_share_one_call():
+    """Las consultas que faltan en la caché se piden en una sola llamada a aembed_documents"""
+    class BatchEmbeddings(FakeEmbeddings):
+        async def aembed_documents(self, texts):
+            self.calls += 1
+            return [[float(len(text)), 1.0, 2.0] for text in texts]
+
+    fake = BatchEmbeddings()
+    cached = CachedEmbeddings(fake, EmbeddingCache(max_entries=10, ttl=0, path=None))
+    asyncio.run(cached.aembed_query("alegría"))
+    vectors = asyncio.run(cached.aembed_queries(["miedo", "Alegría", "aventuras", "miedo"]))
+    assert fake.calls == 2
+    assert [vector[0] for vector in vectors] == [5.0, 7.0, 9.0, 5.0]
+    # Después todas están en caché
+    asyncio.run(cached.aembed_queries(["aventuras", "miedo"]))
+    assert fake.calls == 2
+
+
+def test_saved_tokens_are_counted_off_the_event_loop():
+    """Los tokens ahorrados se cuentan en el pool de CPU, no en el bucle de eventos"""
+    import threading
+    from embedding_cache import ContentAddressedEmbeddings
+    from fakes import FakeEmbeddings as VectorEmbeddings
+
+    threads = []
+
+    def counter(text):
+        threads.append(threading.current_thread().name)
+        return len(text.split())
+
+    store = ContentAddressedEmbeddings(VectorEmbeddings(dim=8), EmbeddingCache(max_entries=10, ttl=0, path=None),
+                                       token_counter=counter)
+    asyncio.run(store.aembed_documents(["una novela", "una novela"]))
+    assert store.tokens_saved == 2
+    assert threads and all(name.startswith("cpu") for name in threads)
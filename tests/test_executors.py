@@ -0,0 +1,28 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from executors import run_in_pool
+
+
+def test_blocking_calls_run_concurrently():
+    """Las llamadas bloqueantes en el pool no serializan el event loop"""
+    pool = ThreadPoolExecutor(max_workers=8)
+
+    async def run():
+        start = time.perf_counter()
+        await asyncio.gather(*(run_in_pool(pool, time.sleep, 0.1) for _ in range(8)))
+        return time.perf_counter() - start
+
+    assert asyncio.run(run()) < 0.4
+
+
+def test_pool_size_bounds_concurrency():
+    """El tamaño del pool limita cuántas llamadas corren a la vez"""
+    pool = ThreadPoolExecutor(max_workers=2)
+
+    async def run():
+        start = time.perf_counter()
+        await asyncio.gather(*(run_in_pool(pool, time.sleep, 0.05) for _ in range(4)))
+        return time.perf_counter() - start
+
+    assert asyncio.run(run()) >= 0.1
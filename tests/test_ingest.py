@@ -0,0 +1,111 @@
+import asyncio
+from dedup import DedupIndex, book_keys
+from fakes import InMemoryPostgrest
+from ingest import BulkIngester, token_batches, split_lines
+
+
+class FakeEmbeddings:
+    def __init__(self):
+        self.batches = []
+
+    async def aembed_documents(self, texts):
+        self.batches.append(len(texts))
+        return [[float(len(text))] for text in texts]
+
+
+def book(title, content="contenido"):
+    return {"content": content, "metadata": {"title": title}}
+
+
+def make_db(existing_titles=()):
+    documents = [{"id": f"doc-{i}", "content": "x", "metadata": {"title": t}} for i, t in enumerate(existing_titles)]
+    keys = [{"key": key, "document_id": doc["id"]} for doc in documents for key in book_keys(doc["metadata"])]
+    return InMemoryPostgrest({"documents": documents, "book_keys": keys})
+
+
+def test_token_batches_respect_limits():
+    """Los lotes no superan el límite de tokens ni de elementos"""
+    token_counts = [40, 40, 40, 10]
+    assert token_batches(token_counts, max_tokens=100, max_items=10) == [[0, 1], [2, 3]]
+    assert token_batches(token_counts, max_tokens=1000, max_items=3) == [[0, 1, 2], [3]]
+
+
+def test_ingest_dedupes_and_inserts_in_bulk():
+    """Se detectan duplicados con una consulta y se insertan los libros nuevos en bloque"""
+    db = make_db(["Don Quijote"])
+    fake_embeddings = FakeEmbeddings()
+    invalidations = []
+    ingester = BulkIngester(db, fake_embeddings, DedupIndex(db), on_inserted=lambda rows: invalidations.append([row["metadata"].get("title") for row in rows]), token_counter=len)
+    books = [book("Don Quijote"), book("La Celestina"), book("la  celestina"), book("Sin contenido", ""), {"metadata": {}}]
+
+    summary = asyncio.run(ingester.ingest(books))
+
+    assert summary["inserted"] == 2
+    assert fake_embeddings.batches == [1]
+    assert db.calls.count(("upsert", "documents")) == 1
+    assert not any(call == ("select", "documents") for call in db.calls)
+    results = summary["results"]
+    assert results[0]["existing_document_id"] == "doc-0"
+    assert results[1]["success"] is True
+    assert results[2]["duplicate_of_index"] == 1
+    assert results[3]["success"] is True
+    assert results[4]["success"] is False
+    assert invalidations == [["La Celestina", "Sin contenido"]]
+    assert len(db.tables["book_keys"]) == 3
+
+
+def test_ingest_stream_from_jsonl():
+    """El stream JSONL se procesa por ventanas y las líneas inválidas se reportan"""
+    db = make_db()
+    ingester = BulkIngester(db, FakeEmbeddings(), DedupIndex(db), token_counter=len)
+
+    async def chunks():
+        yield b'{"content": "uno", "metadata": {"title": "Uno"}}\n{"content": "dos", '
+        yield b'"metadata": {"title": "Dos"}}\nno es json\n'
+        yield b'{"content": "tres", "metadata": {"title": "Tres"}}'
+
+    summary = asyncio.run(ingester.ingest_stream(split_lines(chunks()), window=2))
+    assert summary["total"] == 4
+    assert summary["inserted"] == 3
+    assert [r["index"] for r in summary["results"]] == [0, 1, 2, 3]
+    assert summary["results"][2]["success"] is False
+    assert db.calls.count(("upsert", "documents")) == 2
+
+
+def test_long_books_go_through_chunks():
+    """Un libro que supera el límite del modelo se guarda por fragmentos y no hace fallar el lote"""
+    db = make_db()
+
+    class LimitedEmbeddings(FakeEmbeddings):
+        async def aembed_documents(self, texts):
+            if any(len(text) > 1000 for text in texts):
+                raise RuntimeError("maximum context length")
+            return await super().aembed_documents(texts)
+
+    embeddings = LimitedEmbeddings()
+    ingester = BulkIngester(db, embeddings, DedupIndex(db), token_counter=len, long_book_tokens=1000)
+    long_content = " ".join(f"palabra{i}" for i in range(1000))
+    summary = asyncio.run(ingester.ingest([book("Corto"), book("Largo", long_content)]))
+
+    assert summary["inserted"] == 2
+    long_result = summary["results"][1]
+    assert long_result["index"] == 1 and long_result["chunks"] > 1
+    chunks = [row for row in db.tables["documents"] if row["metadata"].get("parent_id") == long_result["document_id"]]
+    assert len(chunks) == long_result["chunks"]
+
+
+def test_token_counts_run_off_the_event_loop():
+    """Los tokens de los libros se cuentan en el pool de CPU antes de formar los lotes"""
+    import threading
+
+    threads = []
+
+    def counter(text):
+        threads.append(threading.current_thread().name)
+        return len(text)
+
+    db = make_db()
+    ingester = BulkIngester(db, FakeEmbeddings(), DedupIndex(db), token_counter=counter)
+    summary = asyncio.run(ingester.ingest([book("Uno"), book("Dos")]))
+    assert summary["inserted"] == 2
+    assert len(threads) == 2 and all(name.startswith("cpu") for name in threads)
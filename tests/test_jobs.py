@@ -0,0 +1,113 @@
+import asyncio
+
+from jobs import EnrichmentPipeline, JobStore, public_job
+
+
+class Services:
+    """Clasificador, subida y resumen falsos que registran cómo se llaman"""
+
+    def __init__(self):
+        self.ingest_batches = []
+
+    async def classify(self, payload):
+        return {"success": True, "category": "Fantasy", "category_score": 0.9, "dominant_sentiment": "joy"}
+
+    async def ingest(self, books):
+        self.ingest_batches.append(len(books))
+        return [{"success": False, "error": "El libro ya existe en la base de datos", "existing_document_id": "d-0"}
+                if book["metadata"]["title"] == "Repetido" else {"success": True, "document_id": f"d-{i}"}
+                for i, book in enumerate(books)]
+
+    async def summarize(self, title, description):
+        return {"error": "", "summary_text": f"Resumen de {title}"}
+
+
+def make_pipeline(store, services):
+    return EnrichmentPipeline(store, services.classify, services.ingest, services.summarize,
+                              batch_size=8, batch_wait_ms=20, workers=1)
+
+
+async def wait_finished(pipeline, job_ids, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while True:
+        jobs = [await pipeline.get(job_id) for job_id in job_ids]
+        if all(job["status"] in ("done", "failed") for job in jobs):
+            return jobs
+        assert asyncio.get_running_loop().time() < deadline, jobs
+        await asyncio.sleep(0.01)
+
+
+def test_jobs_are_batched_and_enriched(tmp_path):
+    """Los trabajos simultáneos comparten la subida y reciben las etiquetas del clasificador"""
+    services = Services()
+
+    async def scenario():
+        pipeline = make_pipeline(JobStore(str(tmp_path / "jobs.sqlite")), services)
+        await pipeline.start()
+        jobs = await pipeline.submit([
+            {"content": f"texto {i}", "metadata": {"title": f"Libro {i}"}, "summarize": i == 0} for i in range(5)
+        ])
+        finished = await wait_finished(pipeline, [job["id"] for job in jobs])
+        await pipeline.close()
+        return finished
+
+    finished = asyncio.run(scenario())
+    assert services.ingest_batches == [5]
+    assert all(job["status"] == "done" for job in finished)
+    first = public_job(finished[0])
+    assert first["result"]["metadata"]["category"] == "Fantasy"
+    assert first["result"]["summary"] == "Resumen de Libro 0" and "summarize" in first["timings"]
+    assert "summary" not in finished[1]["result"] and finished[1]["payload"]["content"] is None
+
+
+def test_duplicate_fails_the_job(tmp_path):
+    """Un libro repetido termina en failed con el documento existente"""
+    async def scenario():
+        pipeline = make_pipeline(JobStore(str(tmp_path / "jobs.sqlite")), Services())
+        await pipeline.start()
+        jobs = await pipeline.submit([{"content": "x", "metadata": {"title": "Repetido", "category": "History"}}])
+        finished = await wait_finished(pipeline, [jobs[0]["id"]])
+        await pipeline.close()
+        return finished[0]
+
+    job = asyncio.run(scenario())
+    assert job["status"] == "failed" and job["result"]["existing_document_id"] == "d-0"
+    # La categoría que ya traía el libro no se sustituye
+    assert job["payload"]["metadata"]["category"] == "History"
+
+
+def test_unfinished_jobs_resume_after_restart(tmp_path):
+    """Los trabajos guardados sin terminar se retoman al arrancar"""
+    path = str(tmp_path / "jobs.sqlite")
+    pending = JobStore(path).create_many([{"content": "texto", "metadata": {"title": "Pendiente"}}])
+
+    async def scenario():
+        pipeline = make_pipeline(JobStore(path), Services())
+        await pipeline.start()
+        finished = await wait_finished(pipeline, [pending[0]["id"]])
+        await pipeline.close()
+        return finished[0]
+
+    assert asyncio.run(scenario())["status"] == "done"
+
+
+def test_workers_only_adopt_orphaned_jobs(tmp_path):
+    """Con varios workers sobre el mismo archivo, un trabajo solo se retoma si su dueño dejó de latir"""
+    path = str(tmp_path / "jobs.sqlite")
+    store = JobStore(path)
+    store.heartbeat("vivo")
+    store.heartbeat("caido")
+    alive = store.create_many([{"content": "a", "metadata": {"title": "A"}}], owner="vivo")
+    orphan = store.create_many([{"content": "b", "metadata": {"title": "B"}}], owner="caido")
+
+    # Solo el latido de "vivo" es reciente
+    store._db.execute("UPDATE job_workers SET heartbeat = 0 WHERE owner = 'caido'")
+    store._db.commit()
+    claimed = JobStore(path).claim_orphans("nuevo", stale_before=1)
+    assert [job["id"] for job in claimed] == [orphan[0]["id"]]
+    # Ya es de "nuevo", que sigue sin latido propio, pero no se adopta dos veces a sí mismo
+    assert JobStore(path).claim_orphans("nuevo", stale_before=1) == []
+
+    store.release("vivo")
+    assert [job["id"] for job in JobStore(path).claim_orphans("otro", stale_before=1)] == \
+        [alive[0]["id"], orphan[0]["id"]]
@@ -0,0 +1,76 @@
+import asyncio
+
+from fakes import InMemoryPostgrest
+from lexical import BM25Index, load_from_postgrest, reciprocal_rank_fusion, snippet, tokenize
+
+ROWS = [
+    {"id": "1", "content": "Las aventuras de un hidalgo que enloquece leyendo libros de caballerías.",
+     "metadata": {"title": "El ingenioso hidalgo Don Quijote de la Mancha", "authors": "Miguel de Cervantes",
+                  "dominant_sentiment": "joy"}},
+    {"id": "2", "content": "Historia de la familia Buendía en Macondo a lo largo de siete generaciones.",
+     "metadata": {"title": "Cien años de soledad", "authors": "Gabriel García Márquez", "dominant_sentiment": "fear"}},
+    {"id": "3", "content": "Un ensayo sobre el Quijote y la novela moderna.",
+     "metadata": {"title": "Meditaciones del Quijote", "authors": "José Ortega y Gasset", "dominant_sentiment": "neutral"}},
+    {"id": "4", "content": "Novela policiaca ambientada en Barcelona.",
+     "metadata": {"title": "La verdad sobre el caso Savolta", "authors": "Eduardo Mendoza"}},
+]
+
+
+def make_index():
+    index = BM25Index()
+    index.add(ROWS)
+    return index
+
+
+def test_tokenize_strips_accents():
+    assert tokenize("García Márquez, 1967!") == ["garcia", "marquez", "1967"]
+
+
+def test_snippet_around_query_terms():
+    """El fragmento rodea el primer término de la consulta, con o sin acentos, sin partir palabras"""
+    content = " ".join(["relleno"] * 50) + " la canción del pirata " + " ".join(["final"] * 50)
+    text = snippet(content, "CANCION pirata", 60)
+    assert "canción del pirata" in text
+    assert text.startswith("…") and text.endswith("…")
+    assert len(text) <= 62 and "relleno final" not in text
+    assert all(word in ("relleno", "la", "canción", "del", "pirata", "final") for word in text.strip("…").split())
+    # Sin coincidencias: el principio del texto
+    assert snippet(content, "dragones", 30).startswith("relleno relleno")
+    assert snippet("corto", "dragones", 30) == "corto"
+
+
+def test_title_and_author_queries():
+    index = make_index()
+    assert {hit["id"] for hit in index.search("Quijote", k=2)} == {"1", "3"}
+    assert index.search("garcia marquez", k=1)[0]["id"] == "2"
+    assert index.search("cervantes", k=5)[0]["metadata"]["title"].startswith("El ingenioso")
+    assert index.search("palabrainexistente", k=5) == []
+
+
+def test_filters_are_applied_before_scoring():
+    index = make_index()
+    assert [hit["id"] for hit in index.search("Quijote", k=5, filters={"dominant_sentiment": "neutral"})] == ["3"]
+    assert index.search("Quijote", k=5, filters={"author": "mendoza"}) == []
+
+
+def test_reindex_and_remove():
+    index = make_index()
+    index.add([{**ROWS[3], "content": "Una novela sobre el Quijote en Barcelona."}])
+    assert "4" in {hit["id"] for hit in index.search("quijote", k=5)}
+    index.remove(["4"])
+    assert "4" not in {hit["id"] for hit in index.search("quijote barcelona", k=5)}
+    assert len(index) == 3
+
+
+def test_reciprocal_rank_fusion():
+    vector = [{"id": "a"}, {"id": "b"}, {"id": "c"}]
+    lexical = [{"id": "c"}, {"id": "a"}]
+    fused = reciprocal_rank_fusion([vector, lexical], k=60)
+    assert [hit["id"] for hit in fused] == ["a", "c", "b"]
+    assert fused[0]["rrf_score"] > fused[1]["rrf_score"]
+
+
+def test_load_from_postgrest():
+    index = BM25Index()
+    asyncio.run(load_from_postgrest(InMemoryPostgrest({"documents": ROWS}), index, page_size=3))
+    assert index.ready and len(index) == 4
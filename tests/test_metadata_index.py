@@ -0,0 +1,60 @@
+from metadata_index import MetadataIndex, index_fields, matches
+
+BOOKS = {
+    "a": {"title": "Don Quijote", "authors": "Miguel de Cervantes", "categories": "Fiction;Classics",
+          "published_year": 1605, "dominant_sentiment": "joy"},
+    "b": {"title": "Novelas ejemplares", "authors": "Miguel de Cervantes", "categories": "Fiction",
+          "published_year": "1613", "dominant_sentiment": "fear"},
+    "c": {"title": "Cien años de soledad", "authors": "Gabriel García Márquez", "category": "Fiction",
+          "published_year": 1967, "dominant_sentiment": "joy"},
+    "d": {"title": "Sin metadatos"},
+}
+
+
+def make_index():
+    index = MetadataIndex()
+    index.add_many(BOOKS.items())
+    return index
+
+
+def test_fields_are_normalized():
+    fields = index_fields(BOOKS["c"])
+    assert fields["authors"] == {"gabriel garcia marquez"}
+    assert fields["categories"] == {"fiction"}
+    assert index_fields(BOOKS["b"])["year"] == 1613
+
+
+def test_select_intersects_filters():
+    index = make_index()
+    assert index.select({}) is None
+    assert index.select({"author": "Cervantes"}) == {"a", "b"}
+    assert index.select({"author": "márquez", "dominant_sentiment": "joy"}) == {"c"}
+    assert index.select({"category": "classics"}) == {"a"}
+    assert index.select({"year_from": 1600, "year_to": 1700}) == {"a", "b"}
+    assert index.select({"year_from": 1900, "category": "Fiction"}) == {"c"}
+    assert index.select({"dominant_sentiment": "neutral"}) == set()
+
+
+def test_select_agrees_with_matches():
+    index = make_index()
+    for filters in ({"author": "miguel cervantes"}, {"year_to": 1610}, {"category": "fiction", "dominant_sentiment": "fear"}):
+        assert index.select(filters) == {key for key, metadata in BOOKS.items() if matches(metadata, filters)}
+
+
+def test_update_and_remove():
+    index = make_index()
+    index.add("a", {**BOOKS["a"], "dominant_sentiment": "fear"})
+    assert index.select({"dominant_sentiment": "fear"}) == {"a", "b"}
+    index.remove("a")
+    index.remove("b")
+    assert index.select({"year_to": 1700}) == set()
+    assert index.stats()["years"] == 1
+
+
+def test_unknown_filter():
+    try:
+        make_index().select({"isbn": "123"})
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("expected ValueError")
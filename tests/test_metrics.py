@@ -0,0 +1,63 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from metrics import MetricsMiddleware, Registry, http_request_seconds, server_timing_header, stage, stage_errors, stage_seconds
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    histogram = registry.histogram("latency_seconds", "Latencia", ("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value, stage="llm")
+    text = registry.render()
+    assert 'latency_seconds_bucket{stage="llm",le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{stage="llm",le="1.0"} 2' in text
+    assert 'latency_seconds_bucket{stage="llm",le="+Inf"} 3' in text
+    assert 'latency_seconds_count{stage="llm"} 3' in text
+
+
+def test_collectors_and_label_escaping():
+    registry = Registry()
+    registry.counter("events_total", "Eventos", ("event",)).inc(event='a "b"')
+    registry.register_collector(lambda: [("cache_hits_total", "counter", "Aciertos", {"cache": "wiki"}, 3)])
+    text = registry.render()
+    assert 'events_total{event="a \\"b\\""} 1.0' in text
+    assert 'cache_hits_total{cache="wiki"} 3.0' in text
+
+
+def test_stage_records_errors():
+    before = stage_errors.value(stage="prueba_error")
+    with pytest.raises(RuntimeError):
+        with stage("prueba_error"):
+            raise RuntimeError()
+    assert stage_errors.value(stage="prueba_error") == before + 1
+    assert stage_seconds.count(stage="prueba_error") >= 1
+
+
+def test_server_timing_header_sums_repeated_stages():
+    assert server_timing_header([("db", 0.001), ("db", 0.002), ("llm", 0.5)]) == "db;dur=3.00, llm;dur=500.00"
+
+
+def test_middleware_adds_server_timing():
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/lento")
+    async def slow():
+        with stage("embedding"):
+            await asyncio.sleep(0.01)
+        return {"ok": True}
+
+    async def call():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get("/lento")
+
+    response = asyncio.run(call())
+    assert response.status_code == 200
+    assert response.headers["server-timing"].startswith("embedding;dur=")
+    assert "total;dur=" in response.headers["server-timing"]
+    assert http_request_seconds.count(method="GET", route="/lento", status=200) == 1
@@ -0,0 +1,68 @@
+import asyncio
+
+import pytest
+
+from classifier import ZeroShotClassifier
+from fakes import FakeSentimentAnalyzer, FakeZeroShotPipeline
+from model_server import InferenceClient, InferenceError, InferenceServer, remote_models
+from sentiment import SentimentAnalyzer
+
+
+def make_server(path):
+    pipeline = FakeZeroShotPipeline()
+    server = InferenceServer(path, ZeroShotClassifier(loader=lambda: pipeline),
+                             SentimentAnalyzer(loader=FakeSentimentAnalyzer))
+    return server, pipeline
+
+
+def test_workers_share_models_and_batches(tmp_path):
+    """Dos workers usan los modelos del servidor y sus clasificaciones entran en el mismo lote"""
+    path = str(tmp_path / "inference.sock")
+    server, pipeline = make_server(path)
+
+    async def scenario():
+        await server.start()
+        workers = [InferenceClient(path), InferenceClient(path)]
+        status = await workers[0].wait_ready()
+        classifier, _, _ = remote_models(workers[0])
+        batchers = [remote_models(client)[1] for client in workers]
+        results = await asyncio.gather(*(batchers[i % 2].submit(f"una historia de Fantasy {i}") for i in range(6)))
+        _, _, sentiment = remote_models(workers[1])
+        scores = await sentiment.analyze("un dia feliz y bueno", mode="sample")
+        with pytest.raises(InferenceError):
+            await workers[1].call("translate", text="hola")
+        for client in workers:
+            await client.aclose()
+        await server.close()
+        return status, classifier.loaded, results, scores
+
+    status, loaded, results, scores = asyncio.run(scenario())
+    assert status["classifier"] and status["sentiment"] and loaded
+    assert [result["labels"][0] for result in results] == ["Fantasy"] * 6
+    assert [result["sequence"] for result in results] == [f"una historia de Fantasy {i}" for i in range(6)]
+    # Un solo forward pass para las peticiones de los dos workers
+    assert pipeline.calls == 1
+    assert scores["label"] == "joy"
+    assert not (tmp_path / "inference.sock").exists()
+
+
+def test_client_reconnects_after_server_restart(tmp_path):
+    """Las llamadas en curso fallan si el servidor se cae y la siguiente vuelve a conectar"""
+    path = str(tmp_path / "inference.sock")
+
+    async def scenario():
+        server, _ = make_server(path)
+        await server.start()
+        client = InferenceClient(path)
+        await client.call("status")
+        await server.close()
+        with pytest.raises((ConnectionError, FileNotFoundError)):
+            await client.call("status")
+        server, _ = make_server(path)
+        await server.start()
+        status = await client.wait_ready(timeout=2)
+        await client.aclose()
+        await server.close()
+        return status
+
+    assert asyncio.run(scenario())["classifier"]
@@ -0,0 +1,138 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from fakes import InMemoryPostgrest
+from migrations.compact_embeddings import compact
+from quantization import BinaryCodec, Int8Codec, compact_columns, get_codec, truncate
+from vector_store import LocalVectorIndex, PostgrestVectorStore, postgrest_functions
+
+DIM = 64
+
+
+def make_rows(n, dim=DIM, seed=0):
+    rng = np.random.default_rng(seed)
+    return [{"id": f"doc-{i:04d}", "content": f"libro {i}", "metadata": {"dominant_sentiment": ["joy", "fear"][i % 2]},
+             "embedding": rng.normal(size=dim).tolist()} for i in range(n)]
+
+
+def test_truncate_renormalizes():
+    """Las dimensiones truncadas se renormalizan y compact_columns no añade nada si está desactivado"""
+    vector = np.arange(1, 9, dtype=np.float32)
+    short = truncate(vector, 4)
+    assert short.shape == (4,)
+    assert np.isclose(np.linalg.norm(short), 1.0)
+    assert compact_columns(vector.tolist(), dim=0) == {}
+    assert np.allclose(compact_columns(vector.tolist(), dim=4)["embedding_compact"], short)
+
+
+def test_codecs_approximate_cosine():
+    """int8 aproxima el producto escalar y binary cuenta los signos distintos con popcount"""
+    vectors = truncate(np.random.default_rng(0).normal(size=(100, DIM)), DIM)
+    query = vectors[0]
+    codes, scales = Int8Codec(DIM).encode(vectors)
+    assert codes.dtype == np.int8
+    assert np.allclose(Int8Codec(DIM).scores(codes, scales, query), vectors @ query, atol=0.02)
+
+    codec = BinaryCodec(DIM)
+    codes, scales = codec.encode(vectors)
+    assert codes.shape == (100, DIM // 8)
+    hamming = ((vectors > 0) != (query > 0)).sum(axis=1)
+    assert np.allclose(codec.scores(codes, scales, query), 1 - 2 * hamming / DIM)
+    with pytest.raises(ValueError):
+        get_codec("int4", DIM)
+
+
+@pytest.mark.parametrize("quantization, min_recall", [("int8", 0.95), ("binary", 0.7)])
+def test_quantized_search_rescores_with_float_vectors(quantization, min_recall):
+    """La preselección con códigos y la repuntuación en float32 recuperan casi todo el ranking exacto"""
+    rows = make_rows(500)
+    exact = LocalVectorIndex(dim=DIM, quantization="none")
+    exact.add(rows)
+    quantized = LocalVectorIndex(dim=DIM, capacity=8, quantization=quantization, rescore_factor=10)
+    quantized.add(rows)
+    rng = np.random.default_rng(1)
+    recall = []
+    for position in range(0, 500, 25):
+        # Consultas cercanas a un documento, como las búsquedas reales
+        query = np.asarray(rows[position]["embedding"]) + 0.5 * rng.normal(size=DIM)
+        expected = exact.search_sync(query, k=10)
+        hits = quantized.search_sync(query, k=10)
+        assert hits[0]["id"] == rows[position]["id"]
+        recall.append(len({hit["id"] for hit in hits} & {hit["id"] for hit in expected}) / 10)
+        # Las similitudes devueltas son las exactas, no las aproximadas
+        by_id = {hit["id"]: hit["similarity"] for hit in expected}
+        assert all(np.isclose(hit["similarity"], by_id[hit["id"]], atol=1e-5) for hit in hits if hit["id"] in by_id)
+    # Vectores aleatorios: los vecinos 2..10 están casi empatados, con embeddings reales el recall es mayor
+    assert np.mean(recall) >= min_recall
+    filtered = quantized.search_sync(rng.normal(size=DIM), k=5, filters={"dominant_sentiment": "fear"})
+    assert len(filtered) == 5 and all(hit["metadata"]["dominant_sentiment"] == "fear" for hit in filtered)
+
+
+def test_index_truncates_long_embeddings():
+    """Un índice de dimensión reducida acepta embeddings y consultas completos"""
+    rows = make_rows(50)
+    index = LocalVectorIndex(dim=16, quantization="none")
+    index.add(rows)
+    query = np.asarray(rows[7]["embedding"])
+    assert index.search_sync(query, k=1)[0]["id"] == "doc-0007"
+    assert index.stats()["bytes_per_vector"] == 16 * 4
+
+
+def test_save_and_load_codes(tmp_path):
+    """Los códigos se guardan junto a los vectores; cargar con otra cuantización los recalcula"""
+    index = LocalVectorIndex(dim=DIM, quantization="binary")
+    index.add(make_rows(40))
+    path = str(tmp_path / "vectors")
+    index.save(path)
+    assert (tmp_path / "vectors.codes.npy").exists()
+
+    query = np.random.default_rng(2).normal(size=DIM)
+    loaded = LocalVectorIndex.load(path)
+    assert loaded.codec.name == "binary" and loaded.stats()["memory_mapped"]
+    assert [hit["id"] for hit in loaded.search_sync(query, k=5)] == [hit["id"] for hit in index.search_sync(query, k=5)]
+    reencoded = LocalVectorIndex.load(path, quantization="int8")
+    assert reencoded.codec.name == "int8" and reencoded._codes.dtype == np.int8
+    reencoded.add(make_rows(1, seed=3))
+    assert len(reencoded) == 40
+
+
+def test_postgrest_store_uses_compact_functions():
+    """Con VECTOR_COMPACT_DIM la RPC compara la columna halfvec con la consulta truncada"""
+    rows = make_rows(100)
+    for row in rows:
+        row.update(compact_columns(row["embedding"], dim=16))
+    db = InMemoryPostgrest({"documents": rows})
+    query = rows[3]["embedding"]
+
+    store = PostgrestVectorStore(db, compact_dim=16)
+    hits = asyncio.run(store.search(query, k=3))
+    assert db.calls[-1] == ("rpc", "match_documents_compact")
+    assert hits[0]["id"] == "doc-0003" and np.isclose(hits[0]["similarity"], 1.0, atol=1e-5)
+
+    binary = PostgrestVectorStore(db, quantization="binary", rescore_factor=10)
+    hits = asyncio.run(binary.search(query, k=3))
+    assert db.calls[-1] == ("rpc", "match_documents_binary")
+    assert hits[0]["id"] == "doc-0003"
+
+
+def test_int8_does_not_change_postgrest_functions():
+    """pgvector no tiene int8: con PostgREST se usan las mismas RPC que sin cuantización"""
+    assert postgrest_functions(0, "int8") == postgrest_functions(0, "none") == ("match_documents", "match_documents_by_ids")
+    assert postgrest_functions(16, "int8") == ("match_documents_compact", "match_documents_compact_by_ids")
+
+
+def test_migration_fills_compact_column():
+    """La migración recalcula embedding_compact por páginas; --dry-run no escribe"""
+    rows = make_rows(30) + [{"id": "doc-9999", "content": "sin embedding", "metadata": {}, "embedding": None}]
+    db = InMemoryPostgrest({"documents": rows})
+
+    stats = asyncio.run(compact(db, dim=8, page_size=7, dry_run=True))
+    assert stats["updated"] == 30 and stats["without_embedding"] == 1
+    assert all("embedding_compact" not in row for row in db.tables["documents"])
+
+    stats = asyncio.run(compact(db, dim=8, page_size=7))
+    assert stats["updated"] == 30 and stats["compact_bytes"] == 30 * 8 * 2
+    stored = {row["id"]: row for row in db.tables["documents"]}
+    assert np.allclose(stored["doc-0004"]["embedding_compact"], truncate(rows[4]["embedding"], 8))
@@ -0,0 +1,78 @@
+import asyncio
+import json
+from decimal import Decimal
+
+import httpx
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+
+from responses import CompressionMiddleware, FastJSONResponse, accepted_encoding
+
+BOOKS = [{"title": f"Libro {i}", "content": "había una vez un dragón " * 20} for i in range(20)]
+
+
+def make_app():
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=500)
+
+    @app.get("/libros")
+    async def books():
+        return FastJSONResponse({"results": BOOKS})
+
+    @app.get("/corto")
+    async def short():
+        return {"ok": True}
+
+    @app.get("/eventos")
+    async def events():
+        async def stream():
+            for book in BOOKS:
+                yield f"data: {json.dumps(book)}\n\n"
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    return app
+
+
+def request(app, path, accept_encoding):
+    async def call():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            response = await client.get(path, headers={"accept-encoding": accept_encoding})
+            return response, response.num_bytes_downloaded
+
+    return asyncio.run(call())
+
+
+def test_accepted_encoding():
+    assert accepted_encoding("gzip, deflate") == "gzip"
+    assert accepted_encoding("gzip;q=0, deflate") is None
+    assert accepted_encoding("*") in ("br", "gzip")
+    assert accepted_encoding("") is None
+
+
+def test_compresses_large_json_only():
+    """Solo se comprimen las respuestas completas por encima del mínimo; los streams pasan tal cual"""
+    app = make_app()
+    response, wire_bytes = request(app, "/libros", "gzip")
+    assert response.headers["content-encoding"] == "gzip"
+    assert "accept-encoding" in response.headers["vary"].lower()
+    assert response.json() == {"results": BOOKS}
+    assert wire_bytes < len(response.content) / 5
+
+    response, _ = request(app, "/libros", "identity")
+    assert "content-encoding" not in response.headers
+    assert response.json() == {"results": BOOKS}
+
+    response, _ = request(app, "/corto", "gzip")
+    assert "content-encoding" not in response.headers
+
+    response, _ = request(app, "/eventos", "gzip")
+    assert "content-encoding" not in response.headers
+    assert response.text.count("data: ") == len(BOOKS)
+
+
+def test_fast_json_matches_json_response():
+    payload = {"results": BOOKS, "next_cursor": None, "total": 20, "año": "ñ"}
+    assert json.loads(FastJSONResponse(payload).body) == payload
+    # Tipos que orjson no serializa pasan por jsonable_encoder
+    assert json.loads(FastJSONResponse({"precio": Decimal("9.95")}).body) == {"precio": 9.95}
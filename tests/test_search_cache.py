@@ -0,0 +1,60 @@
+import pytest
+from search_cache import SEARCH_MAX_RESULTS, SearchResultCache, ResultSet, decode_cursor, encode_cursor, first_depth
+
+HITS = [{"id": str(i), "content": f"libro {i}", "metadata": {"title": f"Libro {i}"}} for i in range(50)]
+
+
+def test_pages_served_from_cache():
+    """Las páginas siguientes de la misma consulta salen de la caché"""
+    cache = SearchResultCache(max_entries=4, ttl=0)
+    filters = {"dominant_sentiment": "joy"}
+    assert cache.get("aventuras", filters) is None
+    cache.put("aventuras", filters, HITS, depth=50)
+    result_set = cache.get(" Aventuras", filters)
+    assert result_set.hits[20:30] == HITS[20:30]
+    assert cache.stats()["hits"] == 1
+
+
+def test_filters_are_part_of_key():
+    """Un filtro distinto es otra entrada de la caché"""
+    cache = SearchResultCache(max_entries=4, ttl=0)
+    cache.put("aventuras", {"dominant_sentiment": "joy"}, HITS, depth=50)
+    assert cache.get("aventuras", {"dominant_sentiment": "fear"}) is None
+    assert cache.get("aventuras", {"dominant_sentiment": None}) is None
+
+
+def test_invalidate_clears_entries():
+    """Subir un libro invalida los resultados guardados"""
+    cache = SearchResultCache(max_entries=4, ttl=0)
+    cache.put("aventuras", {}, HITS, depth=50)
+    cache.invalidate()
+    assert cache.get("aventuras", {}) is None
+
+
+def test_result_set_depth():
+    """Solo se vuelve a buscar si la página pide más de lo guardado y puede haber más"""
+    full = ResultSet(hits=HITS, depth=50)
+    assert full.can_serve(50)
+    assert not full.can_serve(60)
+    assert full.next_depth(60) == 100
+    short = ResultSet(hits=HITS[:10], depth=50)
+    assert short.exhausted
+    assert short.can_serve(60)
+
+
+def test_first_depth_is_capped():
+    """Un offset o limit enorme no se traduce en un k sin límite para el vector store"""
+    assert first_depth(10) == 50
+    assert first_depth(120) == 120
+    assert first_depth(10 ** 6) == SEARCH_MAX_RESULTS
+    assert ResultSet(hits=HITS, depth=first_depth(10 ** 6)).can_serve(10 ** 6)
+
+
+def test_cursor_roundtrip():
+    """El cursor guarda el offset y solo vale para su consulta"""
+    cursor = encode_cursor("aventuras", {"dominant_sentiment": "joy"}, 60)
+    assert decode_cursor(cursor, "aventuras", {"dominant_sentiment": "joy"}) == 60
+    with pytest.raises(ValueError):
+        decode_cursor(cursor, "misterio", {"dominant_sentiment": "joy"})
+    with pytest.raises(ValueError):
+        decode_cursor("no-es-un-cursor", "aventuras", {})
@@ -0,0 +1,79 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import sentiment
+from sentiment import SentimentAnalyzer, sentiment_label, split_sentences
+
+
+class WordAnalyzer:
+    """Analizador mínimo con la interfaz de VADER: cuenta palabras positivas y negativas"""
+
+    loads = 0
+
+    def __init__(self):
+        WordAnalyzer.loads += 1
+
+    def polarity_scores(self, text):
+        words = text.lower().split()
+        score = sum(w.strip(".!?") == "good" for w in words) - sum(w.strip(".!?") == "bad" for w in words)
+        return {"compound": max(-1.0, min(1.0, score / 2))}
+
+
+def test_analyzer_is_loaded_once():
+    WordAnalyzer.loads = 0
+    analyzer = SentimentAnalyzer(loader=WordAnalyzer)
+    for _ in range(3):
+        analyzer.polarity("good day")
+    assert WordAnalyzer.loads == 1
+
+
+def test_split_sentences():
+    assert split_sentences("Hola. ¿Qué tal?  Bien!\n\nFin") == ["Hola.", "¿Qué tal?", "Bien!", "Fin"]
+
+
+def test_sentence_mode_covers_whole_text():
+    text = "A good start. " * 10 + "x" * 5000 + ". " + "Bad bad end. " * 400
+    analyzer = SentimentAnalyzer(loader=WordAnalyzer)
+    sample = asyncio.run(analyzer.analyze(text, mode="sample"))
+    whole = asyncio.run(analyzer.analyze(text, mode="sentences"))
+    assert sample["label"] == "joy"
+    assert whole["label"] == "fear"
+    assert whole["sentences"] == 411
+
+
+def test_parallel_scoring_matches_sequential(monkeypatch):
+    monkeypatch.setattr(sentiment, "SENTIMENT_PROCESS_THRESHOLD", 100)
+    monkeypatch.setattr(sentiment, "SENTIMENT_CHUNK_SENTENCES", 7)
+    text = " ".join(["Good book.", "Bad ending!", "Plain sentence.", "Good good."] * 25)
+    analyzer = SentimentAnalyzer(loader=WordAnalyzer)
+    with ThreadPoolExecutor(4) as executor:
+        parallel = asyncio.run(analyzer.analyze(text, executor=executor))
+    assert parallel == analyzer.polarity_sentences(text)
+
+
+def test_unknown_mode():
+    analyzer = SentimentAnalyzer(loader=WordAnalyzer)
+    try:
+        asyncio.run(analyzer.analyze("texto", mode="otro"))
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("expected ValueError")
+
+
+def test_labels():
+    assert sentiment_label(0.5) == "joy"
+    assert sentiment_label(-0.5) == "fear"
+    assert sentiment_label(0.0) == "neutral"
+
+
+def test_default_mode_scores_sentences():
+    """El modo por defecto es "sentences": media ponderada por longitud, no la puntuación del principio del texto"""
+    assert sentiment.SENTIMENT_MODE == "sentences"
+    analyzer = SentimentAnalyzer(loader=WordAnalyzer)
+    text = "A good start. Bad bad end. Plain."
+    assert asyncio.run(analyzer.analyze(text)) == {
+        "compound": -0.1774, "label": "fear", "sentences": 3, "positive_ratio": 0.3333, "negative_ratio": 0.3333,
+    }
+    # El modo anterior puntuaba el texto de una vez
+    assert asyncio.run(analyzer.analyze(text, mode="sample")) == {"compound": -0.5, "label": "fear"}
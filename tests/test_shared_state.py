@@ -0,0 +1,133 @@
+import asyncio
+import os
+
+import pytest
+
+import serve
+from metrics import Registry
+from shared_state import SharedState, SharedStateStore
+
+
+def test_workers_apply_each_others_documents(tmp_path):
+    """Cada worker aplica los documentos insertados por los demás, no los suyos"""
+    path = str(tmp_path / "shared.sqlite")
+    applied = {"a": [], "b": []}
+
+    async def scenario():
+        async def apply_a(ids):
+            applied["a"].extend(ids)
+
+        async def apply_b(ids):
+            applied["b"].extend(ids)
+
+        worker_a = SharedState(SharedStateStore(path), apply_a, worker="a")
+        worker_b = SharedState(SharedStateStore(path), apply_b, worker="b")
+        await worker_a.start()
+        await worker_b.start()
+        worker_a.publish(["1", "2"]).result()
+        worker_b.publish(["3"]).result()
+        worker_a.publish(["2"]).result()
+        await worker_a.poll()
+        await worker_b.poll()
+        # Sin cambios nuevos no se vuelve a aplicar nada
+        await worker_b.poll()
+        await worker_a.close()
+        await worker_b.close()
+
+    asyncio.run(scenario())
+    assert applied == {"a": ["3"], "b": ["1", "2"]}
+
+
+def test_late_worker_skips_existing_changes(tmp_path):
+    """Un worker que arranca después ya carga esos documentos con sus índices completos"""
+    path = str(tmp_path / "shared.sqlite")
+    store = SharedStateStore(path)
+    store.publish_changes("a", ["1"])
+    applied = []
+
+    async def scenario():
+        async def apply(ids):
+            applied.extend(ids)
+
+        worker = SharedState(SharedStateStore(path), apply, worker="b")
+        await worker.start()
+        store.publish_changes("a", ["2"])
+        await worker.poll()
+        await worker.close()
+
+    asyncio.run(scenario())
+    assert applied == ["2"]
+
+
+def test_metrics_of_all_workers(tmp_path, monkeypatch):
+    """/metrics en cualquier worker incluye las muestras de todos, con la etiqueta worker"""
+    store = SharedStateStore(str(tmp_path / "shared.sqlite"))
+    other = Registry()
+    other.counter("events_total", "Eventos", ("event",)).inc(3, event="subida")
+    store.publish_metrics("otro", other.families())
+
+    local = Registry()
+    local.counter("events_total", "Eventos", ("event",)).inc(event="subida")
+    monkeypatch.setattr("shared_state.registry", local)
+
+    async def noop(ids):
+        pass
+
+    text = asyncio.run(SharedState(store, noop, worker="este").render_metrics())
+    assert text.count("# TYPE events_total counter") == 1
+    assert 'events_total{event="subida",worker="otro"} 3.0' in text
+    assert 'events_total{event="subida",worker="este"} 1.0' in text
+
+
+def test_serve_refuses_per_process_indexes_without_shared_state(monkeypatch):
+    """Varios workers con índices por proceso y sin estado compartido: serve.py no arranca"""
+    monkeypatch.setenv("SHARED_STATE_PATH", "")
+    monkeypatch.setenv("LEXICAL_SEARCH", "true")
+    with pytest.raises(SystemExit):
+        serve.check_shared_state(4)
+    serve.check_shared_state(1)
+    monkeypatch.setenv("LEXICAL_SEARCH", "false")
+    monkeypatch.setenv("VECTOR_STORE", "supabase")
+    serve.check_shared_state(4)
+    # El índice léxico es opcional: sin LEXICAL_SEARCH no hay índices por proceso
+    monkeypatch.delenv("LEXICAL_SEARCH")
+    serve.check_shared_state(4)
+
+
+def test_metric_collectors_run_off_the_event_loop(tmp_path, monkeypatch):
+    """Los colectores (que consultan SQLite) se ejecutan en el pool de E/S al publicar las métricas"""
+    import threading
+
+    import shared_state
+
+    threads = []
+    local_registry = Registry()
+
+    def collector():
+        threads.append(threading.current_thread().name)
+        return [("job_queue_depth", "gauge", "Trabajos", {"stage": "classify"}, 0)]
+
+    local_registry.register_collector(collector)
+    monkeypatch.setattr(shared_state, "registry", local_registry)
+    state = SharedState(SharedStateStore(str(tmp_path / "shared.sqlite")), None, worker="w1")
+    asyncio.run(state.publish_metrics())
+    assert threads and all(name.startswith("io") for name in threads)
+
+
+def test_serve_keeps_shared_files_out_of_the_working_directory(monkeypatch, tmp_path):
+    """Sin DATA_DIR los archivos compartidos van a un directorio temporal de la ejecución"""
+    for variable in ("DATA_DIR", "EMBEDDING_CACHE_PATH", "SHARED_STATE_PATH", "JOB_STORE_PATH", "INFERENCE_SOCKET"):
+        monkeypatch.delenv(variable, raising=False)
+    assert serve.shared_environment(1) is None
+    run_dir = serve.shared_environment(4)
+    try:
+        for variable in ("EMBEDDING_CACHE_PATH", "SHARED_STATE_PATH", "JOB_STORE_PATH"):
+            assert os.path.dirname(os.environ[variable]) == run_dir
+    finally:
+        os.rmdir(run_dir)
+
+    for variable in ("EMBEDDING_CACHE_PATH", "SHARED_STATE_PATH", "JOB_STORE_PATH"):
+        monkeypatch.delenv(variable)
+    monkeypatch.setenv("DATA_DIR", str(tmp_path))
+    assert serve.shared_environment(4) is None
+    assert os.environ["JOB_STORE_PATH"] == str(tmp_path / "jobs.sqlite")
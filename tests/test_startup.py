@@ -0,0 +1,55 @@
+import asyncio
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from startup import StartupTracker, warmup_targets
+
+
+def test_warmup_targets():
+    """WARMUP es una lista separada por comas y PRELOAD_CLASSIFIER añade el clasificador"""
+    assert warmup_targets("sentiment, embeddings", preload_classifier=False) == ["sentiment", "embeddings"]
+    assert warmup_targets("", preload_classifier=True) == ["classifier"]
+    assert warmup_targets("classifier", preload_classifier=True) == ["classifier"]
+
+
+def test_tracker_reports_each_task():
+    """El estado pasa de loading a ready o failed sin propagar los errores"""
+    async def scenario():
+        tracker = StartupTracker()
+        gate = asyncio.Event()
+
+        async def slow():
+            await gate.wait()
+
+        async def broken():
+            raise RuntimeError("sin conexión")
+
+        tracker.run("index", slow())
+        tracker.run("broken", broken())
+        tracker.warm("model", lambda: "cargado")
+        await asyncio.sleep(0.05)
+        before = tracker.status()
+        assert not tracker.done and before["index"]["state"] == "loading"
+        gate.set()
+        await asyncio.sleep(0.01)
+        after = tracker.status()
+        await tracker.cancel()
+        return tracker, before, after
+
+    tracker, before, after = asyncio.run(scenario())
+    assert before["broken"]["state"] == "failed" and before["broken"]["error"] == "sin conexión"
+    assert before["warmup_model"]["state"] == "ready"
+    assert after["index"]["state"] == "ready"
+
+
+def test_importing_main_skips_heavy_dependencies():
+    """Importar la app no carga el SDK de OpenAI, transformers, llama_index ni NLTK"""
+    probe = ("import sys, main; print(','.join(name for name in ('transformers', 'llama_index', "
+             "'langchain_openai', 'openai', 'huggingface_hub', 'nltk', 'tiktoken') if name in sys.modules))")
+    env = {**os.environ, "SUPABASE_URL": "http://supabase.invalid", "SUPABASE_ANON_KEY": "test",
+           "OPENAI_API_KEY": "test", "WARMUP": "", "PRELOAD_CLASSIFIER": "false"}
+    completed = subprocess.run([sys.executable, "-c", probe], cwd=Path(__file__).parent.parent, env=env,
+                               capture_output=True, text=True, check=True)
+    assert completed.stdout.strip() == ""
@@ -0,0 +1,104 @@
+import asyncio
+import threading
+import time
+
+import metrics
+from summaries import SummaryService, SummaryStore, summary_key, UNABLE_TO_SUMMARIZE
+from fakes import FakeLLM, StubWikipedia
+
+
+def make_service(llm, store=None):
+    return SummaryService(StubWikipedia({"Dune": "Novela de ciencia ficción"}), store, llm_factory=lambda: llm)
+
+
+async def collect(agen):
+    return [event async for event in agen]
+
+
+def test_summary_is_memoized(tmp_path):
+    llm = FakeLLM("Un resumen sin spoilers.")
+    service = make_service(llm, SummaryStore(str(tmp_path / "summaries.sqlite")))
+    first = asyncio.run(service.generate("Dune", "Arena"))
+    second = asyncio.run(service.generate("Dune", "Arena"))
+    assert first == second == {"error": "", "summary_text": "Un resumen sin spoilers."}
+    assert llm.calls == 1
+    assert service.stats()["hits"] == 1
+
+
+def test_summary_key_depends_on_inputs():
+    assert summary_key("Dune", "Arena", "ctx") != summary_key("Dune", "Arena", "otro ctx")
+    assert summary_key("Dune", "Arena", "ctx") != summary_key("Dune", "Arena", "ctx", model="otro")
+
+
+def test_unknown_book_is_not_cached(tmp_path):
+    llm = FakeLLM("UNKNOWN_BOOK_INFO")
+    service = make_service(llm, SummaryStore(str(tmp_path / "summaries.sqlite")))
+    assert asyncio.run(service.generate("Dune", "Arena"))["error"] == UNABLE_TO_SUMMARIZE
+    asyncio.run(service.generate("Dune", "Arena"))
+    assert llm.calls == 2
+
+
+def test_stream_yields_deltas_and_caches(tmp_path):
+    llm = FakeLLM("Primer párrafo. Segundo párrafo.", chunk_size=5)
+    service = make_service(llm, SummaryStore(str(tmp_path / "summaries.sqlite")))
+    events = asyncio.run(collect(service.stream("Dune", "Arena")))
+    deltas = [e["delta"] for e in events if "delta" in e]
+    assert len(deltas) > 1
+    assert "".join(deltas) == llm.text
+    assert events[-1] == {"done": llm.text}
+    cached = asyncio.run(collect(service.stream("Dune", "Arena")))
+    assert cached[-1] == {"done": llm.text}
+    assert llm.calls == 1
+
+
+def test_stream_stage_covers_generation():
+    """La etapa llm_stream mide toda la generación, no solo la apertura del stream"""
+    llm = FakeLLM("Primer párrafo. Segundo párrafo.", latency=0.01, chunk_size=8)
+    stages = []
+    token = metrics._request_stages.set(stages)
+    try:
+        asyncio.run(collect(make_service(llm).stream("Dune", "Arena")))
+    finally:
+        metrics._request_stages.reset(token)
+    durations = dict(stages)
+    assert "llm" not in durations
+    assert durations["llm_stream"] >= 0.04
+
+
+def test_stream_hides_unknown_sentinel():
+    events = asyncio.run(collect(make_service(FakeLLM("UNKNOWN_BOOK_INFO", chunk_size=3)).stream("Dune", "Arena")))
+    assert events == [{"error": UNABLE_TO_SUMMARIZE}]
+
+
+def test_llm_errors_are_reported():
+    result = asyncio.run(make_service(FakeLLM(fail=True)).generate("Dune", "Arena"))
+    assert result["summary_text"] == "" and "no disponible" in result["error"]
+
+
+def test_wikipedia_lookup_overlaps_client_creation():
+    """La consulta a Wikipedia está en marcha mientras se crea el cliente LLM"""
+    building = threading.Event()
+
+    class WaitingWikipedia(StubWikipedia):
+        overlapped = False
+
+        async def get_context(self, title, sentences=10, max_chars=3000):
+            # Solo responde antes del plazo si el cliente se está creando a la vez
+            for _ in range(100):
+                if building.is_set():
+                    self.overlapped = True
+                    break
+                await asyncio.sleep(0.01)
+            return await super().get_context(title, sentences, max_chars)
+
+    llm = FakeLLM("Un resumen sin spoilers.")
+
+    def factory():
+        building.set()
+        time.sleep(0.05)
+        return llm
+
+    wikipedia = WaitingWikipedia({"Dune": "Novela de ciencia ficción"})
+    result = asyncio.run(SummaryService(wikipedia, llm_factory=factory).generate("Dune", "Arena"))
+    assert result["summary_text"] == "Un resumen sin spoilers."
+    assert wikipedia.overlapped
@@ -0,0 +1,164 @@
+import asyncio
+import json
+
+import numpy as np
+
+from executors import index_pool, run_in_pool
+from fakes import InMemoryPostgrest
+from vector_store import LocalVectorIndex, LocalVectorStore, PostgrestVectorStore, sync_from_postgrest
+
+DIM = 16
+
+
+def make_rows(n, seed=0):
+    rng = np.random.default_rng(seed)
+    sentiments = ["joy", "fear", "neutral"]
+    return [{"id": f"doc-{i:04d}", "content": f"libro {i}",
+             "metadata": {"dominant_sentiment": sentiments[i % 3], "categories": ["Fiction", "Fantasy"][: 1 + i % 2]},
+             "embedding": rng.normal(size=DIM).tolist()} for i in range(n)]
+
+
+def test_exact_search_matches_rpc():
+    """El índice local devuelve el mismo ranking que la función match_documents"""
+    rows = make_rows(200)
+    index = LocalVectorIndex(dim=DIM, capacity=8)
+    index.add(rows)
+    query = np.random.default_rng(1).normal(size=DIM).tolist()
+    db = InMemoryPostgrest({"documents": rows})
+    for filters in (None, {"dominant_sentiment": "fear"}):
+        expected = asyncio.run(PostgrestVectorStore(db).search(query, k=10, filters=filters))
+        local = index.search_sync(query, k=10, filters=filters)
+        assert [row["id"] for row in local] == [row["id"] for row in expected]
+        assert np.allclose([row["similarity"] for row in local], [row["similarity"] for row in expected], atol=1e-5)
+
+
+def test_filters_restrict_candidates_before_ranking():
+    """Con un filtro selectivo la página se llena igual (no se filtra tras rankear)"""
+    index = LocalVectorIndex(dim=DIM)
+    index.add(make_rows(300))
+    hits = index.search_sync(np.ones(DIM), k=20, filters={"category": "fantasy", "dominant_sentiment": "joy"})
+    assert len(hits) == 20
+    assert all("Fantasy" in hit["metadata"]["categories"] and hit["metadata"]["dominant_sentiment"] == "joy" for hit in hits)
+
+
+def test_postgrest_store_prefilters_by_ids():
+    rows = make_rows(300)
+    rows[7]["metadata"]["authors"] = "Miguel de Cervantes"
+    db = InMemoryPostgrest({"documents": rows})
+    store = PostgrestVectorStore(db)
+    query = np.ones(DIM).tolist()
+    # Antes de cargar el índice se filtra después de rankear
+    assert asyncio.run(store.search(query, k=5, filters={"author": "cervantes"})) == []
+    asyncio.run(store._load_metadata())
+    hits = asyncio.run(store.search(query, k=5, filters={"author": "cervantes"}))
+    assert [hit["id"] for hit in hits] == ["doc-0007"]
+    assert ("rpc", "match_documents_by_ids") in db.calls
+    assert store.stats()["prefiltered"] == 1 and store.stats()["postfiltered"] == 1
+
+
+def test_upsert_and_remove():
+    index = LocalVectorIndex(dim=DIM)
+    rows = make_rows(5)
+    index.add(rows)
+    index.add([{**rows[0], "content": "nuevo"}])
+    index.remove(["doc-0001"])
+    assert len(index) == 4
+    hits = index.search_sync(rows[0]["embedding"], k=10)
+    assert hits[0]["content"] == "nuevo"
+    assert "doc-0001" not in {hit["id"] for hit in hits}
+
+
+def test_batch_search():
+    index = LocalVectorIndex(dim=DIM)
+    rows = make_rows(50)
+    index.add(rows)
+    results = index.search_batch(np.asarray([rows[3]["embedding"], rows[7]["embedding"]]), k=1)
+    assert [r[0]["id"] for r in results] == ["doc-0003", "doc-0007"]
+
+
+def test_search_many_matches_single_searches():
+    """Varias consultas con sus propios k y filtros dan lo mismo que buscarlas una a una, en ambos backends"""
+    rows = make_rows(200)
+    queries = np.random.default_rng(3).normal(size=(4, DIM))
+    ks = [5, 3, 8, 5]
+    filters = [None, {"dominant_sentiment": "fear"}, None, {"dominant_sentiment": "fear"}]
+    db = InMemoryPostgrest({"documents": rows})
+    index = LocalVectorIndex(dim=DIM)
+    index.add(rows)
+    store = LocalVectorStore(db, index=index)
+    for backend in (store, PostgrestVectorStore(db)):
+        results = asyncio.run(backend.search_many(queries.tolist(), ks, filters))
+        for query, k, query_filters, hits in zip(queries, ks, filters, results):
+            expected = asyncio.run(backend.search(query.tolist(), k=k, filters=query_filters))
+            assert [hit["id"] for hit in hits] == [hit["id"] for hit in expected]
+            assert np.allclose([hit["similarity"] for hit in hits], [hit["similarity"] for hit in expected], atol=1e-5)
+
+
+def test_ivf_recall():
+    index = LocalVectorIndex(dim=DIM)
+    rows = make_rows(2000)
+    index.add(rows)
+    index.build_ivf(lists=32)
+    index.add(make_rows(1, seed=5))
+    queries = np.random.default_rng(2).normal(size=(20, DIM))
+    exact = index.search_batch(queries, k=10, mode="exact")
+    approx = index.search_batch(queries, k=10, mode="ivf", probes=8)
+    recall = np.mean([len({r["id"] for r in a} & {r["id"] for r in e}) / 10 for a, e in zip(approx, exact)])
+    assert recall >= 0.8
+
+
+def test_save_and_load_memory_mapped(tmp_path):
+    index = LocalVectorIndex(dim=DIM)
+    rows = make_rows(20)
+    index.add(rows)
+    index.remove(["doc-0000"])
+    path = str(tmp_path / "vectors")
+    index.save(path)
+    loaded = LocalVectorIndex.load(path)
+    assert loaded.stats()["memory_mapped"] and len(loaded) == 19
+    assert loaded.search_sync(rows[4]["embedding"], k=1)[0]["id"] == "doc-0004"
+    # La primera escritura copia la matriz a memoria
+    loaded.add(make_rows(1, seed=9))
+    assert not loaded.stats()["memory_mapped"]
+
+
+def test_sync_from_postgrest_parses_pgvector_text():
+    rows = [{**row, "embedding": json.dumps(row["embedding"])} for row in make_rows(7)]
+    rows.append({"id": "sin-embedding", "content": "x", "metadata": {}, "embedding": None})
+    index = asyncio.run(sync_from_postgrest(InMemoryPostgrest({"documents": rows}), dim=DIM, page_size=3))
+    assert len(index) == 7
+
+
+def test_store_keeps_rows_added_during_sync():
+    db = InMemoryPostgrest({"documents": make_rows(3)})
+    store = LocalVectorStore(db, LocalVectorIndex(dim=DIM), path="")
+
+    async def scenario():
+        sync = asyncio.create_task(store.sync())
+        await asyncio.sleep(0)
+        store.add([{**make_rows(1, seed=3)[0], "id": "nuevo"}])
+        await sync
+        return await store.search(np.ones(DIM), k=10)
+
+    hits = asyncio.run(scenario())
+    assert "nuevo" in {hit["id"] for hit in hits}
+    assert len(store.index) == 4
+
+
+def test_store_keeps_rows_removed_during_sync():
+    """Un documento retirado mientras se sincroniza no vuelve con el índice nuevo"""
+    db = InMemoryPostgrest({"documents": make_rows(3)})
+    store = LocalVectorStore(db, LocalVectorIndex(dim=DIM), path="")
+    removed = db.tables["documents"][0]["id"]
+
+    async def scenario():
+        sync = asyncio.create_task(store.sync())
+        await asyncio.sleep(0)
+        # Llega desde el hilo de índices, como en la API
+        await run_in_pool(index_pool, store.remove, [removed])
+        await sync
+        return await store.search(np.ones(DIM), k=10)
+
+    hits = asyncio.run(scenario())
+    assert removed not in {hit["id"] for hit in hits}
+    assert len(store.index) == 2
@@ -0,0 +1,121 @@
+import asyncio
+import httpx
+from wiki import WikipediaClient, WikipediaCache, CachedWikipedia
+from fakes import StubWikipedia
+
+
+def make_client(pages, search_results):
+    """Cliente de Wikipedia sobre un transporte simulado (sin red)"""
+    def handler(request: httpx.Request):
+        params = request.url.params
+        if params.get("list") == "search":
+            return httpx.Response(200, json={"query": {"search": [{"title": t} for t in search_results]}})
+        title = params.get("titles")
+        if params.get("prop") == "links":
+            return httpx.Response(200, json={"query": {"pages": [{"title": title, "links": [{"title": t} for t in pages[title]["links"]]}]}})
+        page = pages.get(title)
+        if page is None:
+            return httpx.Response(200, json={"query": {"pages": [{"title": title, "missing": True}]}})
+        return httpx.Response(200, json={"query": {"pages": [{"title": title, "extract": page.get("extract", ""), "pageprops": page.get("pageprops", {})}]}})
+
+    return WikipediaClient(http=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+
+def test_get_context_returns_extract():
+    """Devuelve el resumen de la página encontrada"""
+    wiki = make_client({"Don Quixote": {"extract": "  Don Quixote is a Spanish novel.  "}}, ["Don Quixote"])
+    assert asyncio.run(wiki.get_context("Don Quixote")) == "Don Quixote is a Spanish novel."
+
+
+def test_get_context_truncates():
+    """El contexto se recorta a max_chars"""
+    wiki = make_client({"Dune": {"extract": "x" * 100}}, ["Dune"])
+    assert len(asyncio.run(wiki.get_context("Dune", max_chars=10))) == 10
+
+
+def test_get_context_resolves_disambiguation():
+    """En una página de desambiguación se elige la opción del libro"""
+    pages = {
+        "Dune": {"pageprops": {"disambiguation": ""}, "links": ["Dune (film)", "Dune (novel)"]},
+        "Dune (film)": {"extract": "A film."},
+        "Dune (novel)": {"extract": "A novel by Frank Herbert."},
+    }
+    wiki = make_client(pages, ["Dune"])
+    assert asyncio.run(wiki.get_context("Dune")) == "A novel by Frank Herbert."
+
+
+def test_get_context_no_results():
+    """Sin resultados de búsqueda devuelve cadena vacía"""
+    wiki = make_client({}, [])
+    assert asyncio.run(wiki.get_context("Libro inexistente")) == ""
+
+
+def test_cache_avoids_repeated_fetches(tmp_path):
+    """El mismo título solo se consulta una vez y la caché sobrevive a un reinicio"""
+    stub = StubWikipedia({"Rayuela": "Rayuela es una novela de Julio Cortázar."})
+    path = str(tmp_path / "wiki.sqlite")
+    wiki = CachedWikipedia(stub, WikipediaCache(path), ttl=3600)
+    assert asyncio.run(wiki.get_context("Rayuela")) == "Rayuela es una novela de Julio Cortázar."
+    assert asyncio.run(wiki.get_context("rayuela ")) == "Rayuela es una novela de Julio Cortázar."
+    assert stub.calls == 1
+    restarted = CachedWikipedia(stub, WikipediaCache(path), ttl=3600)
+    asyncio.run(restarted.get_context("Rayuela"))
+    assert stub.calls == 1
+    assert restarted.stats()["hits"] == 1
+
+
+def test_concurrent_lookups_share_one_fetch(tmp_path):
+    """Las peticiones simultáneas del mismo título comparten una sola consulta"""
+    stub = StubWikipedia({"Aura": "Aura es una novela corta."}, latency=0.05)
+    wiki = CachedWikipedia(stub, WikipediaCache(str(tmp_path / "wiki.sqlite")), ttl=3600)
+
+    async def run():
+        return await asyncio.gather(*(wiki.get_context("Aura") for _ in range(5)))
+
+    assert asyncio.run(run()) == ["Aura es una novela corta."] * 5
+    assert stub.calls == 1
+
+
+def test_stale_entry_is_served_and_refreshed(tmp_path):
+    """Una entrada caducada se devuelve al instante y se refresca en segundo plano"""
+    stub = StubWikipedia({"Dune": "Versión vieja"}, latency=0.01)
+    wiki = CachedWikipedia(stub, WikipediaCache(str(tmp_path / "wiki.sqlite")), ttl=0.001)
+
+    async def run():
+        await wiki.get_context("Dune")
+        stub.pages["Dune"] = "Versión nueva"
+        await asyncio.sleep(0.01)
+        stale = await wiki.get_context("Dune")
+        await asyncio.sleep(0.05)
+        wiki.ttl = 3600
+        return stale, await wiki.get_context("Dune")
+
+    stale, refreshed = asyncio.run(run())
+    assert stale == "Versión vieja"
+    assert refreshed == "Versión nueva"
+    assert wiki.stats()["stale_hits"] == 1
+    assert stub.calls == 2
+
+
+def test_errors_are_not_cached(tmp_path):
+    """Un fallo de red devuelve cadena vacía sin guardarse en caché"""
+    stub = StubWikipedia({"Ficciones": "Cuentos de Borges."}, fail=True)
+    wiki = CachedWikipedia(stub, WikipediaCache(str(tmp_path / "wiki.sqlite")), ttl=3600)
+    assert asyncio.run(wiki.get_context("Ficciones")) == ""
+    stub.fail = False
+    assert asyncio.run(wiki.get_context("Ficciones")) == "Cuentos de Borges."
+    assert wiki.stats()["errors"] == 1
+
+
+def test_cache_files_only_go_to_data_dir(tmp_path, monkeypatch):
+    """Sin DATA_DIR no hay ruta por defecto; con él, los archivos se crean dentro (y el directorio también)"""
+    import storage
+
+    monkeypatch.setattr(storage, "DATA_DIR", "")
+    assert storage.data_path("wikipedia_cache.sqlite") == ""
+    monkeypatch.setattr(storage, "DATA_DIR", str(tmp_path / "datos"))
+    path = storage.data_path("wikipedia_cache.sqlite")
+    cache = WikipediaCache(path)
+    cache.put("dune", "Novela")
+    assert cache.get("dune")[0] == "Novela"
+    assert (tmp_path / "datos" / "wikipedia_cache.sqlite").exists()
@@ -0,0 +1,673 @@
+"""
+Vector search backends for the `documents` table.
+
+- "supabase": the `match_documents` RPC (one network round-trip per search)
+- "local": an in-process float32 matrix mirrored from Supabase, searched with
+  exact dot products or an optional IVF approximation
+
+Both can use compact embeddings (see quantization.py): truncated dimensions
+(VECTOR_COMPACT_DIM) and int8/binary codes that shortlist candidates for a
+full-precision rescoring (VECTOR_QUANTIZATION).
+
+Both backends resolve /search filters (sentiment, category, author, year)
+with a MetadataIndex before ranking.
+
+The local index can be dumped to disk and memory-mapped at startup:
+
+    uv run python vector_store.py sync --out vectors
+"""
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from executors import run_cpu, run_io
+from metadata_index import MetadataIndex, active_filters, matches
+from quantization import VECTOR_COMPACT_DIM, VECTOR_QUANTIZATION, VECTOR_RESCORE_FACTOR, get_codec, shortlist, truncate
+
+VECTOR_STORE = os.getenv("VECTOR_STORE", "supabase")
+# text-embedding-3-large
+VECTOR_DIM = int(os.getenv("VECTOR_DIM", "3072"))
+# Prefijo de los archivos <ruta>.npy / <ruta>.json del índice local (vacío = solo memoria)
+VECTOR_INDEX_PATH = os.getenv("VECTOR_INDEX_PATH", "")
+# Segundos entre sincronizaciones completas con Supabase (0 = solo al arrancar)
+VECTOR_SYNC_INTERVAL = float(os.getenv("VECTOR_SYNC_INTERVAL", "0"))
+VECTOR_SYNC_PAGE_SIZE = int(os.getenv("VECTOR_SYNC_PAGE_SIZE", "500"))
+# "exact" o "ivf" (aproximado: solo se comparan las listas más cercanas a la consulta)
+VECTOR_INDEX_MODE = os.getenv("VECTOR_INDEX_MODE", "exact")
+VECTOR_IVF_LISTS = int(os.getenv("VECTOR_IVF_LISTS", "256"))
+VECTOR_IVF_PROBES = int(os.getenv("VECTOR_IVF_PROBES", "16"))
+# Máximo de ids candidatos que se envían a match_documents_by_ids; con más se filtra tras rankear
+PREFILTER_MAX_IDS = int(os.getenv("PREFILTER_MAX_IDS", "5000"))
+# Factor de sobre-pedido cuando el filtro no se puede aplicar antes de rankear
+POSTFILTER_OVERFETCH = int(os.getenv("POSTFILTER_OVERFETCH", "4"))
+
+
+def parse_embedding(value: Any) -> Optional[np.ndarray]:
+    # PostgREST devuelve las columnas pgvector como texto "[0.1,0.2,...]"
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = json.loads(value)
+    return np.asarray(value, dtype=np.float32)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+async def iter_documents(db, columns: str, page_size: int = VECTOR_SYNC_PAGE_SIZE):
+    """
+    Yield pages of the `documents` table ordered by id (keyset pagination)
+    """
+    last_id = None
+    while True:
+        query = db.table("documents").select(columns).order("id").limit(page_size)
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        rows = (await query.execute()).data or []
+        if rows:
+            yield rows
+        if len(rows) < page_size:
+            break
+        last_id = rows[-1]["id"]
+
+
+async def fetch_documents(db, ids: List[str], columns: str, batch_size: int = 100) -> List[Dict[str, Any]]:
+    """
+    Rows of the `documents` table with the given ids (in batches, the ids go in the URL)
+    """
+    rows = []
+    for start in range(0, len(ids), batch_size):
+        response = await db.table("documents").select(columns).in_("id", ids[start:start + batch_size]).execute()
+        rows.extend(response.data or [])
+    return rows
+
+
+def postgrest_functions(compact_dim: int = VECTOR_COMPACT_DIM, quantization: str = VECTOR_QUANTIZATION):
+    """
+    Similarity RPCs (ranking, ranking restricted to ids) for a compact setting.
+    pgvector has no int8 type, so "int8" only applies to the local index: here
+    it ranks like "none" (the halfvec column with compact_dim, otherwise the
+    full embedding with match_documents)
+    """
+    if quantization == "binary":
+        # Las búsquedas por ids ya rankean pocas filas: se puntúan directamente en precisión completa
+        return "match_documents_binary", "match_documents_by_ids"
+    if compact_dim:
+        return "match_documents_compact", "match_documents_compact_by_ids"
+    return "match_documents", "match_documents_by_ids"
+
+
+class PostgrestVectorStore:
+    """
+    Runs the `match_documents` similarity RPC, same as SupabaseVectorStore does.
+    Filtered searches resolve the candidate ids with an in-process metadata
+    index and rank only those rows with `match_documents_by_ids`.
+
+    With `compact_dim` the RPCs rank the truncated halfvec column
+    `embedding_compact`; with binary quantization they shortlist rows by
+    Hamming distance and rescore them on the full embedding
+    (migrations/003_compact_embeddings.sql)
+    """
+
+    name = "supabase"
+
+    def __init__(self, db, function: Optional[str] = None, ids_function: Optional[str] = None,
+                 compact_dim: int = VECTOR_COMPACT_DIM, quantization: str = VECTOR_QUANTIZATION,
+                 rescore_factor: int = VECTOR_RESCORE_FACTOR):
+        self.db = db
+        self.compact_dim = 0 if quantization == "binary" else compact_dim
+        self.quantization = quantization
+        self.rescore_factor = max(1, rescore_factor)
+        default_function, default_ids_function = postgrest_functions(compact_dim, quantization)
+        self.function = function or default_function
+        self.ids_function = ids_function or default_ids_function
+        self.metadata_index = MetadataIndex()
+        self.prefiltered = 0
+        self.postfiltered = 0
+        # Carga inicial del índice de metadatos terminada (aunque haya fallado)
+        self.ready = False
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._load_metadata())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def _load_metadata(self):
+        # Solo id y metadata: mucho más ligero que traer los embeddings
+        try:
+            async for rows in iter_documents(self.db, "id, metadata"):
+                self.metadata_index.add_many((row["id"], row.get("metadata") or {}) for row in rows)
+            self.metadata_index.ready = True
+        except Exception:
+            # Sin índice se sigue filtrando después de rankear
+            pass
+        finally:
+            self.ready = True
+
+    def add(self, rows: List[Dict[str, Any]]):
+        # La tabla documents es la fuente de verdad: solo se actualiza el índice de metadatos
+        self.metadata_index.add_many((row["id"], row.get("metadata") or {}) for row in rows if row.get("content"))
+
+    def remove(self, ids: List[str]):
+        for document_id in ids:
+            self.metadata_index.remove(document_id)
+
+    async def _rpc(self, function: str, params: Dict[str, Any], k: int) -> List[Dict[str, Any]]:
+        query_builder = self.db.rpc(function, params)
+        query_builder.params = query_builder.params.set("limit", k)
+        response = await query_builder.execute()
+        return [row for row in response.data if row.get("content")]
+
+    def _query(self, query_embedding) -> Any:
+        # La columna compacta se compara con la consulta truncada a las mismas dimensiones
+        if not self.compact_dim:
+            return query_embedding
+        return truncate(query_embedding, self.compact_dim).tolist()
+
+    def _match_params(self, query_embedding, k: int) -> Dict[str, Any]:
+        params = {"query_embedding": self._query(query_embedding)}
+        if self.quantization == "binary":
+            params["candidates"] = k * self.rescore_factor
+        return params
+
+    async def search(self, query_embedding, k: int, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        filters = active_filters(filters)
+        if not filters:
+            return await self._rpc(self.function, self._match_params(query_embedding, k), k)
+
+        if self.metadata_index.ready:
+            ids = self.metadata_index.select(filters)
+            if not ids:
+                return []
+            if len(ids) <= PREFILTER_MAX_IDS:
+                self.prefiltered += 1
+                return await self._rpc(self.ids_function, {"query_embedding": self._query(query_embedding),
+                                                           "document_ids": sorted(ids)}, k)
+
+        # Filtro poco selectivo o índice sin cargar: la RPC aplica lo que puede y el resto se filtra aquí
+        self.postfiltered += 1
+        match_params = self._match_params(query_embedding, k * POSTFILTER_OVERFETCH)
+        if "dominant_sentiment" in filters:
+            match_params["filter"] = {"metadata": {"dominant_sentiment": filters["dominant_sentiment"]}}
+        hits = await self._rpc(self.function, match_params, k * POSTFILTER_OVERFETCH)
+        return [hit for hit in hits if matches(hit.get("metadata") or {}, filters)][:k]
+
+    async def search_many(self, query_embeddings, ks: List[int],
+                          filters: List[Optional[Dict[str, Any]]]) -> List[List[Dict[str, Any]]]:
+        # Una RPC por consulta, todas a la vez sobre el pool de conexiones compartido
+        return list(await asyncio.gather(*(self.search(query_embedding, k, query_filters)
+                                           for query_embedding, k, query_filters in zip(query_embeddings, ks, filters))))
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name, "ready": self.ready, "function": self.function,
+                "prefiltered": self.prefiltered, "postfiltered": self.postfiltered,
+                "metadata_index": self.metadata_index.stats()}
+
+
+class LocalVectorIndex:
+    """
+    In-process cosine-similarity index over unit-normalized float32 vectors.
+    Rows are appended into a preallocated matrix that doubles when full;
+    deleted rows are masked out until the next rebuild.
+
+    Embeddings longer than `dim` are truncated (Matryoshka). With a
+    `quantization` other than "none", searches scan the int8/binary codes and
+    rescore only the best `k * rescore_factor` rows with the float vectors.
+    """
+
+    def __init__(self, dim: int = VECTOR_COMPACT_DIM or VECTOR_DIM, capacity: int = 1024,
+                 quantization: str = VECTOR_QUANTIZATION, rescore_factor: int = VECTOR_RESCORE_FACTOR):
+        self.dim = dim
+        self.codec = get_codec(quantization, dim)
+        self.rescore_factor = max(1, rescore_factor)
+        self._vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self._alive = np.zeros(capacity, dtype=bool)
+        # Códigos cuantizados (y escala de cada fila) que se recorren en cada búsqueda
+        self._codes: Optional[np.ndarray] = None
+        self._scales: Optional[np.ndarray] = None
+        if self.quantized:
+            self._codes = np.zeros((capacity, self.codec.width), dtype=self.codec.dtype)
+            self._scales = np.ones(capacity, dtype=np.float32)
+        self._size = 0
+        self._ids: List[str] = []
+        self._content: List[str] = []
+        self._metadata: List[Dict[str, Any]] = []
+        self._positions: Dict[str, int] = {}
+        self.metadata_index = MetadataIndex()
+        self.metadata_index.ready = True
+        self._lock = threading.Lock()
+        # IVF: centroides y lista asignada a cada fila
+        self._centroids: Optional[np.ndarray] = None
+        self._assignments: Optional[np.ndarray] = None
+
+    def __len__(self):
+        return len(self._positions)
+
+    @property
+    def quantized(self) -> bool:
+        return self.codec.name != "none"
+
+    def _grow(self, needed: int):
+        capacity = len(self._vectors)
+        # Un índice cargado con mmap es de solo lectura: la primera escritura lo copia a memoria
+        if needed <= capacity and self._vectors.flags.writeable:
+            return
+        capacity = max(needed, capacity * 2)
+        vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+        vectors[:self._size] = self._vectors[:self._size]
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:self._size] = self._alive[:self._size]
+        self._vectors, self._alive = vectors, alive
+        if self._codes is not None:
+            codes = np.zeros((capacity, self.codec.width), dtype=self.codec.dtype)
+            codes[:self._size] = self._codes[:self._size]
+            scales = np.ones(capacity, dtype=np.float32)
+            scales[:self._size] = self._scales[:self._size]
+            self._codes, self._scales = codes, scales
+        if self._assignments is not None:
+            assignments = np.full(capacity, -1, dtype=np.int32)
+            assignments[:self._size] = self._assignments[:self._size]
+            self._assignments = assignments
+
+    def add(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """
+        Insert or replace rows with `id`, `content`, `metadata` and `embedding`
+        """
+        added = 0
+        with self._lock:
+            for row in rows:
+                vector = parse_embedding(row.get("embedding"))
+                if vector is None or not row.get("content"):
+                    continue
+                if vector.ndim == 1 and len(vector) > self.dim:
+                    vector = truncate(vector, self.dim)
+                if vector.shape != (self.dim,):
+                    raise ValueError(f"Expected a {self.dim}-dimensional embedding, got {vector.shape}")
+                position = self._positions.get(row["id"])
+                if position is None:
+                    self._grow(self._size + 1)
+                    position = self._size
+                    self._size += 1
+                    self._ids.append(row["id"])
+                    self._content.append(row["content"])
+                    self._metadata.append(row.get("metadata") or {})
+                    self._positions[row["id"]] = position
+                else:
+                    self._grow(self._size)
+                    self._content[position] = row["content"]
+                    self._metadata[position] = row.get("metadata") or {}
+                self.metadata_index.add(position, self._metadata[position])
+                vector = _normalize(vector)
+                self._vectors[position] = vector
+                if self._codes is not None:
+                    codes, scales = self.codec.encode(vector)
+                    self._codes[position], self._scales[position] = codes[0], scales[0]
+                self._alive[position] = True
+                if self._centroids is not None:
+                    self._assignments[position] = int(np.argmax(self._centroids @ vector))
+                added += 1
+        return added
+
+    def remove(self, ids: Iterable[str]) -> int:
+        removed = 0
+        with self._lock:
+            for document_id in ids:
+                position = self._positions.pop(document_id, None)
+                if position is not None:
+                    self._alive[position] = False
+                    self.metadata_index.remove(position)
+                    removed += 1
+        return removed
+
+    def build_ivf(self, lists: int = VECTOR_IVF_LISTS, iterations: int = 10, seed: int = 0):
+        """
+        Cluster the vectors with spherical k-means so searches can probe only
+        the closest lists. Rows added later are assigned to their nearest list.
+        """
+        with self._lock:
+            size = self._size
+            vectors = self._vectors[:size]
+            live = np.flatnonzero(self._alive[:size])
+        if len(live) == 0:
+            return
+        lists = min(lists, len(live))
+        rng = np.random.default_rng(seed)
+        sample = vectors[live]
+        centroids = sample[rng.choice(len(sample), lists, replace=False)].copy()
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            for cluster in range(lists):
+                members = sample[labels == cluster]
+                if len(members):
+                    centroids[cluster] = _normalize(members.mean(axis=0))
+        assignments = np.full(len(self._vectors), -1, dtype=np.int32)
+        for start in range(0, size, 4096):
+            block = vectors[start:start + 4096]
+            assignments[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+        with self._lock:
+            # Filas añadidas mientras se calculaban los centroides
+            for position in range(size, self._size):
+                assignments[position] = int(np.argmax(centroids @ self._vectors[position]))
+            self._centroids, self._assignments = centroids, assignments
+
+    def _candidates(self, size: int, alive: np.ndarray, filters: Optional[Dict[str, Any]]) -> np.ndarray:
+        # Prefiltrado: solo las filas que pasan los filtros llegan a puntuarse
+        selected = self.metadata_index.select(filters)
+        if selected is None:
+            return alive
+        mask = np.zeros(size, dtype=bool)
+        positions = np.fromiter((p for p in selected if p < size), dtype=np.int64)
+        mask[positions] = True
+        return mask & alive
+
+    def search_batch(self, queries: np.ndarray, k: int, filters: Optional[Dict[str, Any]] = None,
+                     mode: str = VECTOR_INDEX_MODE, probes: int = VECTOR_IVF_PROBES) -> List[List[Dict[str, Any]]]:
+        """
+        Top-k rows for each query vector, scored with one matrix product
+        """
+        queries = truncate(np.atleast_2d(np.asarray(queries, dtype=np.float32)), self.dim)
+        with self._lock:
+            size = self._size
+            vectors = self._vectors
+            codes, scales = self._codes, self._scales
+            alive = self._alive[:size].copy()
+            centroids, assignments = self._centroids, self._assignments
+        mask = self._candidates(size, alive, filters)
+        ivf = mode == "ivf" and centroids is not None
+
+        # Sin IVF ni cuantización todas las consultas se puntúan con un único producto de matrices
+        shared_scores = None
+        if codes is None and not ivf and len(queries) > 1:
+            positions = np.flatnonzero(mask)
+            if len(positions):
+                shared_scores = queries @ (vectors[:size] if len(positions) == size else vectors[positions]).T
+
+        results = []
+        for number, query in enumerate(queries):
+            candidates = mask
+            if ivf:
+                nearest = np.argsort(-(centroids @ query))[:probes]
+                candidates = mask & np.isin(assignments[:size], nearest)
+            positions = np.flatnonzero(candidates)
+            if len(positions) == 0:
+                results.append([])
+                continue
+            # Sin filtro ni IVF se puntúa la matriz completa (evita copiar las filas candidatas)
+            everything = len(positions) == size
+            if codes is None:
+                if shared_scores is not None:
+                    scores = shared_scores[number]
+                else:
+                    scores = vectors[:size] @ query if everything else vectors[positions] @ query
+                best = shortlist(scores, k)
+                results.append([self._row(positions[i], float(scores[i])) for i in best])
+                continue
+            # Preselección con los códigos y puntuación exacta solo de los candidatos
+            approximate = self.codec.scores(codes[:size] if everything else codes[positions],
+                                            scales[:size] if everything else scales[positions], query)
+            shortlisted = positions[shortlist(approximate, k * self.rescore_factor)]
+            scores = vectors[shortlisted] @ query
+            best = shortlist(scores, k)
+            results.append([self._row(shortlisted[i], float(scores[i])) for i in best])
+        return results
+
+    def search_many(self, queries, ks: List[int], filters: List[Optional[Dict[str, Any]]],
+                    mode: str = VECTOR_INDEX_MODE) -> List[List[Dict[str, Any]]]:
+        """
+        Top-`ks[i]` rows for each query with its own filters; queries that
+        share their filters are scored together by search_batch
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        groups: Dict[str, List[int]] = {}
+        for position, query_filters in enumerate(filters):
+            key = json.dumps(active_filters(query_filters), sort_keys=True, default=str)
+            groups.setdefault(key, []).append(position)
+        results: List[List[Dict[str, Any]]] = [[] for _ in ks]
+        for positions in groups.values():
+            depth = max(ks[position] for position in positions)
+            hits = self.search_batch(queries[positions], depth, filters[positions[0]], mode=mode)
+            for position, rows in zip(positions, hits):
+                results[position] = rows[:ks[position]]
+        return results
+
+    def search_sync(self, query_embedding, k: int, filters: Optional[Dict[str, Any]] = None,
+                    mode: str = VECTOR_INDEX_MODE) -> List[Dict[str, Any]]:
+        return self.search_batch(np.asarray(query_embedding, dtype=np.float32), k, filters, mode=mode)[0]
+
+    def _row(self, position: int, similarity: float) -> Dict[str, Any]:
+        return {
+            "id": self._ids[position],
+            "content": self._content[position],
+            "metadata": self._metadata[position],
+            "similarity": similarity,
+        }
+
+    def save(self, path: str):
+        """
+        Write `<path>.npy` (vectors), `<path>.codes.npy` and `<path>.scales.npy`
+        (quantized codes, if any) and `<path>.json` (ids, content, metadata)
+        """
+        with self._lock:
+            live = np.flatnonzero(self._alive[:self._size])
+            vectors = self._vectors[live]
+            codes = self._codes[live] if self._codes is not None else None
+            scales = self._scales[live] if self._scales is not None else None
+            rows = [{"id": self._ids[i], "content": self._content[i], "metadata": self._metadata[i]} for i in live]
+        tmp = f"{path}.tmp"
+        np.save(f"{tmp}.npy", vectors)
+        if codes is not None:
+            np.save(f"{tmp}.codes.npy", codes)
+            np.save(f"{tmp}.scales.npy", scales)
+        with open(f"{tmp}.json", "w", encoding="utf-8") as handle:
+            json.dump({"dim": self.dim, "quantization": self.codec.name, "rows": rows}, handle, ensure_ascii=False)
+        os.replace(f"{tmp}.npy", f"{path}.npy")
+        if codes is not None:
+            os.replace(f"{tmp}.codes.npy", f"{path}.codes.npy")
+            os.replace(f"{tmp}.scales.npy", f"{path}.scales.npy")
+        os.replace(f"{tmp}.json", f"{path}.json")
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True, quantization: Optional[str] = None,
+             rescore_factor: int = VECTOR_RESCORE_FACTOR) -> "LocalVectorIndex":
+        """
+        Load an index written by `save`. With `mmap` the vectors stay on disk
+        and are paged in by the OS as searches touch them; a quantized index
+        only keeps its codes in memory and reads the vectors of the rescored
+        rows. `quantization` defaults to the one the index was saved with;
+        a different one re-encodes the vectors
+        """
+        with open(f"{path}.json", encoding="utf-8") as handle:
+            data = json.load(handle)
+        saved = data.get("quantization", "none")
+        quantization = quantization or saved
+        vectors = np.load(f"{path}.npy", mmap_mode="r" if mmap else None)
+        index = cls(dim=data["dim"], capacity=1, quantization=quantization, rescore_factor=rescore_factor)
+        index._vectors = vectors
+        index._alive = np.ones(len(vectors), dtype=bool)
+        index._size = len(vectors)
+        if index.quantized and quantization == saved and os.path.exists(f"{path}.codes.npy"):
+            index._codes = np.load(f"{path}.codes.npy")
+            index._scales = np.load(f"{path}.scales.npy")
+        elif index.quantized:
+            index._codes = np.zeros((len(vectors), index.codec.width), dtype=index.codec.dtype)
+            index._scales = np.ones(len(vectors), dtype=np.float32)
+            for start in range(0, len(vectors), 4096):
+                codes, scales = index.codec.encode(vectors[start:start + 4096])
+                index._codes[start:start + len(codes)], index._scales[start:start + len(codes)] = codes, scales
+        for position, row in enumerate(data["rows"]):
+            index._ids.append(row["id"])
+            index._content.append(row["content"])
+            index._metadata.append(row["metadata"])
+            index._positions[row["id"]] = position
+            index.metadata_index.add(position, row["metadata"])
+        return index
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rows": len(self),
+            "dim": self.dim,
+            "quantization": self.codec.name,
+            "bytes_per_vector": self.codec.bytes_per_vector,
+            "memory_mapped": isinstance(self._vectors, np.memmap),
+            "ivf_lists": 0 if self._centroids is None else len(self._centroids),
+            "metadata_index": self.metadata_index.stats(),
+        }
+
+
+async def sync_from_postgrest(db, dim: int = VECTOR_COMPACT_DIM or VECTOR_DIM, page_size: int = VECTOR_SYNC_PAGE_SIZE,
+                              quantization: str = VECTOR_QUANTIZATION,
+                              rescore_factor: int = VECTOR_RESCORE_FACTOR) -> LocalVectorIndex:
+    """
+    Build a fresh local index with every embedded row of `documents`
+    """
+    index = LocalVectorIndex(dim=dim, quantization=quantization, rescore_factor=rescore_factor)
+    async for rows in iter_documents(db, "id, content, metadata, embedding", page_size):
+        await run_cpu(index.add, rows)
+    return index
+
+
+class LocalVectorStore:
+    """
+    Serves searches from a LocalVectorIndex kept in sync with Supabase: rows
+    inserted through the API are added immediately and a full resync runs
+    at startup (and every `sync_interval` seconds if set)
+    """
+
+    name = "local"
+
+    def __init__(self, db, index: Optional[LocalVectorIndex] = None, path: str = VECTOR_INDEX_PATH,
+                 sync_interval: float = VECTOR_SYNC_INTERVAL, mode: str = VECTOR_INDEX_MODE):
+        self.db = db
+        self.index = index if index is not None else LocalVectorIndex()
+        self.path = path
+        self.sync_interval = sync_interval
+        self.mode = mode
+        self.last_sync: Optional[float] = None
+        self.sync_error: Optional[str] = None
+        # Hay un índice con el que responder: copia en disco cargada o primera sincronización terminada
+        self.ready = False
+        self._task: Optional[asyncio.Task] = None
+        # Cambios hechos durante una sincronización ("add"/"remove", filas o ids), para no perderlos
+        # al sustituir el índice
+        self._pending: Optional[List[Tuple[str, List[Any]]]] = None
+        # add/remove llegan desde el hilo de índices mientras sync() corre en el bucle de eventos
+        self._lock = threading.Lock()
+
+    async def start(self):
+        if self.path and os.path.exists(f"{self.path}.npy"):
+            self.index = await run_io(LocalVectorIndex.load, self.path, True, self.index.codec.name,
+                                      self.index.rescore_factor)
+            self.ready = True
+        self._task = asyncio.create_task(self._sync_loop())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def _sync_loop(self):
+        while True:
+            try:
+                await self.sync()
+            except Exception as e:
+                self.sync_error = str(e)
+            self.ready = True
+            if not self.sync_interval:
+                return
+            await asyncio.sleep(self.sync_interval)
+
+    async def sync(self):
+        self._pending = []
+        try:
+            index = await sync_from_postgrest(self.db, dim=self.index.dim, quantization=self.index.codec.name,
+                                              rescore_factor=self.index.rescore_factor)
+            if self.mode == "ivf":
+                await run_cpu(index.build_ivf)
+            await run_cpu(self._replace_index, index)
+        finally:
+            self._pending = None
+        self.last_sync = time.time()
+        self.sync_error = None
+        if self.path:
+            await run_io(self.index.save, self.path)
+
+    def _replace_index(self, index: LocalVectorIndex):
+        # Los cambios hechos durante la sincronización se aplican al índice nuevo antes de sustituir el actual
+        with self._lock:
+            for operation, items in self._pending:
+                getattr(index, operation)(items)
+            self.index = index
+            self._pending = None
+
+    def add(self, rows: List[Dict[str, Any]]):
+        with self._lock:
+            self.index.add(rows)
+            if self._pending is not None:
+                self._pending.append(("add", rows))
+
+    def remove(self, ids: List[str]):
+        with self._lock:
+            self.index.remove(ids)
+            if self._pending is not None:
+                self._pending.append(("remove", ids))
+
+    async def search(self, query_embedding, k: int, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        return await run_cpu(self.index.search_sync, query_embedding, k, filters, self.mode)
+
+    async def search_many(self, query_embeddings, ks: List[int],
+                          filters: List[Optional[Dict[str, Any]]]) -> List[List[Dict[str, Any]]]:
+        return await run_cpu(self.index.search_many, query_embeddings, ks, filters, self.mode)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name, "ready": self.ready, "mode": self.mode, "last_sync": self.last_sync,
+                "sync_error": self.sync_error, **self.index.stats()}
+
+
+def create_vector_store(db, backend: str = VECTOR_STORE):
+    if backend == "local":
+        return LocalVectorStore(db)
+    if backend == "supabase":
+        return PostgrestVectorStore(db)
+    raise ValueError(f"Unknown VECTOR_STORE: {backend}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Mirror the documents table into a local vector index")
+    parser.add_argument("command", choices=["sync"])
+    parser.add_argument("--out", default=VECTOR_INDEX_PATH or "vectors")
+    parser.add_argument("--page-size", type=int, default=VECTOR_SYNC_PAGE_SIZE)
+    args = parser.parse_args()
+
+    from dotenv import load_dotenv
+    from clients import clients
+
+    load_dotenv()
+    supabase_url = os.getenv("SUPABASE_URL")
+    supabase_key = os.getenv("SUPABASE_SERVICE_KEY") or os.getenv("SUPABASE_ANON_KEY")
+    if not supabase_url or not supabase_key:
+        raise ValueError("Supabase URL and Key must be set in environment variables")
+
+    db = clients.supabase(supabase_url, supabase_key)
+    started = time.perf_counter()
+    try:
+        index = await sync_from_postgrest(db, page_size=args.page_size)
+    finally:
+        await clients.aclose()
+    index.save(args.out)
+    print(json.dumps({"rows": len(index), "path": args.out, "elapsed_seconds": round(time.perf_counter() - started, 3)}))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
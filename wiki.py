@@ -0,0 +1,232 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+from clients import clients
+from embedding_cache import normalize_text
+from executors import run_io
+from storage import connect_sqlite, data_path
+
+WIKIPEDIA_API_URL = os.getenv("WIKIPEDIA_API_URL", "https://en.wikipedia.org/w/api.php")
+# Vacío (sin DATA_DIR) = sin caché
+WIKIPEDIA_CACHE_PATH = os.getenv("WIKIPEDIA_CACHE_PATH", data_path("wikipedia_cache.sqlite"))
+WIKIPEDIA_CACHE_TTL = float(os.getenv("WIKIPEDIA_CACHE_TTL", str(7 * 24 * 3600)))  # 0 = nunca se refresca
+USER_AGENT = "api-book/0.1 (https://github.com/jvasquezt2004/api-book)"
+
+
+class WikipediaClient:
+    """
+    Minimal async client for the MediaWiki API, replacing the blocking
+    `wikipedia` package in request handlers
+    """
+
+    def __init__(self, http: Optional[httpx.AsyncClient] = None, api_url: str = WIKIPEDIA_API_URL):
+        self.api_url = api_url
+        self._http = http
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        # Por defecto, el cliente compartido del registro (keep-alive, reintentos, WIKIPEDIA_TIMEOUT)
+        return self._http or clients.http("wikipedia", headers={"User-Agent": USER_AGENT})
+
+    async def _query(self, **params) -> Dict[str, Any]:
+        params.update({"action": "query", "format": "json", "formatversion": "2"})
+        response = await self.http.get(self.api_url, params=params)
+        response.raise_for_status()
+        return response.json().get("query", {})
+
+    async def search(self, title: str, results: int = 1) -> List[str]:
+        data = await self._query(list="search", srsearch=title, srlimit=results, srprop="")
+        return [item["title"] for item in data.get("search", [])]
+
+    async def page(self, title: str, sentences: int = 10) -> Optional[Dict[str, Any]]:
+        """
+        Fetch the intro extract of a page (following redirects). Returns None if
+        the page doesn't exist
+        """
+        data = await self._query(
+            titles=title, redirects=1, prop="extracts|pageprops", ppprop="disambiguation",
+            exintro=1, explaintext=1, exsentences=sentences,
+        )
+        pages = data.get("pages", [])
+        if not pages or pages[0].get("missing"):
+            return None
+        page = pages[0]
+        return {
+            "title": page.get("title", title),
+            "summary": page.get("extract", ""),
+            "disambiguation": "disambiguation" in page.get("pageprops", {}),
+        }
+
+    async def disambiguation_options(self, title: str) -> List[str]:
+        data = await self._query(titles=title, prop="links", pllimit="max", plnamespace=0)
+        pages = data.get("pages", [])
+        return [link["title"] for link in pages[0].get("links", [])] if pages else []
+
+    async def fetch_context(self, title: str, sentences: int = 10, max_chars: int = 3000) -> str:
+        """
+        Return up to `max_chars` of Wikipedia intro text for a book title, or
+        "" if nothing relevant is found. Network errors are raised.
+        """
+        page_results = await self.search(title, results=1)
+        if not page_results:
+            return ""
+
+        # La página trae ya el extracto: no hace falta una segunda petición para el resumen
+        page = await self.page(page_results[0], sentences=sentences)
+        if page and page["disambiguation"]:
+            # Preferir la opción que sea un libro; si no, la que mencione el título
+            options = await self.disambiguation_options(page["title"])
+            book_options = [opt for opt in options if "(book)" in opt.lower() or "(novel)" in opt.lower()]
+            title_options = [opt for opt in options if title.lower() in opt.lower()]
+            candidates = book_options or title_options or options
+            relevant_option = candidates[0] if candidates else None
+            page = await self.page(relevant_option, sentences=sentences) if relevant_option else None
+
+        if not page or page["disambiguation"]:
+            return ""
+        return page["summary"][:max_chars].strip()
+
+    async def get_context(self, title: str, sentences: int = 10, max_chars: int = 3000) -> str:
+        try:
+            return await self.fetch_context(title, sentences=sentences, max_chars=max_chars)
+        except Exception:
+            return ""
+
+    async def aclose(self):
+        # El cliente del registro lo cierra el registro; solo se cierra aquí uno recibido en el constructor
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+
+class WikipediaCache:
+    """
+    Persistent title -> context store in SQLite
+    """
+
+    def __init__(self, path: str = WIKIPEDIA_CACHE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = None
+
+    @property
+    def _db(self) -> sqlite3.Connection:
+        # El archivo se abre en el primer uso, no al importar el módulo
+        if self._conn is None:
+            self._conn = connect_sqlite(self.path)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS wikipedia_context ("
+                "key TEXT PRIMARY KEY, context TEXT, fetched_at REAL)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def get(self, key: str) -> Optional[Tuple[str, float]]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT context, fetched_at FROM wikipedia_context WHERE key = ?", (key,)
+            ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def put(self, key: str, context: str):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO wikipedia_context (key, context, fetched_at) VALUES (?, ?, ?)",
+                (key, context, time.time()),
+            )
+            self._db.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM wikipedia_context").fetchone()[0]
+
+
+class CachedWikipedia:
+    """
+    Serves Wikipedia context from the persistent cache. Entries older than
+    `ttl` are still returned but refreshed in the background; concurrent
+    lookups of the same title share one fetch.
+    """
+
+    def __init__(self, backend, cache: Optional[WikipediaCache] = None, ttl: float = WIKIPEDIA_CACHE_TTL):
+        self.backend = backend
+        self.cache = cache
+        self.ttl = ttl
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._refreshes = set()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    @staticmethod
+    def key(title: str, sentences: int, max_chars: int) -> str:
+        return f"{normalize_text(title)}|{sentences}|{max_chars}"
+
+    async def _fetch(self, key: str, title: str, sentences: int, max_chars: int) -> Optional[str]:
+        # Una sola petición por título aunque lleguen varias a la vez
+        if key in self._inflight:
+            return await asyncio.shield(self._inflight[key])
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            context = await self.backend.fetch_context(title, sentences=sentences, max_chars=max_chars)
+            if self.cache is not None:
+                await run_io(self.cache.put, key, context)
+            future.set_result(context)
+            return context
+        except Exception:
+            # Los errores no se guardan en caché: se reintentará en la próxima petición
+            self.errors += 1
+            future.set_result(None)
+            return None
+        finally:
+            del self._inflight[key]
+
+    async def get_context(self, title: str, sentences: int = 10, max_chars: int = 3000) -> str:
+        key = self.key(title, sentences, max_chars)
+        cached = await run_io(self.cache.get, key) if self.cache is not None else None
+        if cached is not None:
+            context, fetched_at = cached
+            if not self.ttl or time.time() - fetched_at <= self.ttl:
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+                if key not in self._inflight:
+                    task = asyncio.create_task(self._fetch(key, title, sentences, max_chars))
+                    self._refreshes.add(task)
+                    task.add_done_callback(self._refreshes.discard)
+            return context
+
+        self.misses += 1
+        context = await self._fetch(key, title, sentences, max_chars)
+        return context or ""
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "entries": len(self.cache) if self.cache is not None else 0,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_rate": round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+    async def aclose(self):
+        for task in list(self._refreshes):
+            task.cancel()
+        if hasattr(self.backend, "aclose"):
+            await self.backend.aclose()
+
+
+wikipedia_client = CachedWikipedia(
+    WikipediaClient(),
+    WikipediaCache() if WIKIPEDIA_CACHE_PATH else None,
+)